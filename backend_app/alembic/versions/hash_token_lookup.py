@@ -0,0 +1,52 @@
+"""store sha-256 token hashes instead of full tokens
+
+Revision ID: hash_token_lookup
+Revises: add_effect_column
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from typing import Union
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'hash_token_lookup'
+down_revision: Union[str, None] = 'add_effect_column'
+branch_labels: Union[str, None] = None
+depends_on: Union[str, None] = None
+
+
+def upgrade() -> None:
+    # Replace the full-JWT unique index with a 32-byte digest
+    # Check the current schema since the tokens table may have been created by the app
+    connection = op.get_bind()
+    inspector = sa.inspect(connection)
+    if 'tokens' not in inspector.get_table_names():
+        return
+
+    columns = [col['name'] for col in inspector.get_columns('tokens')]
+    if 'token_hash' not in columns:
+        op.add_column('tokens', sa.Column('token_hash', sa.LargeBinary(length=32), nullable=True))
+    if 'token' in columns:
+        # Existing sessions stay valid: hash the stored tokens the same way the app does
+        op.execute("UPDATE tokens SET token_hash = sha256(convert_to(token, 'UTF8')) WHERE token_hash IS NULL")
+
+    op.alter_column('tokens', 'token_hash', nullable=False)
+    indexes = [index['name'] for index in inspector.get_indexes('tokens')]
+    if 'ix_tokens_token_hash' not in indexes:
+        op.create_index('ix_tokens_token_hash', 'tokens', ['token_hash'], unique=True)
+
+    if 'token' in columns:
+        if 'ix_tokens_token' in indexes:
+            op.drop_index('ix_tokens_token', table_name='tokens')
+        op.drop_column('tokens', 'token')
+
+
+def downgrade() -> None:
+    # Full tokens can't be recovered from their hashes - everyone has to log in again
+    op.execute("DELETE FROM tokens")
+    op.add_column('tokens', sa.Column('token', sa.String(), nullable=False))
+    op.create_index('ix_tokens_token', 'tokens', ['token'], unique=True)
+    op.drop_index('ix_tokens_token_hash', table_name='tokens')
+    op.drop_column('tokens', 'token_hash')
@@ -0,0 +1,37 @@
+"""revoked_tokens table shared by all workers in stateless auth mode
+
+Revision ID: revoked_tokens
+Revises: room_matchmaking_rating
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Union
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'revoked_tokens'
+down_revision: Union[str, None] = 'room_matchmaking_rating'
+branch_labels: Union[str, None] = None
+depends_on: Union[str, None] = None
+
+
+def upgrade() -> None:
+    # Check if table already exists to avoid errors
+    connection = op.get_bind()
+    inspector = sa.inspect(connection)
+    if 'revoked_tokens' in inspector.get_table_names():
+        return
+
+    op.create_table(
+        'revoked_tokens',
+        sa.Column('token_hash', sa.LargeBinary(length=32), primary_key=True),
+        sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False),
+    )
+    op.create_index('ix_revoked_tokens_expires_at', 'revoked_tokens', ['expires_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_revoked_tokens_expires_at', table_name='revoked_tokens')
+    op.drop_table('revoked_tokens')
@@ -0,0 +1,45 @@
+"""matchmaking_rating on game_rooms for pairing across workers
+
+Revision ID: room_matchmaking_rating
+Revises: room_settled_at
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from typing import Union
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'room_matchmaking_rating'
+down_revision: Union[str, None] = 'room_settled_at'
+branch_labels: Union[str, None] = None
+depends_on: Union[str, None] = None
+
+
+def upgrade() -> None:
+    # Check if column already exists to avoid errors
+    connection = op.get_bind()
+    inspector = sa.inspect(connection)
+    if 'game_rooms' not in inspector.get_table_names():
+        return
+
+    columns = [col['name'] for col in inspector.get_columns('game_rooms')]
+    if 'matchmaking_rating' not in columns:
+        op.add_column('game_rooms', sa.Column('matchmaking_rating', sa.Integer(), nullable=True))
+
+    indexes = [index['name'] for index in inspector.get_indexes('game_rooms')]
+    if 'ix_game_rooms_matchmaking' not in indexes:
+        op.create_index(
+            'ix_game_rooms_matchmaking',
+            'game_rooms',
+            ['game_mode', 'matchmaking_rating'],
+            postgresql_where=sa.text(
+                "status = 'WAITING' AND player_count = 1 AND matchmaking_rating IS NOT NULL"
+            ),
+        )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_game_rooms_matchmaking', table_name='game_rooms')
+    op.drop_column('game_rooms', 'matchmaking_rating')
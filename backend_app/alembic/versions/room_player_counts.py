@@ -0,0 +1,56 @@
+"""maintained player counts on game_rooms and an index of open rooms
+
+Revision ID: room_player_counts
+Revises: token_expires_at_index
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from typing import Union
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'room_player_counts'
+down_revision: Union[str, None] = 'token_expires_at_index'
+branch_labels: Union[str, None] = None
+depends_on: Union[str, None] = None
+
+
+def upgrade() -> None:
+    # Check if columns already exist to avoid errors
+    connection = op.get_bind()
+    inspector = sa.inspect(connection)
+    if 'game_rooms' not in inspector.get_table_names():
+        return
+
+    columns = [col['name'] for col in inspector.get_columns('game_rooms')]
+    if 'player_count' not in columns:
+        op.add_column('game_rooms', sa.Column('player_count', sa.Integer(), nullable=False, server_default='0'))
+    if 'connected_count' not in columns:
+        op.add_column('game_rooms', sa.Column('connected_count', sa.Integer(), nullable=False, server_default='0'))
+
+    # Backfill from the existing players
+    op.execute("""
+        UPDATE game_rooms SET
+            player_count = (SELECT count(*) FROM game_players WHERE game_players.room_id = game_rooms.id),
+            connected_count = (
+                SELECT count(*) FROM game_players
+                WHERE game_players.room_id = game_rooms.id AND game_players.is_connected
+            )
+    """)
+
+    indexes = [index['name'] for index in inspector.get_indexes('game_rooms')]
+    if 'ix_game_rooms_open' not in indexes:
+        op.create_index(
+            'ix_game_rooms_open',
+            'game_rooms',
+            ['game_mode', 'created_at'],
+            postgresql_where=sa.text("status = 'WAITING' AND player_count < 2"),
+        )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_game_rooms_open', table_name='game_rooms')
+    op.drop_column('game_rooms', 'connected_count')
+    op.drop_column('game_rooms', 'player_count')
@@ -0,0 +1,33 @@
+"""settled_at on game_rooms for server-side game results
+
+Revision ID: room_settled_at
+Revises: room_player_counts
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+from typing import Union
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'room_settled_at'
+down_revision: Union[str, None] = 'room_player_counts'
+branch_labels: Union[str, None] = None
+depends_on: Union[str, None] = None
+
+
+def upgrade() -> None:
+    # Check if column already exists to avoid errors
+    connection = op.get_bind()
+    inspector = sa.inspect(connection)
+    if 'game_rooms' not in inspector.get_table_names():
+        return
+
+    columns = [col['name'] for col in inspector.get_columns('game_rooms')]
+    if 'settled_at' not in columns:
+        op.add_column('game_rooms', sa.Column('settled_at', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('game_rooms', 'settled_at')
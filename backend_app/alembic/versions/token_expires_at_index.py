@@ -0,0 +1,33 @@
+"""index tokens.expires_at for the expired token reaper
+
+Revision ID: token_expires_at_index
+Revises: hash_token_lookup
+Create Date: 2026-10-17 13:00:00.000000
+
+"""
+from typing import Union
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'token_expires_at_index'
+down_revision: Union[str, None] = 'hash_token_lookup'
+branch_labels: Union[str, None] = None
+depends_on: Union[str, None] = None
+
+
+def upgrade() -> None:
+    # Check if index already exists to avoid errors
+    connection = op.get_bind()
+    inspector = sa.inspect(connection)
+    if 'tokens' not in inspector.get_table_names():
+        return
+
+    indexes = [index['name'] for index in inspector.get_indexes('tokens')]
+    if 'ix_tokens_expires_at' not in indexes:
+        op.create_index('ix_tokens_expires_at', 'tokens', ['expires_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_tokens_expires_at', table_name='tokens')
@@ -0,0 +1,13 @@
+-- Store SHA-256 token hashes instead of full tokens
+-- Run this SQL script directly on your database if migrations fail (PostgreSQL 11+)
+
+ALTER TABLE tokens
+ADD COLUMN IF NOT EXISTS token_hash BYTEA;
+
+UPDATE tokens SET token_hash = sha256(convert_to(token, 'UTF8')) WHERE token_hash IS NULL;
+
+ALTER TABLE tokens ALTER COLUMN token_hash SET NOT NULL;
+CREATE UNIQUE INDEX IF NOT EXISTS ix_tokens_token_hash ON tokens (token_hash);
+
+DROP INDEX IF EXISTS ix_tokens_token;
+ALTER TABLE tokens DROP COLUMN IF EXISTS token;
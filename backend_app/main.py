@@ -9,12 +9,23 @@ from src.auth.settings_router import router as router_settings
 from src.collection.router import router as router_collection
 from src.stats.router import router as router_stats
 from src.friends.router import router as router_friends
-from src.database import get_async_session, engine
+from src.database import get_async_session, async_session_maker, engine, get_pool_status
+from src.auth.token_cache import token_cache, revoked_tokens, load_revocations, receive_auth_event
+from src.auth.password_hasher import password_hasher
+from src.auth.token_reaper import token_reaper
+from src.game.matchmaking import matchmaker
 from src.database import Base
+from src.game.move_writer import move_writer
+from src.game.backplane import backplane
+from src.game.room_manager import room_manager
+from src.game.timer_wheel import timer_wheel
+from src.game.room_sweeper import room_sweeper
+from src.stats.leaderboard import leaderboard
+from src.game.settlement import settlement
 
 # Import models to register them with Base.metadata
 from src.game.models import Messages, GameRoom, GamePlayer, GameMove, RpsRound  # noqa: F401
-from src.auth.models import User, Token  # noqa: F401
+from src.auth.models import User, Token, RevokedToken  # noqa: F401
 from src.auth.settings_models import UserSettings  # noqa: F401
 from src.collection.models import CollectionItem, UserCollection  # noqa: F401
 from src.stats.models import UserStats, PerformanceHistory  # noqa: F401
@@ -52,6 +63,51 @@ async def startup_event():
         logger.error(f"Failed to create database tables: {e}")
         raise
 
+    # Start background writer for game moves
+    move_writer.start()
+
+    # Game clocks: ends games whose side to move runs out of time
+    timer_wheel.start()
+
+    # Rooms still waiting for an opponent go back into the matchmaking queue
+    async with async_session_maker() as session:
+        await matchmaker.load(session)
+
+    # Leaderboard reads are served from memory
+    try:
+        async with async_session_maker() as session:
+            await leaderboard.load(session)
+    except Exception as e:
+        # /stats/leaderboard falls back to the database until the next reload succeeds
+        logger.error(f"Failed to load leaderboard: {e}", exc_info=True)
+    leaderboard.start()
+
+    # Tokens revoked before this worker started
+    await load_revocations()
+
+    # Connect to the room message backplane (no-op for a single worker)
+    await backplane.start(room_manager.receive_from_backplane, receive_auth_event)
+
+    # Periodically delete expired tokens
+    token_reaper.start()
+
+    # Periodically reclaim abandoned game rooms
+    room_sweeper.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Flush buffered game data before the process exits."""
+    await token_reaper.stop()
+    await room_sweeper.stop()
+    await leaderboard.stop()
+    await timer_wheel.stop()
+    await backplane.stop()
+    await move_writer.stop()
+    logger.info("Pending game moves flushed")
+    await engine.dispose()
+    password_hasher.shutdown()
+
 
 @app.get("/")
 async def root():
@@ -60,7 +116,8 @@ async def root():
         "message": "Chess RPS API",
         "version": "1.0.0",
         "docs": "/docs",
-        "health": "/health"
+        "health": "/health",
+        "metrics": "/metrics"
     }
 
 
@@ -86,6 +143,25 @@ async def simple_health():
     """Simple health check without database dependency."""
     return {"status": "ok"}
 
+
+@app.get("/metrics")
+async def metrics():
+    """Runtime metrics of the worker (database pool, rooms, background writers)."""
+    return {
+        "database_pool": get_pool_status(),
+        "rooms": room_manager.stats(),
+        "move_writer": {"pending_moves": move_writer.pending_count, "dropped": move_writer.dropped},
+        "game_clocks": timer_wheel.stats(),
+        "backplane": backplane.status(),
+        "matchmaking": matchmaker.stats(),
+        "token_cache": {**token_cache.stats(), "revoked_tokens": revoked_tokens.revoked},
+        "password_hasher": password_hasher.stats(),
+        "token_reaper": token_reaper.stats(),
+        "room_sweeper": room_sweeper.stats(),
+        "leaderboard": leaderboard.stats(),
+        "settlement": settlement.stats(),
+    }
+
 # Include routers
 app.include_router(router_auth, prefix="/api/v1")
 app.include_router(router_settings, prefix="/api/v1")
@@ -94,3 +170,18 @@ app.include_router(router_collection, prefix="/api/v1")
 app.include_router(router_stats, prefix="/api/v1")
 app.include_router(router_friends, prefix="/api/v1")
 
+
+if __name__ == "__main__":
+    import uvicorn
+    from src.config import WS_PER_MESSAGE_DEFLATE
+    from src.game.ws_compression import WebSocketProtocol
+
+    # Started this way (not with the uvicorn command) so large WebSocket messages only are compressed
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=8000,
+        ws=WebSocketProtocol,
+        ws_per_message_deflate=WS_PER_MESSAGE_DEFLATE,
+    )
+
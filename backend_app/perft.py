@@ -0,0 +1,103 @@
+"""
+Perft benchmark for the server-side chess engine.
+
+Verifies the move generator against well-known node counts and measures how
+long validating a single move takes, which is what runs on every WebSocket
+move. Usage:
+
+    python perft.py            # quick run (a few seconds)
+    python perft.py --deep     # one extra ply per position
+"""
+import argparse
+import random
+import sys
+import time
+
+from src.game.chess_engine import Board, START_FEN, move_to_uci
+
+# (name, fen, node counts for depth 1..n)
+PERFT_POSITIONS = [
+    ("start", START_FEN, [20, 400, 8902, 197281, 4865609]),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1", [48, 2039, 97862, 4085603]),
+    ("position3", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1", [14, 191, 2812, 43238, 674624]),
+    ("position4", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1", [6, 264, 9467, 422333]),
+    ("position5", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8", [44, 1486, 62379, 2103487]),
+]
+
+# Depth used for the quick run of each position
+QUICK_DEPTHS = {"start": 3, "kiwipete": 2, "position3": 4, "position4": 3, "position5": 2}
+
+
+def run_perft(deep: bool) -> bool:
+    all_ok = True
+    total_nodes = 0
+    total_time = 0.0
+
+    for name, fen, expected in PERFT_POSITIONS:
+        depth = QUICK_DEPTHS[name] + (1 if deep else 0)
+        depth = min(depth, len(expected))
+        board = Board(fen)
+
+        start = time.perf_counter()
+        nodes = board.perft(depth)
+        elapsed = time.perf_counter() - start
+
+        ok = nodes == expected[depth - 1] and board.fen() == Board(fen).fen()
+        all_ok = all_ok and ok
+        total_nodes += nodes
+        total_time += elapsed
+        status = "OK" if ok else f"FAIL (expected {expected[depth - 1]})"
+        print(f"{name:<10} depth {depth}: {nodes:>9} nodes in {elapsed:7.3f}s ({nodes / elapsed:>9.0f} nps)  {status}")
+
+    print(f"\nTotal: {total_nodes} nodes in {total_time:.3f}s ({total_nodes / total_time:.0f} nps)")
+    return all_ok
+
+
+def run_move_validation_benchmark(games: int = 50, max_plies: int = 120) -> float:
+    """Time parse + play + outcome check, the work done per WebSocket move"""
+    rng = random.Random(42)
+    timings = []
+
+    for _ in range(games):
+        board = Board()
+        for _ in range(max_plies):
+            legal = board.legal_moves()
+            if not legal:
+                break
+            notation = move_to_uci(rng.choice(legal))
+
+            start = time.perf_counter()
+            board.play(notation)
+            result = board.outcome()
+            timings.append(time.perf_counter() - start)
+
+            if result:
+                break
+
+    timings.sort()
+    mean_us = sum(timings) / len(timings) * 1e6
+    p99_us = timings[int(len(timings) * 0.99)] * 1e6
+    print(f"\nMove validation: {len(timings)} moves, mean {mean_us:.1f}us, p99 {p99_us:.1f}us")
+    return p99_us
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Perft benchmark for the chess engine")
+    parser.add_argument("--deep", action="store_true", help="search one ply deeper")
+    args = parser.parse_args()
+
+    print("=" * 50)
+    print("Chess engine perft")
+    print("=" * 50)
+    ok = run_perft(args.deep)
+    run_move_validation_benchmark()
+
+    if not ok:
+        print("\n[FAILED] Perft node counts do not match")
+        return 1
+    print("\n[SUCCESS] Move generator matches reference perft counts")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
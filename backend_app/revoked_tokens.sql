@@ -0,0 +1,9 @@
+-- revoked_tokens table shared by all workers in stateless auth mode
+-- Run this SQL script directly on your database if migrations fail
+
+CREATE TABLE IF NOT EXISTS revoked_tokens (
+    token_hash BYTEA PRIMARY KEY,
+    expires_at TIMESTAMP WITH TIME ZONE NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS ix_revoked_tokens_expires_at ON revoked_tokens (expires_at);
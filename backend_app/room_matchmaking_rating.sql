@@ -0,0 +1,8 @@
+-- matchmaking_rating on game_rooms for pairing across workers
+-- Run this SQL script directly on your database if migrations fail
+
+ALTER TABLE game_rooms
+ADD COLUMN IF NOT EXISTS matchmaking_rating INTEGER;
+
+CREATE INDEX IF NOT EXISTS ix_game_rooms_matchmaking ON game_rooms (game_mode, matchmaking_rating)
+WHERE status = 'WAITING' AND player_count = 1 AND matchmaking_rating IS NOT NULL;
@@ -0,0 +1,16 @@
+-- Maintained player counts on game_rooms and an index of rooms with a free slot
+-- Run this SQL script directly on your database if migrations fail
+
+ALTER TABLE game_rooms
+ADD COLUMN IF NOT EXISTS player_count INTEGER NOT NULL DEFAULT 0,
+ADD COLUMN IF NOT EXISTS connected_count INTEGER NOT NULL DEFAULT 0;
+
+UPDATE game_rooms SET
+    player_count = (SELECT count(*) FROM game_players WHERE game_players.room_id = game_rooms.id),
+    connected_count = (
+        SELECT count(*) FROM game_players
+        WHERE game_players.room_id = game_rooms.id AND game_players.is_connected
+    );
+
+CREATE INDEX IF NOT EXISTS ix_game_rooms_open ON game_rooms (game_mode, created_at)
+WHERE status = 'WAITING' AND player_count < 2;
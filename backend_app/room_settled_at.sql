@@ -0,0 +1,5 @@
+-- settled_at on game_rooms for server-side game results
+-- Run this SQL script directly on your database if migrations fail
+
+ALTER TABLE game_rooms
+ADD COLUMN IF NOT EXISTS settled_at TIMESTAMP WITH TIME ZONE;
@@ -1,4 +1,4 @@
-from datetime import datetime, timedelta
+from datetime import datetime
 from typing import Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
@@ -6,11 +6,13 @@ from jose import JWTError, jwt
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, and_
 
-from src.config import SECRET_KEY, ALGORITHM
+from src.config import SECRET_KEY, ALGORITHM, AUTH_STATELESS
 from src.database import get_async_session
 from src.auth.models import User, Token
+from src.auth.token_cache import token_cache, revoked_tokens, attach_user, hash_token
 
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
 
 
 async def get_current_user(
@@ -29,19 +31,17 @@ async def get_current_user(
     try:
         # Extract token from credentials
         token = credentials.credentials
-
-        # Verify token in database
-        query = select(Token).where(
-            and_(
-                Token.token == token,
-                Token.expires_at > datetime.utcnow()
-            )
-        )
-        result = await session.execute(query)
-        db_token = result.scalar_one_or_none()
-
-        if not db_token:
-            raise credentials_exception
+        token_hash = hash_token(token)
+
+        # Recently verified token - no database round trip
+        snapshot = token_cache.get(token_hash)
+        if snapshot is not None:
+            if not snapshot["is_active"]:
+                raise HTTPException(
+                    status_code=status.HTTP_403_FORBIDDEN,
+                    detail="User account is inactive"
+                )
+            return await attach_user(session, snapshot)
 
         # Decode JWT token
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
@@ -56,6 +56,18 @@ async def get_current_user(
         except (ValueError, TypeError):
             raise credentials_exception
 
+        # Verify token in database (in stateless mode only if it may have been revoked)
+        if not AUTH_STATELESS or revoked_tokens.might_contain(token_hash):
+            query = select(Token.id).where(
+                and_(
+                    Token.token_hash == token_hash,
+                    Token.expires_at > datetime.utcnow()
+                )
+            )
+            result = await session.execute(query)
+            if result.scalar_one_or_none() is None:
+                raise credentials_exception
+
         # Get user from database
         query = select(User).where(User.id == user_id)
         result = await session.execute(query)
@@ -70,12 +82,28 @@ async def get_current_user(
                 detail="User account is inactive"
             )
 
+        token_cache.put(token_hash, user, payload["exp"])
         return user
 
     except JWTError:
         raise credentials_exception
 
 
+async def get_optional_user(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security),
+    session: AsyncSession = Depends(get_async_session)
+) -> Optional[User]:
+    """
+    Return the authenticated user, or None for anonymous requests and invalid tokens.
+    """
+    if credentials is None:
+        return None
+    try:
+        return await get_current_user(credentials, session)
+    except HTTPException:
+        return None
+
+
 async def get_current_active_user(
     current_user: User = Depends(get_current_user)
 ) -> User:
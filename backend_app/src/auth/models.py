@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, LargeBinary
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from typing import TYPE_CHECKING
@@ -39,10 +39,22 @@ class Token(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
-    token = Column(String, unique=True, index=True, nullable=False)
+    # SHA-256 of the JWT (see hash_token); the token itself is not stored
+    token_hash = Column(LargeBinary(32), unique=True, index=True, nullable=False)
     token_type = Column(String, default="access", nullable=False)  # "access" or "refresh"
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    expires_at = Column(DateTime(timezone=True), nullable=False)
+    # Indexed for the expired token reaper
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
 
     # Relationship to user
     user = relationship("User", back_populates="tokens")
+
+
+class RevokedToken(Base):
+    """Tokens deleted before they expired, kept until then for the stateless revocation filter"""
+    __tablename__ = "revoked_tokens"
+
+    # SHA-256 of the JWT (see hash_token)
+    token_hash = Column(LargeBinary(32), primary_key=True)
+    # Indexed for the expired token reaper
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
@@ -3,7 +3,6 @@ from typing import Optional
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import HTTPAuthorizationCredentials
 from jose import jwt
-from passlib.context import CryptContext
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, and_, delete
 
@@ -11,25 +10,39 @@ from src.config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES, REFRE
 from src.database import get_async_session
 from src.auth.models import User, Token
 from src.auth.schemas import UserRegister, UserLogin, TokenResponse, UserResponse, RefreshTokenRequest, UpdateProfileNameRequest
-from src.auth.dependencies import get_current_active_user, security
+from src.auth.dependencies import get_current_active_user, security, hash_token
+from src.auth.token_cache import record_revocation, revoke_token
+from src.auth.password_hasher import password_hasher, PasswordHasherBusy
+from src.stats.leaderboard import leaderboard
 
 router = APIRouter(
     prefix="/auth",
     tags=["Authentication"]
 )
 
-# Password hashing context
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
-
-def verify_password(plain_password: str, hashed_password: str) -> bool:
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a plain password against a hashed password."""
-    return pwd_context.verify(plain_password, hashed_password)
+    try:
+        return await password_hasher.verify(plain_password, hashed_password)
+    except PasswordHasherBusy:
+        raise password_hasher_busy_exception()
 
 
-def get_password_hash(password: str) -> str:
+async def get_password_hash(password: str) -> str:
     """Hash a password."""
-    return pwd_context.hash(password)
+    try:
+        return await password_hasher.hash(password)
+    except PasswordHasherBusy:
+        raise password_hasher_busy_exception()
+
+
+def password_hasher_busy_exception() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Server is busy, please try again",
+        headers={"Retry-After": "1"},
+    )
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
@@ -79,7 +92,7 @@ async def register(
         )
 
     # Create new user
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await get_password_hash(user_data.password)
     new_user = User(
         phone_number=user_data.phone_number,
         hashed_password=hashed_password,
@@ -104,13 +117,13 @@ async def register(
     
     access_token_record = Token(
         user_id=new_user.id,
-        token=access_token,
+        token_hash=hash_token(access_token),
         token_type="access",
         expires_at=access_expires_at
     )
     refresh_token_record = Token(
         user_id=new_user.id,
-        token=refresh_token,
+        token_hash=hash_token(refresh_token),
         token_type="refresh",
         expires_at=refresh_expires_at
     )
@@ -148,7 +161,7 @@ async def login(
         )
 
     # Verify password
-    if not verify_password(user_data.password, user.hashed_password):
+    if not await verify_password(user_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect phone number or password"
@@ -180,13 +193,13 @@ async def login(
     
     access_token_record = Token(
         user_id=user.id,
-        token=access_token,
+        token_hash=hash_token(access_token),
         token_type="access",
         expires_at=access_expires_at
     )
     refresh_token_record = Token(
         user_id=user.id,
-        token=refresh_token,
+        token_hash=hash_token(refresh_token),
         token_type="refresh",
         expires_at=refresh_expires_at
     )
@@ -212,12 +225,16 @@ async def logout(
     """
     Logout by invalidating the current token.
     """
-    token = credentials.credentials
+    token_hash = hash_token(credentials.credentials)
 
     # Delete token from database
-    stmt = delete(Token).where(Token.token == token)
-    await session.execute(stmt)
+    stmt = delete(Token).where(Token.token_hash == token_hash).returning(Token.expires_at)
+    result = await session.execute(stmt)
+    expires_at = result.scalar_one_or_none()
+    if expires_at is not None:
+        await record_revocation(session, token_hash, expires_at)
     await session.commit()
+    await revoke_token(token_hash)
 
     return {"message": "Successfully logged out"}
 
@@ -258,6 +275,7 @@ async def update_profile_name(
     current_user.profile_name = update_data.profile_name
     await session.commit()
     await session.refresh(current_user)
+    leaderboard.rename(current_user.id, current_user.profile_name)
     
     return current_user
 
@@ -288,7 +306,7 @@ async def refresh_token(
         # Verify refresh token exists in database and is not expired
         query = select(Token).where(
             and_(
-                Token.token == refresh_data.refresh_token,
+                Token.token_hash == hash_token(refresh_data.refresh_token),
                 Token.token_type == "refresh",
                 Token.user_id == user_id,
                 Token.expires_at > datetime.utcnow()
@@ -317,6 +335,7 @@ async def refresh_token(
         # Invalidate old refresh token
         stmt = delete(Token).where(Token.id == token_record.id)
         await session.execute(stmt)
+        await record_revocation(session, token_record.token_hash, token_record.expires_at)
         
         # Create new access token
         access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -333,19 +352,20 @@ async def refresh_token(
         
         access_token_record = Token(
             user_id=user.id,
-            token=access_token,
+            token_hash=hash_token(access_token),
             token_type="access",
             expires_at=access_expires_at
         )
         refresh_token_record = Token(
             user_id=user.id,
-            token=new_refresh_token,
+            token_hash=hash_token(new_refresh_token),
             token_type="refresh",
             expires_at=refresh_expires_at
         )
         session.add(access_token_record)
         session.add(refresh_token_record)
         await session.commit()
+        await revoke_token(token_record.token_hash)
         
         return TokenResponse(
             access_token=access_token,
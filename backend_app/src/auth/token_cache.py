@@ -0,0 +1,209 @@
+"""
+In-process cache of verified access tokens.
+
+get_current_user keeps a snapshot of the user behind every token it has
+verified, so repeated requests with the same token skip the Token and User
+queries. Entries live for AUTH_TOKEN_CACHE_TTL_SECONDS (never longer than
+the token itself) and the least recently used ones are dropped beyond
+AUTH_TOKEN_CACHE_SIZE. Logout and refresh invalidate them, and so does any
+committed change to the user row (profile name, deactivation).
+
+With AUTH_STATELESS the Token table is not queried at all for tokens with a
+valid signature, unless they hit the revocation bloom filter, in which case
+the database decides.
+
+Revocations are stored in the revoked_tokens table until the token expires,
+loaded into the filter on startup, and published to the other workers over
+the backplane (together with user changes), so a logout takes effect on
+every worker. Entries are keyed by the SHA-256 of the token (hash_token):
+that is all other workers get to see.
+"""
+import asyncio
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional, Set
+
+from sqlalchemy import event, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from src.config import (
+    AUTH_TOKEN_CACHE_SIZE,
+    AUTH_TOKEN_CACHE_TTL_SECONDS,
+    AUTH_REVOCATION_FILTER_BITS,
+    AUTH_REVOCATION_FILTER_HASHES,
+)
+from src.database import async_session_maker
+from src.auth.models import User, RevokedToken
+from src.game.backplane import backplane
+
+logger = logging.getLogger(__name__)
+
+USER_COLUMNS = [column.key for column in User.__table__.columns]
+
+
+def hash_token(token: str) -> bytes:
+    """Lookup key of a token in the tokens table"""
+    return hashlib.sha256(token.encode()).digest()
+
+
+class TokenCache:
+    def __init__(self, max_size: int = AUTH_TOKEN_CACHE_SIZE, ttl_seconds: float = AUTH_TOKEN_CACHE_TTL_SECONDS):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        # token hash -> (monotonic deadline, user column values)
+        self._entries: "OrderedDict[bytes, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token_hash: bytes) -> Optional[dict]:
+        entry = self._entries.get(token_hash)
+        if entry is None:
+            self.misses += 1
+            return None
+        deadline, snapshot = entry
+        if deadline <= time.monotonic():
+            del self._entries[token_hash]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(token_hash)
+        self.hits += 1
+        return snapshot
+
+    def put(self, token_hash: bytes, user: User, token_expires_at: float):
+        """Remember a verified token; token_expires_at is the JWT `exp` (unix time)"""
+        if self.max_size <= 0:
+            return
+        lifetime = min(self.ttl_seconds, token_expires_at - time.time())
+        if lifetime <= 0:
+            return
+        snapshot = {key: getattr(user, key) for key in USER_COLUMNS}
+        self._entries[token_hash] = (time.monotonic() + lifetime, snapshot)
+        self._entries.move_to_end(token_hash)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, token_hash: bytes):
+        self._entries.pop(token_hash, None)
+
+    def invalidate_user(self, user_id: int):
+        """Drop every token of a user, e.g. after the user row changed"""
+        for token_hash in [key for key, (_, snapshot) in self._entries.items() if snapshot["id"] == user_id]:
+            del self._entries[token_hash]
+
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+class RevocationFilter:
+    """Bloom filter of revoked tokens: no false negatives, rare false positives"""
+
+    def __init__(self, size_bits: int = AUTH_REVOCATION_FILTER_BITS, hash_count: int = AUTH_REVOCATION_FILTER_HASHES):
+        self.size_bits = size_bits
+        self.hash_count = hash_count
+        self._bits = bytearray((size_bits + 7) // 8)
+        self.revoked = 0
+
+    def _positions(self, token_hash: bytes):
+        # Double hashing: two 64-bit halves of the token digest generate all positions
+        h1 = int.from_bytes(token_hash[:8], "little")
+        h2 = int.from_bytes(token_hash[8:16], "little") | 1
+        return ((h1 + i * h2) % self.size_bits for i in range(self.hash_count))
+
+    def add(self, token_hash: bytes):
+        for position in self._positions(token_hash):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.revoked += 1
+
+    def might_contain(self, token_hash: bytes) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(token_hash))
+
+
+async def attach_user(session: AsyncSession, snapshot: dict) -> User:
+    """Turn a cached snapshot into a User of this session without querying the database"""
+    user = User(**snapshot)
+    make_transient_to_detached(user)
+    # load=False trusts the snapshot; changes made by the endpoint are still flushed on commit
+    return await session.merge(user, load=False)
+
+
+async def record_revocation(session: AsyncSession, token_hash: bytes, expires_at: datetime):
+    """Store a revocation in the caller's transaction; call revoke_token after the commit"""
+    await session.execute(
+        insert(RevokedToken)
+        .values(token_hash=token_hash, expires_at=expires_at)
+        .on_conflict_do_nothing(index_elements=[RevokedToken.token_hash])
+    )
+
+
+async def revoke_token(token_hash: bytes):
+    """Forget a token that was deleted from the database, on every worker"""
+    token_cache.invalidate(token_hash)
+    revoked_tokens.add(token_hash)
+    await backplane.publish_event({"type": "token_revoked", "token_hash": token_hash.hex()})
+
+
+async def forget_user(user_id: int):
+    """Drop the cached tokens of a changed user, on every worker"""
+    token_cache.invalidate_user(user_id)
+    await backplane.publish_event({"type": "user_changed", "user_id": user_id})
+
+
+async def load_revocations():
+    """Add the unexpired rows of the revoked_tokens table to the revocation filter"""
+    loaded = 0
+    async with async_session_maker() as session:
+        result = await session.stream_scalars(
+            select(RevokedToken.token_hash).where(RevokedToken.expires_at > datetime.utcnow())
+        )
+        async for token_hash in result:
+            revoked_tokens.add(token_hash)
+            loaded += 1
+    logger.info(f"Loaded {loaded} token revocation(s)")
+
+
+async def receive_auth_event(event: dict):
+    """Backplane event handler for revocations and user changes made on other workers"""
+    if event["type"] == "token_revoked":
+        token_hash = bytes.fromhex(event["token_hash"])
+        token_cache.invalidate(token_hash)
+        revoked_tokens.add(token_hash)
+    elif event["type"] == "user_changed":
+        token_cache.invalidate_user(event["user_id"])
+    elif event["type"] == "reconnected":
+        # Events published while the connection was down are lost: the table has them
+        await load_revocations()
+
+
+# Users whose row was updated, per session, until the transaction ends
+CHANGED_USERS_KEY = "changed_user_ids"
+_forget_tasks: Set[asyncio.Task] = set()
+
+
+@event.listens_for(User, "after_update")
+def _user_updated(mapper, connection, target):
+    session = Session.object_session(target)
+    if session is not None:
+        session.info.setdefault(CHANGED_USERS_KEY, set()).add(target.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _forget_changed_users(session):
+    for user_id in session.info.pop(CHANGED_USERS_KEY, ()):
+        # Runs inside the event loop (AsyncSession drives the sync session from it)
+        task = asyncio.get_running_loop().create_task(forget_user(user_id))
+        _forget_tasks.add(task)
+        task.add_done_callback(_forget_tasks.discard)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changed_users(session):
+    session.info.pop(CHANGED_USERS_KEY, None)
+
+
+token_cache = TokenCache()
+revoked_tokens = RevocationFilter()
@@ -0,0 +1,177 @@
+"""
+Background cleanup of expired tokens.
+
+Every TOKEN_REAP_INTERVAL_SECONDS the reaper deletes expired rows from the
+tokens and revoked_tokens tables in batches of TOKEN_REAP_BATCH_SIZE, one short transaction per
+batch, so it never holds long locks or bloats a single transaction. Batches
+use SKIP LOCKED, so several workers can run it at the same time.
+
+With TOKEN_PARTITIONING (tokens partitioned by day of expires_at, see
+token_partitioning.sql) it also creates the partitions for the next
+TOKEN_PARTITION_AHEAD_DAYS and drops partitions that only hold expired
+tokens, which is instant compared to deleting their rows.
+"""
+import asyncio
+import logging
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import text
+
+from src.config import (
+    TOKEN_REAP_INTERVAL_SECONDS,
+    TOKEN_REAP_BATCH_SIZE,
+    TOKEN_PARTITIONING,
+    TOKEN_PARTITION_AHEAD_DAYS,
+)
+from src.database import async_session_maker
+
+logger = logging.getLogger(__name__)
+
+PARTITION_PREFIX = "tokens_p"
+
+DELETE_EXPIRED_BATCH = text("""
+    DELETE FROM tokens
+    WHERE id IN (
+        SELECT id FROM tokens
+        WHERE expires_at < now()
+        LIMIT :batch_size
+        FOR UPDATE SKIP LOCKED
+    )
+""")
+
+DELETE_EXPIRED_REVOCATIONS_BATCH = text("""
+    DELETE FROM revoked_tokens
+    WHERE token_hash IN (
+        SELECT token_hash FROM revoked_tokens
+        WHERE expires_at < now()
+        LIMIT :batch_size
+        FOR UPDATE SKIP LOCKED
+    )
+""")
+
+LIST_PARTITIONS = text("""
+    SELECT child.relname
+    FROM pg_inherits
+    JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+    JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+    WHERE parent.relname = 'tokens'
+""")
+
+
+def partition_name(day: date) -> str:
+    return f"{PARTITION_PREFIX}{day:%Y%m%d}"
+
+
+class TokenReaper:
+    def __init__(
+        self,
+        interval_seconds: float = TOKEN_REAP_INTERVAL_SECONDS,
+        batch_size: int = TOKEN_REAP_BATCH_SIZE,
+        partitioned: bool = TOKEN_PARTITIONING,
+    ):
+        self.interval = interval_seconds
+        self.batch_size = batch_size
+        self.partitioned = partitioned
+        self._task: Optional[asyncio.Task] = None
+        self.deleted = 0
+        self.revocations_deleted = 0
+        self.partitions_dropped = 0
+        self.last_run_at: Optional[datetime] = None
+
+    def start(self):
+        """Start the periodic cleanup (call from the application startup hook)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def run_once(self) -> int:
+        """Drop expired partitions (if partitioned) and delete the remaining expired rows"""
+        if self.partitioned:
+            try:
+                await self._maintain_partitions()
+            except Exception as e:
+                # Row deletion below still keeps the table in check
+                logger.error(f"Token partition maintenance failed: {e}", exc_info=True)
+
+        deleted = await self._delete_in_batches(DELETE_EXPIRED_BATCH)
+        # Expired tokens are rejected by their signature, their revocation is no longer needed
+        self.revocations_deleted += await self._delete_in_batches(DELETE_EXPIRED_REVOCATIONS_BATCH)
+
+        self.deleted += deleted
+        self.last_run_at = datetime.now(timezone.utc)
+        if deleted:
+            logger.info(f"Deleted {deleted} expired token(s)")
+        return deleted
+
+    async def _delete_in_batches(self, statement) -> int:
+        deleted = 0
+        while True:
+            async with async_session_maker() as session:
+                result = await session.execute(statement, {"batch_size": self.batch_size})
+                await session.commit()
+            deleted += result.rowcount
+            if result.rowcount < self.batch_size:
+                return deleted
+            # Let game traffic through between batches
+            await asyncio.sleep(0)
+
+    async def _maintain_partitions(self):
+        today = datetime.now(timezone.utc).date()
+        async with async_session_maker() as session:
+            result = await session.execute(LIST_PARTITIONS)
+            existing = {row[0] for row in result.all()}
+
+            # Partitions for tokens issued from now on (longest lifetime is the access token)
+            for offset in range(TOKEN_PARTITION_AHEAD_DAYS + 1):
+                day = today + timedelta(days=offset)
+                name = partition_name(day)
+                if name not in existing:
+                    await session.execute(text(
+                        f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF tokens "
+                        f"FOR VALUES FROM ('{day.isoformat()} 00:00+00') TO ('{(day + timedelta(days=1)).isoformat()} 00:00+00')"
+                    ))
+
+            # A partition of an earlier day only holds expired tokens
+            for name in sorted(existing):
+                if not name.startswith(PARTITION_PREFIX):
+                    continue  # e.g. the default partition
+                try:
+                    day = datetime.strptime(name[len(PARTITION_PREFIX):], "%Y%m%d").date()
+                except ValueError:
+                    continue
+                if day < today:
+                    await session.execute(text(f"DROP TABLE IF EXISTS {name}"))
+                    self.partitions_dropped += 1
+                    logger.info(f"Dropped expired token partition {name}")
+
+            await session.commit()
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Expired token cleanup failed: {e}", exc_info=True)
+            await asyncio.sleep(self.interval)
+
+    def stats(self) -> dict:
+        return {
+            "deleted": self.deleted,
+            "revocations_deleted": self.revocations_deleted,
+            "partitions_dropped": self.partitions_dropped,
+            "last_run_at": self.last_run_at.isoformat() if self.last_run_at else None,
+        }
+
+
+token_reaper = TokenReaper()
@@ -21,3 +21,69 @@ SECRET_KEY = os.environ.get("SECRET_AUTH", "your-secret-key-change-in-production
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 7 days
 REFRESH_TOKEN_EXPIRE_DAYS = 3  # 3 days
+
+# Game move persistence (write-behind)
+MOVE_FLUSH_INTERVAL_MS = int(os.environ.get("MOVE_FLUSH_INTERVAL_MS", "50"))
+MOVE_FLUSH_BATCH_SIZE = int(os.environ.get("MOVE_FLUSH_BATCH_SIZE", "500"))
+MOVE_FLUSH_MAX_ATTEMPTS = int(os.environ.get("MOVE_FLUSH_MAX_ATTEMPTS", "5"))
+
+# Pub/sub backplane for rooms spanning several workers ("memory://", "unix:///path", "redis://host:port")
+BACKPLANE_URL = os.environ.get("BACKPLANE_URL", "memory://")
+
+# Per-socket outbound queue: frames buffered per connection and max time a single send may take
+WS_SEND_QUEUE_SIZE = int(os.environ.get("WS_SEND_QUEUE_SIZE", "64"))
+WS_SEND_TIMEOUT_SECONDS = float(os.environ.get("WS_SEND_TIMEOUT_SECONDS", "5"))
+# Frames queued for a batching client (`batch=1`) that may go out in one WebSocket message
+WS_COALESCE_MAX_FRAMES = int(os.environ.get("WS_COALESCE_MAX_FRAMES", "16"))
+# permessage-deflate, for messages of at least WS_COMPRESS_MIN_BYTES (see src/game/ws_compression.py)
+WS_PER_MESSAGE_DEFLATE = os.environ.get("WS_PER_MESSAGE_DEFLATE", "true").lower() in ("1", "true", "yes")
+WS_COMPRESS_MIN_BYTES = int(os.environ.get("WS_COMPRESS_MIN_BYTES", "512"))
+
+# Database connection pool
+# DB_POOL_MODE: "pooled" (default), "null" (new connection per session) or
+# "pgbouncer" (pooled, behind PgBouncer in transaction mode - no prepared statement cache)
+DB_POOL_MODE = os.environ.get("DB_POOL_MODE", "pooled")
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", "3600"))
+DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+
+# Access token verification cache (per process)
+AUTH_TOKEN_CACHE_SIZE = int(os.environ.get("AUTH_TOKEN_CACHE_SIZE", "10000"))
+AUTH_TOKEN_CACHE_TTL_SECONDS = float(os.environ.get("AUTH_TOKEN_CACHE_TTL_SECONDS", "60"))
+# Stateless mode: trust the JWT signature and only ask the database about possibly revoked tokens
+AUTH_STATELESS = os.environ.get("AUTH_STATELESS", "false").lower() in ("1", "true", "yes")
+AUTH_REVOCATION_FILTER_BITS = int(os.environ.get("AUTH_REVOCATION_FILTER_BITS", str(1 << 20)))
+AUTH_REVOCATION_FILTER_HASHES = int(os.environ.get("AUTH_REVOCATION_FILTER_HASHES", "7"))
+
+# Password hashing executor ("thread" or "process"), its size and the most calls allowed to wait
+PASSWORD_HASH_EXECUTOR = os.environ.get("PASSWORD_HASH_EXECUTOR", "thread")
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_MAX_PENDING = int(os.environ.get("PASSWORD_HASH_MAX_PENDING", "64"))
+
+# Expired token cleanup
+TOKEN_REAP_INTERVAL_SECONDS = float(os.environ.get("TOKEN_REAP_INTERVAL_SECONDS", "600"))
+TOKEN_REAP_BATCH_SIZE = int(os.environ.get("TOKEN_REAP_BATCH_SIZE", "1000"))
+# Set when the tokens table is partitioned by expires_at (see token_partitioning.sql)
+TOKEN_PARTITIONING = os.environ.get("TOKEN_PARTITIONING", "false").lower() in ("1", "true", "yes")
+TOKEN_PARTITION_AHEAD_DAYS = int(os.environ.get("TOKEN_PARTITION_AHEAD_DAYS", "10"))
+
+# Matchmaking: width of the rating buckets waiting rooms are grouped in
+MATCHMAKING_BUCKET_SIZE = int(os.environ.get("MATCHMAKING_BUCKET_SIZE", "50"))
+# Rating difference a waiting player accepts: starts at the base window and widens per second of waiting
+MATCHMAKING_BASE_WINDOW = int(os.environ.get("MATCHMAKING_BASE_WINDOW", "100"))
+MATCHMAKING_WINDOW_GROWTH = float(os.environ.get("MATCHMAKING_WINDOW_GROWTH", "10"))
+MATCHMAKING_MAX_WINDOW = int(os.environ.get("MATCHMAKING_MAX_WINDOW", "1000"))
+
+# Game clocks: resolution of the timer wheel that ends games on time
+CLOCK_TICK_MS = int(os.environ.get("CLOCK_TICK_MS", "100"))
+
+# Abandoned rooms: waiting rooms nobody connected to are deleted, inactive games are finished
+ROOM_SWEEP_INTERVAL_SECONDS = int(os.environ.get("ROOM_SWEEP_INTERVAL_SECONDS", "60"))
+ROOM_SWEEP_BATCH_SIZE = int(os.environ.get("ROOM_SWEEP_BATCH_SIZE", "500"))
+ROOM_WAITING_MAX_AGE_SECONDS = int(os.environ.get("ROOM_WAITING_MAX_AGE_SECONDS", "300"))
+ROOM_ABANDONED_MAX_AGE_SECONDS = int(os.environ.get("ROOM_ABANDONED_MAX_AGE_SECONDS", "3600"))
+
+# Leaderboard: the in-memory ranking is rebuilt from the database this often
+LEADERBOARD_REFRESH_SECONDS = int(os.environ.get("LEADERBOARD_REFRESH_SECONDS", "300"))
@@ -1,13 +1,17 @@
 from typing import AsyncGenerator
 import logging
+import uuid
 
-from sqlalchemy import MetaData
+from sqlalchemy import MetaData, event
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import NullPool
 
-from src.config import DB_HOST, DB_NAME, DB_PASS, DB_PORT, DB_USER
+from src.config import (
+    DB_HOST, DB_NAME, DB_PASS, DB_PORT, DB_USER,
+    DB_POOL_MODE, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_POOL_PRE_PING,
+)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -24,14 +28,67 @@ except Exception as e:
 Base = declarative_base()
 metadata = MetaData()
 
+
+def _engine_options(pool_mode: str) -> dict:
+    """Keyword arguments for create_async_engine for the configured pool mode"""
+    if pool_mode == "null":
+        # A fresh connection for every session
+        return {"poolclass": NullPool}
+    if pool_mode not in ("pooled", "pgbouncer"):
+        raise ValueError(f"Unsupported DB_POOL_MODE: {pool_mode}")
+
+    options = {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,   # Recycle connections periodically
+        "pool_pre_ping": DB_POOL_PRE_PING,  # Verify connections before use
+    }
+    if pool_mode == "pgbouncer":
+        # PgBouncer in transaction mode can hand each transaction a different server
+        # connection, so prepared statements must neither be cached nor reuse names
+        options["connect_args"] = {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__",
+        }
+    return options
+
+
 # Create engine with connection pooling and error handling
 engine = create_async_engine(
-    DATABASE_URL, 
-    poolclass=NullPool,
+    DATABASE_URL,
     echo=False,  # Set to True for SQL query logging
-    pool_pre_ping=True,  # Verify connections before use
-    pool_recycle=3600,   # Recycle connections every hour
+    **_engine_options(DB_POOL_MODE),
 )
+logger.info(f"Database pool mode: {DB_POOL_MODE}")
+
+# Number of physical connections opened, to tell pool reuse from new handshakes
+_connections_opened = 0
+
+
+@event.listens_for(engine.sync_engine, "connect")
+def _count_connection(dbapi_connection, connection_record):
+    global _connections_opened
+    _connections_opened += 1
+
+
+def get_pool_status() -> dict:
+    """Connection pool metrics"""
+    pool = engine.pool
+    status = {
+        "mode": DB_POOL_MODE,
+        "connections_opened": _connections_opened,
+    }
+    if not isinstance(pool, NullPool):
+        status.update({
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+            "max_overflow": DB_MAX_OVERFLOW,
+        })
+    return status
 
 async_session_maker = sessionmaker(
     engine, 
@@ -0,0 +1,400 @@
+"""
+Pub/sub backplane for room messages.
+
+Lets the two players of a room live on different uvicorn workers or pods:
+RoomManager delivers every room message to its local sockets and publishes
+it on the backplane, and every other worker delivers it to the sockets it
+holds for that room. Each room is its own channel, and a worker only
+subscribes to the rooms it has connections for. Every worker also follows
+the events channel, for state that is not tied to a room (such as revoked
+access tokens, see src.auth.token_cache).
+
+Selected with BACKPLANE_URL:
+    memory://                               single process, nothing is published (default)
+    unix:///tmp/chess_rps_backplane.sock    stand-in broker on a Unix socket
+    redis://host:6379                       Redis (or the stand-in broker over TCP)
+
+The network backplane speaks the Redis protocol (PUBLISH / SUBSCRIBE), so
+a real Redis works as well as the bundled stand-in broker. Run the broker with:
+    python -m src.game.backplane unix:///tmp/chess_rps_backplane.sock
+"""
+import asyncio
+import base64
+import logging
+import sys
+import uuid
+from typing import Awaitable, Callable, Dict, Optional, Set
+from urllib.parse import urlparse
+
+from src.config import BACKPLANE_URL
+from src.game.protocol import OutgoingMessage, encode, decode
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_PREFIX = "chess_rps:room:"
+EVENTS_CHANNEL = "chess_rps:events"
+RECONNECT_DELAY_SECONDS = 1.0
+
+# Called with (room_id, envelope) for every message published by another worker
+MessageHandler = Callable[[int, dict], Awaitable[None]]
+# Called with every event published by another worker, and with {"type": "reconnected"}
+# after a lost connection came back (events published meanwhile were missed)
+EventHandler = Callable[[dict], Awaitable[None]]
+
+
+def room_channel(room_id: int) -> str:
+    return f"{CHANNEL_PREFIX}{room_id}"
+
+
+class Backplane:
+    """In-process backplane: a single worker already delivered everything locally."""
+
+    async def start(self, handler: MessageHandler, event_handler: Optional[EventHandler] = None):
+        self._handler = handler
+
+    async def stop(self):
+        pass
+
+    async def subscribe(self, room_id: int):
+        pass
+
+    async def unsubscribe(self, room_id: int):
+        pass
+
+    async def publish(
+        self,
+        room_id: int,
+        message: OutgoingMessage,
+        move: Optional[dict] = None,
+        player_id: Optional[int] = None,
+        status: Optional[str] = None,
+    ):
+        pass
+
+    async def publish_event(self, event: dict):
+        pass
+
+    def status(self) -> dict:
+        return {"type": "memory"}
+
+
+# ----------------------------------------------------------------------
+# Redis protocol (RESP) helpers
+# ----------------------------------------------------------------------
+
+def encode_bulk(value) -> bytes:
+    if isinstance(value, str):
+        value = value.encode()
+    elif isinstance(value, int):
+        value = str(value).encode()
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+def encode_command(*args) -> bytes:
+    return b"*%d\r\n" % len(args) + b"".join(encode_bulk(arg) for arg in args)
+
+
+async def read_reply(reader: asyncio.StreamReader):
+    """Read one RESP value. Error replies are returned (not raised) so pipelined readers keep going."""
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError("Backplane connection closed")
+    kind, rest = line[:1], line[1:-2]
+    if kind == b"+":
+        return rest.decode()
+    if kind == b"-":
+        return ConnectionError(rest.decode())
+    if kind == b":":
+        return int(rest)
+    if kind == b"$":
+        length = int(rest)
+        if length == -1:
+            return None
+        data = await reader.readexactly(length + 2)
+        return data[:-2]
+    if kind == b"*":
+        length = int(rest)
+        if length == -1:
+            return None
+        return [await read_reply(reader) for _ in range(length)]
+    raise ConnectionError(f"Unexpected reply from backplane: {line!r}")
+
+
+async def open_connection(url: str):
+    parsed = urlparse(url)
+    if parsed.scheme == "unix":
+        return await asyncio.open_unix_connection(parsed.path)
+    return await asyncio.open_connection(parsed.hostname or "localhost", parsed.port or 6379)
+
+
+def redact_url(url: str) -> str:
+    """The URL without its userinfo (e.g. a Redis password), for logs and /metrics"""
+    parsed = urlparse(url)
+    if "@" not in parsed.netloc:
+        return url
+    return parsed._replace(netloc="***@" + parsed.netloc.rsplit("@", 1)[1]).geturl()
+
+
+class RespBackplane(Backplane):
+    """Backplane over a Redis-protocol broker (Redis or the stand-in broker)."""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.display_url = redact_url(url)
+        # Identifies this worker so it can skip its own publications
+        self.worker_id = uuid.uuid4().hex
+        self._handler: Optional[MessageHandler] = None
+        self._event_handler: Optional[EventHandler] = None
+        self._channels: Set[str] = set()
+        self._pub_writer: Optional[asyncio.StreamWriter] = None
+        self._sub_writer: Optional[asyncio.StreamWriter] = None
+        self._task: Optional[asyncio.Task] = None
+        self._connected = False
+        self.published = 0
+        self.received = 0
+        self.dropped = 0
+
+    async def start(self, handler: MessageHandler, event_handler: Optional[EventHandler] = None):
+        self._handler = handler
+        self._event_handler = event_handler
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._close()
+
+    async def subscribe(self, room_id: int):
+        channel = room_channel(room_id)
+        self._channels.add(channel)
+        if self._sub_writer is not None:
+            self._sub_writer.write(encode_command("SUBSCRIBE", channel))
+
+    async def unsubscribe(self, room_id: int):
+        channel = room_channel(room_id)
+        self._channels.discard(channel)
+        if self._sub_writer is not None:
+            self._sub_writer.write(encode_command("UNSUBSCRIBE", channel))
+
+    async def publish(
+        self,
+        room_id: int,
+        message: OutgoingMessage,
+        move: Optional[dict] = None,
+        player_id: Optional[int] = None,
+        status: Optional[str] = None,
+    ):
+        if self._pub_writer is None:
+            # Local delivery already happened; remote players miss this frame
+            self.dropped += 1
+            return
+        if not isinstance(message, str):
+            # Protocol versions travel as JSON object keys, binary frames as base64
+            message = {
+                str(version): frame if isinstance(frame, str) else {"b64": base64.b64encode(frame).decode()}
+                for version, frame in message.items()
+            }
+        envelope = {"origin": self.worker_id, "message": message}
+        if move is not None:
+            envelope["move"] = move
+        if player_id is not None:
+            envelope["player_id"] = player_id
+        if status is not None:
+            envelope["status"] = status
+        try:
+            self._pub_writer.write(encode_command("PUBLISH", room_channel(room_id), encode(envelope)))
+            await self._pub_writer.drain()
+            self.published += 1
+        except Exception as e:
+            self.dropped += 1
+            logger.warning(f"Failed to publish to room {room_id} on backplane: {e}")
+
+    async def publish_event(self, event: dict):
+        if self._pub_writer is None:
+            self.dropped += 1
+            return
+        try:
+            self._pub_writer.write(encode_command("PUBLISH", EVENTS_CHANNEL, encode({"origin": self.worker_id, "event": event})))
+            await self._pub_writer.drain()
+            self.published += 1
+        except Exception as e:
+            self.dropped += 1
+            logger.warning(f"Failed to publish {event.get('type')} event on backplane: {e}")
+
+    def status(self) -> dict:
+        return {
+            "type": "resp",
+            "url": self.display_url,
+            "connected": self._connected,
+            "subscribed_rooms": len(self._channels),
+            "published": self.published,
+            "received": self.received,
+            "dropped": self.dropped,
+        }
+
+    def _close(self):
+        self._connected = False
+        for writer in (self._pub_writer, self._sub_writer):
+            if writer is not None:
+                writer.close()
+        self._pub_writer = None
+        self._sub_writer = None
+
+    async def _run(self):
+        connected_before = False
+        while True:
+            try:
+                pub_reader, pub_writer = await open_connection(self.url)
+                sub_reader, sub_writer = await open_connection(self.url)
+                sub_writer.write(encode_command("SUBSCRIBE", EVENTS_CHANNEL, *self._channels))
+                self._pub_writer, self._sub_writer = pub_writer, sub_writer
+                self._connected = True
+                logger.info(f"Connected to backplane at {self.display_url}")
+                if connected_before and self._event_handler is not None:
+                    await self._deliver_event({"type": "reconnected"})
+                connected_before = True
+
+                drain_task = asyncio.create_task(self._discard_replies(pub_reader))
+                try:
+                    await self._read_messages(sub_reader)
+                finally:
+                    drain_task.cancel()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Backplane connection to {self.display_url} lost: {e}")
+            self._close()
+            await asyncio.sleep(RECONNECT_DELAY_SECONDS)
+
+    async def _discard_replies(self, reader: asyncio.StreamReader):
+        # PUBLISH replies with the receiver count, which we don't need
+        while True:
+            await read_reply(reader)
+
+    async def _read_messages(self, reader: asyncio.StreamReader):
+        while True:
+            reply = await read_reply(reader)
+            if not isinstance(reply, list) or len(reply) != 3 or reply[0] != b"message":
+                continue  # subscribe / unsubscribe confirmations
+            channel = reply[1].decode()
+            if channel != EVENTS_CHANNEL and not channel.startswith(CHANNEL_PREFIX):
+                continue
+            envelope = decode(reply[2])
+            if envelope.get("origin") == self.worker_id:
+                continue
+            if channel == EVENTS_CHANNEL:
+                self.received += 1
+                if self._event_handler is not None:
+                    await self._deliver_event(envelope["event"])
+                continue
+            if isinstance(envelope["message"], dict):
+                envelope["message"] = {
+                    int(version): frame if isinstance(frame, str) else base64.b64decode(frame["b64"])
+                    for version, frame in envelope["message"].items()
+                }
+            self.received += 1
+            try:
+                await self._handler(int(channel[len(CHANNEL_PREFIX):]), envelope)
+            except Exception as e:
+                logger.error(f"Failed to deliver backplane message on {channel}: {e}", exc_info=True)
+
+    async def _deliver_event(self, event: dict):
+        try:
+            await self._event_handler(event)
+        except Exception as e:
+            logger.error(f"Failed to handle backplane event {event.get('type')}: {e}", exc_info=True)
+
+
+# ----------------------------------------------------------------------
+# Stand-in broker
+# ----------------------------------------------------------------------
+
+class RespBroker:
+    """
+    Minimal Redis-compatible pub/sub broker (SUBSCRIBE, UNSUBSCRIBE, PUBLISH, PING)
+    for running several workers on one host without a Redis server.
+    """
+
+    def __init__(self):
+        self.subscribers: Dict[str, Set[asyncio.StreamWriter]] = {}
+
+    async def serve(self, url: str):
+        parsed = urlparse(url)
+        if parsed.scheme == "unix":
+            server = await asyncio.start_unix_server(self._handle_client, path=parsed.path)
+        else:
+            server = await asyncio.start_server(self._handle_client, parsed.hostname or "localhost", parsed.port or 6379)
+        logger.info(f"Backplane broker listening on {redact_url(url)}")
+        async with server:
+            await server.serve_forever()
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        channels: Set[str] = set()
+        try:
+            while True:
+                command = await read_reply(reader)
+                if not isinstance(command, list) or not command:
+                    writer.write(b"-ERR expected a command array\r\n")
+                    continue
+                name = command[0].decode().upper()
+                args = command[1:]
+
+                if name == "PUBLISH" and len(args) == 2:
+                    channel = args[0].decode()
+                    message = encode_command("message", args[0], args[1])
+                    receivers = self.subscribers.get(channel, set())
+                    for subscriber in receivers:
+                        subscriber.write(message)
+                    writer.write(b":%d\r\n" % len(receivers))
+                elif name == "SUBSCRIBE":
+                    for arg in args:
+                        channel = arg.decode()
+                        channels.add(channel)
+                        self.subscribers.setdefault(channel, set()).add(writer)
+                        writer.write(b"*3\r\n" + encode_bulk("subscribe") + encode_bulk(arg) + b":%d\r\n" % len(channels))
+                elif name == "UNSUBSCRIBE":
+                    for arg in args:
+                        channel = arg.decode()
+                        channels.discard(channel)
+                        self._remove_subscriber(channel, writer)
+                        writer.write(b"*3\r\n" + encode_bulk("unsubscribe") + encode_bulk(arg) + b":%d\r\n" % len(channels))
+                elif name == "PING":
+                    writer.write(b"+PONG\r\n")
+                else:
+                    writer.write(f"-ERR unsupported command '{name}'\r\n".encode())
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            for channel in channels:
+                self._remove_subscriber(channel, writer)
+            writer.close()
+
+    def _remove_subscriber(self, channel: str, writer: asyncio.StreamWriter):
+        subscribers = self.subscribers.get(channel)
+        if subscribers is not None:
+            subscribers.discard(writer)
+            if not subscribers:
+                del self.subscribers[channel]
+
+
+def create_backplane(url: str) -> Backplane:
+    scheme = urlparse(url).scheme if url else "memory"
+    if scheme in ("", "memory"):
+        return Backplane()
+    if scheme in ("unix", "redis", "tcp"):
+        return RespBackplane(url)
+    raise ValueError(f"Unsupported BACKPLANE_URL: {redact_url(url)}")
+
+
+backplane = create_backplane(BACKPLANE_URL)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(RespBroker().serve(sys.argv[1] if len(sys.argv) > 1 else "unix:///tmp/chess_rps_backplane.sock"))
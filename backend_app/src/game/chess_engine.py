@@ -0,0 +1,612 @@
+"""
+Server-side chess rules engine.
+
+A compact 0x88 board with incremental make/unmake and Zobrist hashing. It is
+used to verify every move received over the WebSocket and to detect the end
+of a game (checkmate, stalemate, repetition, fifty-move rule, insufficient
+material). Run `python perft.py` from the backend directory to check the
+move generator and measure its speed.
+
+Squares are 0x88 indexes: rank * 16 + file, with a1 = 0 and h8 = 119.
+Moves are packed ints: from | to << 7 | promotion << 14 | flag << 17.
+"""
+import random
+from typing import Dict, List, Optional, Tuple
+
+WHITE = 0
+BLACK = 1
+
+EMPTY = 0
+PAWN = 1
+KNIGHT = 2
+BISHOP = 3
+ROOK = 4
+QUEEN = 5
+KING = 6
+
+# Move flags
+FLAG_NORMAL = 0
+FLAG_DOUBLE_PUSH = 1
+FLAG_EN_PASSANT = 2
+FLAG_CASTLE = 3
+
+# Castling rights bits
+WHITE_KINGSIDE = 1
+WHITE_QUEENSIDE = 2
+BLACK_KINGSIDE = 4
+BLACK_QUEENSIDE = 8
+
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+KNIGHT_OFFSETS = (33, 31, 18, 14, -33, -31, -18, -14)
+BISHOP_OFFSETS = (15, 17, -15, -17)
+ROOK_OFFSETS = (1, -1, 16, -16)
+KING_OFFSETS = BISHOP_OFFSETS + ROOK_OFFSETS
+
+PIECE_SYMBOLS = {PAWN: "p", KNIGHT: "n", BISHOP: "b", ROOK: "r", QUEEN: "q", KING: "k"}
+SYMBOL_PIECES = {symbol: piece for piece, symbol in PIECE_SYMBOLS.items()}
+PROMOTION_PIECES = (QUEEN, ROOK, BISHOP, KNIGHT)
+
+
+class IllegalMove(ValueError):
+    """Raised when a move is malformed or not legal in the current position."""
+
+
+def make_piece(color: int, piece_type: int) -> int:
+    return piece_type | (color << 3)
+
+
+def piece_type(piece: int) -> int:
+    return piece & 7
+
+
+def piece_color(piece: int) -> int:
+    return piece >> 3
+
+
+def square(file: int, rank: int) -> int:
+    return rank * 16 + file
+
+
+def parse_square(name: str) -> int:
+    if len(name) != 2 or name[0] not in "abcdefgh" or name[1] not in "12345678":
+        raise IllegalMove(f"Invalid square: {name}")
+    return square(ord(name[0]) - ord("a"), int(name[1]) - 1)
+
+
+def square_name(sq: int) -> str:
+    return "abcdefgh"[sq & 7] + str((sq >> 4) + 1)
+
+
+def encode_move(from_sq: int, to_sq: int, promotion: int = EMPTY, flag: int = FLAG_NORMAL) -> int:
+    return from_sq | (to_sq << 7) | (promotion << 14) | (flag << 17)
+
+
+def move_from(move: int) -> int:
+    return move & 0x7F
+
+
+def move_to(move: int) -> int:
+    return (move >> 7) & 0x7F
+
+
+def move_promotion(move: int) -> int:
+    return (move >> 14) & 7
+
+
+def move_flag(move: int) -> int:
+    return move >> 17
+
+
+def move_to_uci(move: int) -> str:
+    uci = square_name(move_from(move)) + square_name(move_to(move))
+    if move_promotion(move):
+        uci += PIECE_SYMBOLS[move_promotion(move)]
+    return uci
+
+
+# Castling rights that survive a move touching a given square
+CASTLING_MASK = [15] * 128
+CASTLING_MASK[square(4, 0)] = 15 & ~(WHITE_KINGSIDE | WHITE_QUEENSIDE)
+CASTLING_MASK[square(7, 0)] = 15 & ~WHITE_KINGSIDE
+CASTLING_MASK[square(0, 0)] = 15 & ~WHITE_QUEENSIDE
+CASTLING_MASK[square(4, 7)] = 15 & ~(BLACK_KINGSIDE | BLACK_QUEENSIDE)
+CASTLING_MASK[square(7, 7)] = 15 & ~BLACK_KINGSIDE
+CASTLING_MASK[square(0, 7)] = 15 & ~BLACK_QUEENSIDE
+
+# Zobrist keys (fixed seed so hashes are stable across processes)
+_zobrist_random = random.Random(0x5EED)
+ZOBRIST_PIECES = [[_zobrist_random.getrandbits(64) for _ in range(128)] for _ in range(16)]
+ZOBRIST_CASTLING = [_zobrist_random.getrandbits(64) for _ in range(16)]
+ZOBRIST_EN_PASSANT = [_zobrist_random.getrandbits(64) for _ in range(8)]
+ZOBRIST_BLACK_TO_MOVE = _zobrist_random.getrandbits(64)
+
+
+class Board:
+    def __init__(self, fen: str = START_FEN):
+        self.squares: List[int] = [EMPTY] * 128
+        self.turn = WHITE
+        self.castling = 0
+        self.en_passant = -1
+        self.halfmove_clock = 0
+        self.fullmove_number = 1
+        self.king_squares = [-1, -1]
+        self.hash = 0
+        # Undo stack for unmake: (move, captured, castling, en_passant, halfmove_clock, hash)
+        self._undo: List[tuple] = []
+        # Position hash -> number of occurrences, only maintained by push()
+        self.repetitions: Dict[int, int] = {}
+        self.set_fen(fen)
+
+    # ------------------------------------------------------------------
+    # Setup
+    # ------------------------------------------------------------------
+
+    def set_fen(self, fen: str):
+        parts = fen.split()
+        if len(parts) < 4:
+            raise ValueError(f"Invalid FEN: {fen}")
+
+        self.squares = [EMPTY] * 128
+        self.king_squares = [-1, -1]
+        for rank_index, row in enumerate(parts[0].split("/")):
+            rank = 7 - rank_index
+            file = 0
+            for char in row:
+                if char.isdigit():
+                    file += int(char)
+                    continue
+                color = WHITE if char.isupper() else BLACK
+                kind = SYMBOL_PIECES[char.lower()]
+                sq = square(file, rank)
+                self.squares[sq] = make_piece(color, kind)
+                if kind == KING:
+                    self.king_squares[color] = sq
+                file += 1
+
+        self.turn = WHITE if parts[1] == "w" else BLACK
+        self.castling = 0
+        for char, right in (("K", WHITE_KINGSIDE), ("Q", WHITE_QUEENSIDE), ("k", BLACK_KINGSIDE), ("q", BLACK_QUEENSIDE)):
+            if char in parts[2]:
+                self.castling |= right
+        self.en_passant = parse_square(parts[3]) if parts[3] != "-" else -1
+        self.halfmove_clock = int(parts[4]) if len(parts) > 4 else 0
+        self.fullmove_number = int(parts[5]) if len(parts) > 5 else 1
+
+        self._undo = []
+        self.hash = self._compute_hash()
+        self.repetitions = {self.hash: 1}
+
+    def fen(self) -> str:
+        rows = []
+        for rank in range(7, -1, -1):
+            row = ""
+            empty = 0
+            for file in range(8):
+                piece = self.squares[square(file, rank)]
+                if piece == EMPTY:
+                    empty += 1
+                    continue
+                if empty:
+                    row += str(empty)
+                    empty = 0
+                symbol = PIECE_SYMBOLS[piece_type(piece)]
+                row += symbol.upper() if piece_color(piece) == WHITE else symbol
+            if empty:
+                row += str(empty)
+            rows.append(row)
+
+        castling = "".join(
+            char for char, right in (("K", WHITE_KINGSIDE), ("Q", WHITE_QUEENSIDE), ("k", BLACK_KINGSIDE), ("q", BLACK_QUEENSIDE))
+            if self.castling & right
+        ) or "-"
+        en_passant = square_name(self.en_passant) if self.en_passant != -1 else "-"
+        return f"{'/'.join(rows)} {'w' if self.turn == WHITE else 'b'} {castling} {en_passant} {self.halfmove_clock} {self.fullmove_number}"
+
+    def _compute_hash(self) -> int:
+        h = 0
+        for sq in range(128):
+            if sq & 0x88:
+                continue
+            piece = self.squares[sq]
+            if piece:
+                h ^= ZOBRIST_PIECES[piece][sq]
+        h ^= ZOBRIST_CASTLING[self.castling]
+        if self.en_passant != -1:
+            h ^= ZOBRIST_EN_PASSANT[self.en_passant & 7]
+        if self.turn == BLACK:
+            h ^= ZOBRIST_BLACK_TO_MOVE
+        return h
+
+    # ------------------------------------------------------------------
+    # Attacks
+    # ------------------------------------------------------------------
+
+    def is_attacked(self, sq: int, by_color: int) -> bool:
+        squares = self.squares
+
+        # Pawns attack diagonally forward, so look backwards from the target
+        pawn = make_piece(by_color, PAWN)
+        for offset in ((-15, -17) if by_color == WHITE else (15, 17)):
+            target = sq + offset
+            if not target & 0x88 and squares[target] == pawn:
+                return True
+
+        knight = make_piece(by_color, KNIGHT)
+        for offset in KNIGHT_OFFSETS:
+            target = sq + offset
+            if not target & 0x88 and squares[target] == knight:
+                return True
+
+        king = make_piece(by_color, KING)
+        for offset in KING_OFFSETS:
+            target = sq + offset
+            if not target & 0x88 and squares[target] == king:
+                return True
+
+        bishop = make_piece(by_color, BISHOP)
+        rook = make_piece(by_color, ROOK)
+        queen = make_piece(by_color, QUEEN)
+        for offset in BISHOP_OFFSETS:
+            target = sq + offset
+            while not target & 0x88:
+                piece = squares[target]
+                if piece:
+                    if piece == bishop or piece == queen:
+                        return True
+                    break
+                target += offset
+        for offset in ROOK_OFFSETS:
+            target = sq + offset
+            while not target & 0x88:
+                piece = squares[target]
+                if piece:
+                    if piece == rook or piece == queen:
+                        return True
+                    break
+                target += offset
+        return False
+
+    def in_check(self, color: Optional[int] = None) -> bool:
+        if color is None:
+            color = self.turn
+        if self.king_squares[color] == -1:
+            return False  # Captured (RPS mode)
+        return self.is_attacked(self.king_squares[color], color ^ 1)
+
+    # ------------------------------------------------------------------
+    # Move generation
+    # ------------------------------------------------------------------
+
+    def pseudo_legal_moves(self, from_square: Optional[int] = None) -> List[int]:
+        """Generate moves ignoring checks, optionally only for one origin square"""
+        moves = []
+        squares = self.squares
+        color = self.turn
+        enemy = color ^ 1
+        origins = (from_square,) if from_square is not None else range(128)
+
+        for sq in origins:
+            if sq & 0x88:
+                continue
+            piece = squares[sq]
+            if not piece or piece_color(piece) != color:
+                continue
+            kind = piece_type(piece)
+
+            if kind == PAWN:
+                self._pawn_moves(sq, color, moves)
+            elif kind == KNIGHT or kind == KING:
+                for offset in (KNIGHT_OFFSETS if kind == KNIGHT else KING_OFFSETS):
+                    target = sq + offset
+                    if target & 0x88:
+                        continue
+                    occupant = squares[target]
+                    if not occupant or piece_color(occupant) == enemy:
+                        moves.append(encode_move(sq, target))
+                if kind == KING:
+                    self._castling_moves(sq, color, moves)
+            else:
+                if kind == BISHOP:
+                    offsets = BISHOP_OFFSETS
+                elif kind == ROOK:
+                    offsets = ROOK_OFFSETS
+                else:
+                    offsets = KING_OFFSETS
+                for offset in offsets:
+                    target = sq + offset
+                    while not target & 0x88:
+                        occupant = squares[target]
+                        if occupant:
+                            if piece_color(occupant) == enemy:
+                                moves.append(encode_move(sq, target))
+                            break
+                        moves.append(encode_move(sq, target))
+                        target += offset
+        return moves
+
+    def _pawn_moves(self, sq: int, color: int, moves: List[int]):
+        squares = self.squares
+        forward = 16 if color == WHITE else -16
+        start_rank = 1 if color == WHITE else 6
+        last_rank = 7 if color == WHITE else 0
+
+        def add(target: int, flag: int = FLAG_NORMAL):
+            if target >> 4 == last_rank:
+                for promotion in PROMOTION_PIECES:
+                    moves.append(encode_move(sq, target, promotion, flag))
+            else:
+                moves.append(encode_move(sq, target, EMPTY, flag))
+
+        target = sq + forward
+        if not target & 0x88 and not squares[target]:
+            add(target)
+            double = target + forward
+            if sq >> 4 == start_rank and not squares[double]:
+                moves.append(encode_move(sq, double, EMPTY, FLAG_DOUBLE_PUSH))
+
+        for offset in (forward - 1, forward + 1):
+            target = sq + offset
+            if target & 0x88:
+                continue
+            occupant = squares[target]
+            if occupant and piece_color(occupant) != color:
+                add(target)
+            elif target == self.en_passant:
+                moves.append(encode_move(sq, target, EMPTY, FLAG_EN_PASSANT))
+
+    def _castling_moves(self, sq: int, color: int, moves: List[int]):
+        rights = self.castling & ((WHITE_KINGSIDE | WHITE_QUEENSIDE) if color == WHITE else (BLACK_KINGSIDE | BLACK_QUEENSIDE))
+        if not rights:
+            return
+        rank = 0 if color == WHITE else 7
+        if sq != square(4, rank):
+            return
+        enemy = color ^ 1
+        squares = self.squares
+        kingside = WHITE_KINGSIDE if color == WHITE else BLACK_KINGSIDE
+        queenside = WHITE_QUEENSIDE if color == WHITE else BLACK_QUEENSIDE
+
+        if rights & kingside and not squares[sq + 1] and not squares[sq + 2]:
+            if not self.is_attacked(sq, enemy) and not self.is_attacked(sq + 1, enemy) and not self.is_attacked(sq + 2, enemy):
+                moves.append(encode_move(sq, sq + 2, EMPTY, FLAG_CASTLE))
+        if rights & queenside and not squares[sq - 1] and not squares[sq - 2] and not squares[sq - 3]:
+            if not self.is_attacked(sq, enemy) and not self.is_attacked(sq - 1, enemy) and not self.is_attacked(sq - 2, enemy):
+                moves.append(encode_move(sq, sq - 2, EMPTY, FLAG_CASTLE))
+
+    def legal_moves(self, from_square: Optional[int] = None) -> List[int]:
+        color = self.turn
+        legal = []
+        for move in self.pseudo_legal_moves(from_square):
+            self.make(move)
+            if not self.is_attacked(self.king_squares[color], color ^ 1):
+                legal.append(move)
+            self.unmake()
+        return legal
+
+    def has_legal_move(self) -> bool:
+        """Cheaper than legal_moves() when only existence matters"""
+        color = self.turn
+        for move in self.pseudo_legal_moves():
+            self.make(move)
+            legal = not self.is_attacked(self.king_squares[color], color ^ 1)
+            self.unmake()
+            if legal:
+                return True
+        return False
+
+    # ------------------------------------------------------------------
+    # Make / unmake
+    # ------------------------------------------------------------------
+
+    def make(self, move: int):
+        squares = self.squares
+        from_sq = move & 0x7F
+        to_sq = (move >> 7) & 0x7F
+        promotion = (move >> 14) & 7
+        flag = move >> 17
+        piece = squares[from_sq]
+        color = self.turn
+        h = self.hash
+
+        captured_sq = to_sq
+        if flag == FLAG_EN_PASSANT:
+            captured_sq = to_sq - 16 if color == WHITE else to_sq + 16
+        captured = squares[captured_sq]
+
+        self._undo.append((move, captured, self.castling, self.en_passant, self.halfmove_clock, h))
+
+        if captured:
+            squares[captured_sq] = EMPTY
+            h ^= ZOBRIST_PIECES[captured][captured_sq]
+            if captured & 7 == KING:
+                # Only possible after set_turn (RPS mode): the game is over, see outcome()
+                self.king_squares[color ^ 1] = -1
+
+        squares[from_sq] = EMPTY
+        h ^= ZOBRIST_PIECES[piece][from_sq]
+        placed = make_piece(color, promotion) if promotion else piece
+        squares[to_sq] = placed
+        h ^= ZOBRIST_PIECES[placed][to_sq]
+
+        if piece & 7 == KING:
+            self.king_squares[color] = to_sq
+            if flag == FLAG_CASTLE:
+                if to_sq > from_sq:
+                    rook_from, rook_to = to_sq + 1, to_sq - 1
+                else:
+                    rook_from, rook_to = to_sq - 2, to_sq + 1
+                rook = squares[rook_from]
+                squares[rook_from] = EMPTY
+                squares[rook_to] = rook
+                h ^= ZOBRIST_PIECES[rook][rook_from] ^ ZOBRIST_PIECES[rook][rook_to]
+
+        h ^= ZOBRIST_CASTLING[self.castling]
+        self.castling &= CASTLING_MASK[from_sq] & CASTLING_MASK[to_sq]
+        h ^= ZOBRIST_CASTLING[self.castling]
+
+        if self.en_passant != -1:
+            h ^= ZOBRIST_EN_PASSANT[self.en_passant & 7]
+        if flag == FLAG_DOUBLE_PUSH:
+            self.en_passant = (from_sq + to_sq) >> 1
+            h ^= ZOBRIST_EN_PASSANT[self.en_passant & 7]
+        else:
+            self.en_passant = -1
+
+        if piece & 7 == PAWN or captured:
+            self.halfmove_clock = 0
+        else:
+            self.halfmove_clock += 1
+        if color == BLACK:
+            self.fullmove_number += 1
+
+        self.turn = color ^ 1
+        self.hash = h ^ ZOBRIST_BLACK_TO_MOVE
+
+    def unmake(self):
+        move, captured, castling, en_passant, halfmove_clock, h = self._undo.pop()
+        squares = self.squares
+        from_sq = move & 0x7F
+        to_sq = (move >> 7) & 0x7F
+        promotion = (move >> 14) & 7
+        flag = move >> 17
+
+        self.turn ^= 1
+        color = self.turn
+        if color == BLACK:
+            self.fullmove_number -= 1
+
+        piece = make_piece(color, PAWN) if promotion else squares[to_sq]
+        squares[from_sq] = piece
+        squares[to_sq] = EMPTY
+
+        if flag == FLAG_EN_PASSANT:
+            squares[to_sq - 16 if color == WHITE else to_sq + 16] = captured
+        elif captured:
+            squares[to_sq] = captured
+            if captured & 7 == KING:
+                self.king_squares[color ^ 1] = to_sq
+
+        if piece & 7 == KING:
+            self.king_squares[color] = from_sq
+            if flag == FLAG_CASTLE:
+                if to_sq > from_sq:
+                    rook_from, rook_to = to_sq + 1, to_sq - 1
+                else:
+                    rook_from, rook_to = to_sq - 2, to_sq + 1
+                squares[rook_from] = squares[rook_to]
+                squares[rook_to] = EMPTY
+
+        self.castling = castling
+        self.en_passant = en_passant
+        self.halfmove_clock = halfmove_clock
+        self.hash = h
+
+    # ------------------------------------------------------------------
+    # Game-level API
+    # ------------------------------------------------------------------
+
+    def set_turn(self, color: int):
+        """Hand the move to a side without a move being played (RPS mode)"""
+        if color == self.turn:
+            return
+        if self.en_passant != -1:
+            self.hash ^= ZOBRIST_EN_PASSANT[self.en_passant & 7]
+            self.en_passant = -1
+        self.turn = color
+        self.hash ^= ZOBRIST_BLACK_TO_MOVE
+
+    def parse_move(self, notation: str) -> int:
+        """
+        Resolve client notation to a legal move in the current position.
+        Accepts "e2e4", "Pe2e4" (piece prefix as sent by the app) and an
+        optional promotion suffix ("e7e8q"). Promotion defaults to a queen.
+        """
+        text = notation.strip()
+        expected_piece = None
+        if len(text) >= 5 and text[0] in "PNBRQK" and text[1] in "abcdefgh":
+            expected_piece = SYMBOL_PIECES[text[0].lower()]
+            text = text[1:]
+        if len(text) not in (4, 5):
+            raise IllegalMove(f"Invalid move notation: {notation}")
+
+        from_sq = parse_square(text[:2])
+        to_sq = parse_square(text[2:4])
+        promotion = QUEEN
+        if len(text) == 5:
+            if text[4].lower() not in "nbrq":
+                raise IllegalMove(f"Invalid promotion piece in: {notation}")
+            promotion = SYMBOL_PIECES[text[4].lower()]
+
+        piece = self.squares[from_sq]
+        if not piece or piece_color(piece) != self.turn:
+            raise IllegalMove(f"No piece to move on {square_name(from_sq)}")
+        if expected_piece is not None and piece_type(piece) != expected_piece:
+            raise IllegalMove(f"Piece on {square_name(from_sq)} does not match {notation}")
+
+        for move in self.legal_moves(from_sq):
+            if move_to(move) != to_sq:
+                continue
+            if move_promotion(move) and move_promotion(move) != promotion:
+                continue
+            return move
+        raise IllegalMove(f"Illegal move: {notation}")
+
+    def push(self, move: int):
+        """Play a move and record the position for repetition detection"""
+        self.make(move)
+        self.repetitions[self.hash] = self.repetitions.get(self.hash, 0) + 1
+
+    def play(self, notation: str) -> int:
+        move = self.parse_move(notation)
+        self.push(move)
+        return move
+
+    def is_insufficient_material(self) -> bool:
+        minors = []
+        for sq in range(128):
+            if sq & 0x88:
+                continue
+            piece = self.squares[sq]
+            kind = piece_type(piece)
+            if not piece or kind == KING:
+                continue
+            if kind in (PAWN, ROOK, QUEEN):
+                return False
+            minors.append((kind, piece_color(piece), ((sq >> 4) + (sq & 7)) & 1))
+        if len(minors) <= 1:
+            return True
+        # Only bishops, all on the same colour of square
+        return all(kind == BISHOP for kind, _, _ in minors) and len({shade for _, _, shade in minors}) == 1
+
+    def outcome(self) -> Optional[Tuple[str, Optional[int]]]:
+        """
+        Return (reason, winner_color) if the game is over for the side to move,
+        otherwise None. winner_color is None for draws.
+        """
+        if self.king_squares[self.turn] == -1:
+            return "king_captured", self.turn ^ 1
+        if not self.has_legal_move():
+            if self.in_check():
+                return "checkmate", self.turn ^ 1
+            return "stalemate", None
+        if self.halfmove_clock >= 100:
+            return "fifty_move_rule", None
+        if self.repetitions.get(self.hash, 0) >= 3:
+            return "threefold_repetition", None
+        if self.is_insufficient_material():
+            return "insufficient_material", None
+        return None
+
+    def perft(self, depth: int) -> int:
+        """Count leaf nodes of the legal move tree (move generator test)"""
+        if depth == 0:
+            return 1
+        color = self.turn
+        nodes = 0
+        for move in self.pseudo_legal_moves():
+            self.make(move)
+            if not self.is_attacked(self.king_squares[color], color ^ 1):
+                nodes += self.perft(depth - 1) if depth > 1 else 1
+            self.unmake()
+        return nodes
@@ -0,0 +1,271 @@
+"""
+In-memory authoritative game state.
+
+RoomManager keeps one GameState per active room so that moves can be
+validated and broadcast without touching the database. The state is loaded
+once from Postgres when the first player connects and is written back
+asynchronously after every move. Every move is checked against the chess
+rules engine before it is accepted.
+
+Clocks are kept in milliseconds against the monotonic clock; the database
+and the clients still see whole seconds.
+"""
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.game.chess_engine import Board, IllegalMove, WHITE, BLACK
+from src.game.models import GameRoom, GamePlayer, GameMove, GameRoomStatus
+from src.game.timer_wheel import TimerHandle, monotonic_ms
+
+logger = logging.getLogger(__name__)
+
+# Endings of an RPS game (either side may move next, so repetition and the fifty-move rule don't apply)
+RPS_RESULT_REASONS = ("checkmate", "stalemate", "king_captured")
+
+
+class MoveRejected(Exception):
+    """Raised when a move can't be applied to the current game state."""
+
+
+def opposite_side(side: str) -> str:
+    return "dark" if side == "light" else "light"
+
+
+def side_color(side: str) -> int:
+    return WHITE if side == "light" else BLACK
+
+
+def color_side(color: int) -> str:
+    return "light" if color == WHITE else "dark"
+
+
+class GameState:
+    def __init__(
+        self,
+        room_id: int,
+        room_code: str,
+        game_mode: str,
+        status: GameRoomStatus,
+        light_player_time: int,
+        dark_player_time: int,
+        current_turn_started_at: Optional[datetime] = None,
+        move_number: int = 0,
+        side_to_move: str = "light",
+        players: Optional[Dict[int, str]] = None,
+    ):
+        self.room_id = room_id
+        self.room_code = room_code
+        self.game_mode = game_mode
+        self.status = status
+        self.light_player_ms = light_player_time * 1000
+        self.dark_player_ms = dark_player_time * 1000
+        self.current_turn_started_at = current_turn_started_at
+        # Monotonic counterpart of current_turn_started_at, used for the arithmetic
+        self.turn_started_ms: Optional[float] = None
+        if current_turn_started_at is not None:
+            elapsed = (datetime.now(timezone.utc) - current_turn_started_at).total_seconds() * 1000
+            self.turn_started_ms = monotonic_ms() - max(0.0, elapsed)
+        self.move_number = move_number
+        self.side_to_move = side_to_move
+        # player_id -> "light" / "dark"
+        self.players: Dict[int, str] = players or {}
+        # None when the stored history could not be replayed (validation disabled)
+        self.board: Optional[Board] = Board()
+        # Set once the rules engine ends the game: {"reason": ..., "winner_side": ...}
+        self.result: Optional[dict] = None
+        # Flag of the side to move, armed by the worker that accepted the last move
+        self.flag_timer: Optional[TimerHandle] = None
+
+    @classmethod
+    async def load(cls, session: AsyncSession, room_id: int) -> Optional["GameState"]:
+        """Build the state for a room from the database (one-time cost per room)"""
+        room_result = await session.execute(select(GameRoom).where(GameRoom.id == room_id))
+        room = room_result.scalar_one_or_none()
+        if not room:
+            return None
+
+        players_result = await session.execute(
+            select(GamePlayer.id, GamePlayer.player_side).where(GamePlayer.room_id == room_id)
+        )
+        players = {player_id: side for player_id, side in players_result.all()}
+
+        moves_result = await session.execute(
+            select(GameMove.move_notation, GamePlayer.player_side)
+            .join(GamePlayer, GameMove.player_id == GamePlayer.id)
+            .where(GameMove.room_id == room_id)
+            .order_by(GameMove.move_number.asc())
+        )
+        history = moves_result.all()
+        move_number = len(history)
+
+        # The side to move is whoever did not make the last move
+        side_to_move = opposite_side(history[-1][1]) if history else "light"
+
+        # Rebuild the board by replaying the stored moves
+        board = Board()
+        for notation, side in history:
+            try:
+                board.set_turn(side_color(side))
+                board.play(notation)
+            except IllegalMove as e:
+                logger.warning(f"Can't replay move history of room {room.room_code} ({e}), move validation disabled")
+                board = None
+                break
+
+        state = cls(
+            room_id=room.id,
+            room_code=room.room_code,
+            game_mode=room.game_mode,
+            status=room.status,
+            light_player_time=room.light_player_time,
+            dark_player_time=room.dark_player_time,
+            current_turn_started_at=room.current_turn_started_at,
+            move_number=move_number,
+            side_to_move=side_to_move,
+            players=players,
+        )
+        state.board = board
+        return state
+
+    @property
+    def light_player_time(self) -> int:
+        return int(self.light_player_ms // 1000)
+
+    @property
+    def dark_player_time(self) -> int:
+        return int(self.dark_player_ms // 1000)
+
+    def remaining_ms(self, side: str, now_ms: Optional[float] = None) -> float:
+        """Time left on a side's clock, counting the running turn"""
+        remaining = self.light_player_ms if side == "light" else self.dark_player_ms
+        if side == self.side_to_move and self.turn_started_ms is not None:
+            now_ms = monotonic_ms() if now_ms is None else now_ms
+            remaining -= now_ms - self.turn_started_ms
+        return remaining
+
+    def flag_deadline_ms(self) -> Optional[float]:
+        """Monotonic time at which the side to move runs out of time, None if no clock runs"""
+        # In RPS mode too the clock of the side that did not move last runs, as in the app
+        if self.status == GameRoomStatus.FINISHED or self.turn_started_ms is None:
+            return None
+        return self.turn_started_ms + (self.light_player_ms if self.side_to_move == "light" else self.dark_player_ms)
+
+    def flag(self, now_ms: Optional[float] = None) -> Optional[dict]:
+        """End the game on time if the side to move has run out; returns the result"""
+        deadline = self.flag_deadline_ms()
+        now_ms = monotonic_ms() if now_ms is None else now_ms
+        if deadline is None or now_ms < deadline:
+            return None
+        if self.side_to_move == "light":
+            self.light_player_ms = 0
+        else:
+            self.dark_player_ms = 0
+        self.status = GameRoomStatus.FINISHED
+        self.result = {"reason": "timeout", "winner_side": opposite_side(self.side_to_move)}
+        return self.result
+
+    def add_player(self, player_id: int, player_side: str):
+        """Register a player that joined after the state was loaded"""
+        self.players[player_id] = player_side
+
+    def apply_move(self, player_id: int, move_notation: str) -> dict:
+        """
+        Validate a move against the in-memory state and advance the clocks.
+        Returns the move data to broadcast; raises MoveRejected otherwise.
+        """
+        player_side = self.players.get(player_id)
+        if player_side is None:
+            raise MoveRejected("Player not in room")
+
+        if self.status == GameRoomStatus.FINISHED:
+            raise MoveRejected("Game is already finished")
+
+        if self.status != GameRoomStatus.IN_PROGRESS:
+            raise MoveRejected("Game has not started")
+
+        # In RPS mode the winner of the last round moves, so sides don't strictly alternate
+        if self.game_mode == "classical" and player_side != self.side_to_move:
+            raise MoveRejected("Not your turn")
+
+        # The flag fell before the move arrived; the timer wheel announces the result
+        if self.flag_deadline_ms() is not None and self.remaining_ms(self.side_to_move) <= 0:
+            raise MoveRejected("Time is up")
+
+        if self.board is not None:
+            try:
+                self.board.set_turn(side_color(player_side))
+                self.board.play(move_notation)
+            except IllegalMove as e:
+                raise MoveRejected(str(e))
+
+        now_ms = monotonic_ms()
+
+        # Subtract elapsed time from the clock that was running: the side to move's
+        # (in RPS mode the other side may have won the round and moved instead)
+        if self.turn_started_ms is not None:
+            elapsed = now_ms - self.turn_started_ms
+            if self.side_to_move == "light":
+                self.light_player_ms = max(0.0, self.light_player_ms - elapsed)
+            else:
+                self.dark_player_ms = max(0.0, self.dark_player_ms - elapsed)
+
+        self.current_turn_started_at = datetime.now(timezone.utc)
+        self.turn_started_ms = now_ms
+        self.move_number += 1
+        self.side_to_move = opposite_side(player_side)
+
+        move_data = {
+            "move_notation": move_notation,
+            "player_id": player_id,
+            "move_number": self.move_number,
+            **self.clock_snapshot(),
+        }
+
+        # RPS games end like the app ends them: checkmate or stalemate of the side that
+        # did not move, or a captured king (set_turn makes that possible)
+        if self.board is not None:
+            outcome = self.board.outcome()
+            if outcome and (self.game_mode == "classical" or outcome[0] in RPS_RESULT_REASONS):
+                reason, winner = outcome
+                self.status = GameRoomStatus.FINISHED
+                self.result = {
+                    "reason": reason,
+                    "winner_side": color_side(winner) if winner is not None else None,
+                }
+                move_data["result"] = self.result
+
+        return move_data
+
+    def apply_replicated_move(self, move_data: dict):
+        """Mirror a move that another worker already validated and broadcast"""
+        player_side = move_data["player_side"]
+        if self.board is not None:
+            try:
+                self.board.set_turn(side_color(player_side))
+                self.board.play(move_data["move_notation"])
+            except IllegalMove as e:
+                logger.warning(f"Replicated move diverged in room {self.room_code} ({e}), move validation disabled")
+                self.board = None
+
+        self.players.setdefault(move_data["player_id"], player_side)
+        self.move_number = move_data["move_number"]
+        self.side_to_move = opposite_side(player_side)
+        self.light_player_ms = move_data.get("light_player_ms", move_data["light_player_time"] * 1000)
+        self.dark_player_ms = move_data.get("dark_player_ms", move_data["dark_player_time"] * 1000)
+        turn_started_at = move_data.get("current_turn_started_at")
+        self.current_turn_started_at = datetime.fromisoformat(turn_started_at) if turn_started_at else None
+        self.turn_started_ms = monotonic_ms() if turn_started_at else None
+        if move_data.get("result"):
+            self.result = move_data["result"]
+            self.status = GameRoomStatus.FINISHED
+
+    def clock_snapshot(self) -> dict:
+        return {
+            "light_player_time": self.light_player_time,
+            "dark_player_time": self.dark_player_time,
+            "current_turn_started_at": self.current_turn_started_at.isoformat() if self.current_turn_started_at else None,
+        }
@@ -0,0 +1,383 @@
+"""
+In-memory matchmaking.
+
+Every player that finds no opponent gets a waiting room right away (the
+client connects to its WebSocket and waits there) and that room is queued
+as a ticket under its game mode and rating bucket. The next player of the
+same mode takes the closest-rated ticket whose rating window (which widens
+the longer the ticket waits) covers them, and joins that room. No rooms are
+scanned or locked: claiming a ticket is a single conditional UPDATE, so a
+ticket whose room was deleted or joined in the meantime is simply skipped.
+
+The queue lives in the worker process. When it has no match, the
+matchmaking rooms of the mode waiting on other workers are tried before
+opening a new room (ix_game_rooms_matchmaking), so players waiting on
+different workers are still paired. A room opened by matchmaking stores
+its player's rating, and the same rating window applies as in the queue,
+counted from the room's creation. Claiming one of them is the same
+conditional UPDATE, and the other worker skips its ticket as stale later.
+Rooms created directly (POST /rooms) are never matched.
+"""
+import asyncio
+import bisect
+import logging
+import time
+import uuid
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+from sqlalchemy import select, update, case, func, type_coerce
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.config import (
+    MATCHMAKING_BUCKET_SIZE,
+    MATCHMAKING_BASE_WINDOW,
+    MATCHMAKING_WINDOW_GROWTH,
+    MATCHMAKING_MAX_WINDOW,
+)
+from src.game.models import GameRoom, GamePlayer, GameRoomStatus
+from src.stats.models import UserStats
+
+logger = logging.getLogger(__name__)
+
+# Rating of guests and players without stats (the UserStats default)
+DEFAULT_RATING = 1200
+
+# Pair rate is reported over this many seconds, wait percentiles over this many pairs
+PAIR_RATE_WINDOW_SECONDS = 60
+WAIT_SAMPLES = 1000
+
+# Matchmaking rooms of other workers tried before opening a new room
+SHARED_ROOM_CANDIDATES = 5
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+class MatchTicket:
+    def __init__(self, room_id: int, room_code: str, game_mode: str, rating: int, user_id: Optional[int] = None):
+        self.room_id = room_id
+        self.room_code = room_code
+        self.game_mode = game_mode
+        self.rating = rating
+        self.user_id = user_id
+        self.enqueued_at = time.monotonic()
+        self.cancelled = False
+
+
+class MatchmakingQueue:
+    """
+    Waiting tickets of one game mode, FIFO within rating buckets.
+
+    A ticket accepts opponents within its rating window, which starts at
+    MATCHMAKING_BASE_WINDOW and widens by MATCHMAKING_WINDOW_GROWTH points per
+    second of waiting, up to MATCHMAKING_MAX_WINDOW. Enqueueing is O(1)
+    (plus an insort when a bucket appears); pairing bisects to the arrival's
+    bucket and walks outwards over at most MAX_WINDOW / bucket size buckets.
+    """
+
+    def __init__(
+        self,
+        bucket_size: int = MATCHMAKING_BUCKET_SIZE,
+        base_window: int = MATCHMAKING_BASE_WINDOW,
+        window_growth: float = MATCHMAKING_WINDOW_GROWTH,
+        max_window: int = MATCHMAKING_MAX_WINDOW,
+    ):
+        self.bucket_size = bucket_size
+        self.base_window = base_window
+        self.window_growth = window_growth
+        self.max_window = max_window
+        self.buckets: Dict[int, Deque[MatchTicket]] = {}
+        # Sorted keys of the non-empty buckets
+        self.bucket_keys: List[int] = []
+        self.tickets: Dict[int, MatchTicket] = {}
+
+    def __len__(self) -> int:
+        return len(self.tickets)
+
+    def bucket_of(self, rating: int) -> int:
+        return rating // self.bucket_size
+
+    def window(self, ticket: MatchTicket, now: float) -> float:
+        """Largest rating difference the ticket accepts after waiting until `now`"""
+        return min(self.base_window + self.window_growth * (now - ticket.enqueued_at), self.max_window)
+
+    def push(self, ticket: MatchTicket):
+        key = self.bucket_of(ticket.rating)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = deque()
+            bisect.insort(self.bucket_keys, key)
+        bucket.append(ticket)
+        self.tickets[ticket.room_id] = ticket
+
+    def cancel(self, room_id: int) -> bool:
+        """Withdraw a ticket; it is skipped (and dropped) when its bucket is next visited"""
+        ticket = self.tickets.pop(room_id, None)
+        if ticket is None:
+            return False
+        ticket.cancelled = True
+        return True
+
+    def pop_match(self, rating: int, now: Optional[float] = None) -> Optional[MatchTicket]:
+        """
+        Take the closest-rated ticket whose window covers the rating. Only the
+        head of each bucket is checked: it has waited longest, so it has the
+        widest window of its bucket.
+        """
+        now = time.monotonic() if now is None else now
+        target = self.bucket_of(rating)
+        max_bucket_distance = self.max_window // self.bucket_size + 1
+        keys = self.bucket_keys
+        hi = bisect.bisect_left(keys, target)
+        lo = hi - 1
+        empty_keys = []
+        match = None
+
+        while lo >= 0 or hi < len(keys):
+            # Visit buckets in order of distance from the arrival's bucket
+            if hi >= len(keys) or (lo >= 0 and target - keys[lo] <= keys[hi] - target):
+                key, lo = keys[lo], lo - 1
+            else:
+                key, hi = keys[hi], hi + 1
+            if abs(key - target) > max_bucket_distance:
+                break
+
+            ticket = self._head(key)
+            if ticket is None:
+                empty_keys.append(key)
+                continue
+            if abs(ticket.rating - rating) <= self.window(ticket, now):
+                match = ticket
+                break
+
+        if match is not None:
+            bucket_key = self.bucket_of(match.rating)
+            self.buckets[bucket_key].popleft()
+            del self.tickets[match.room_id]
+            if not self.buckets[bucket_key]:
+                empty_keys.append(bucket_key)
+        for key in empty_keys:
+            del self.buckets[key]
+            keys.pop(bisect.bisect_left(keys, key))
+        return match
+
+    def _head(self, key: int) -> Optional[MatchTicket]:
+        """Oldest live ticket of a bucket, dropping withdrawn ones on the way"""
+        bucket = self.buckets[key]
+        while bucket and bucket[0].cancelled:
+            bucket.popleft()
+        return bucket[0] if bucket else None
+
+    def oldest_wait(self, now: float) -> float:
+        heads = [self._head(key) for key in self.bucket_keys]
+        return max((now - ticket.enqueued_at for ticket in heads if ticket is not None), default=0.0)
+
+
+class Matchmaker:
+    def __init__(self):
+        self.queues: Dict[str, MatchmakingQueue] = {}
+        # Ticket lookup by room so a deleted room can withdraw its ticket
+        self.room_modes: Dict[int, str] = {}
+        # Serializes opening rooms per mode, so two players arriving at an empty
+        # queue together are paired instead of both getting a waiting room
+        self._open_locks: Dict[str, asyncio.Lock] = {}
+        self.pairs = 0
+        self.rooms_opened = 0
+        self.stale_tickets = 0
+        self.shared_pairs = 0
+        self._pair_times: Deque[float] = deque()
+        self._waits: Deque[float] = deque(maxlen=WAIT_SAMPLES)
+
+    def queue_for(self, game_mode: str) -> MatchmakingQueue:
+        queue = self.queues.get(game_mode)
+        if queue is None:
+            queue = self.queues[game_mode] = MatchmakingQueue()
+        return queue
+
+    async def get_rating(self, session: AsyncSession, user_id: Optional[int]) -> int:
+        if user_id is None:
+            return DEFAULT_RATING
+        result = await session.execute(select(UserStats.rating).where(UserStats.user_id == user_id))
+        rating = result.scalar_one_or_none()
+        return rating if rating is not None else DEFAULT_RATING
+
+    async def matchmake(self, session: AsyncSession, game_mode: str, user_id: Optional[int] = None) -> GameRoom:
+        """Join the closest-rated waiting room of the mode, or open a new waiting room"""
+        rating = await self.get_rating(session, user_id)
+        queue = self.queue_for(game_mode)
+
+        open_lock = self._open_locks.setdefault(game_mode, asyncio.Lock())
+
+        while True:
+            async with open_lock:
+                ticket = queue.pop_match(rating)
+                if ticket is None:
+                    room = await self._claim_shared_room(session, queue, game_mode, rating)
+                    if room is not None:
+                        self.shared_pairs += 1
+                        logger.info(f"Matched player (rating {rating}) with room {room.room_code} of another worker")
+                        return room
+                    room = await self._open_room(session, game_mode, rating)
+                    queue.push(MatchTicket(room.id, room.room_code, game_mode, rating, user_id))
+                    self.room_modes[room.id] = game_mode
+                    self.rooms_opened += 1
+                    logger.info(f"Opened waiting room {room.room_code} for {game_mode} (rating {rating}), {len(queue)} waiting")
+                    return room
+
+            # Claims don't need the lock: the ticket is already out of the queue
+            self.room_modes.pop(ticket.room_id, None)
+            room = await self._claim(session, ticket.room_id)
+            if room is not None:
+                self._record_pair(ticket)
+                logger.info(f"Matched player (rating {rating}) with room {room.room_code} (rating {ticket.rating})")
+                return room
+            self.stale_tickets += 1
+            logger.info(f"Skipping stale matchmaking ticket for room {ticket.room_code}")
+
+    def cancel(self, room_id: int):
+        """Withdraw the ticket of a room that is gone or no longer waiting"""
+        game_mode = self.room_modes.pop(room_id, None)
+        if game_mode is not None:
+            self.queue_for(game_mode).cancel(room_id)
+
+    def _record_pair(self, ticket: MatchTicket):
+        now = time.monotonic()
+        self.pairs += 1
+        self._waits.append(now - ticket.enqueued_at)
+        self._pair_times.append(now)
+        self._trim_pair_times(now)
+
+    def _trim_pair_times(self, now: float):
+        while self._pair_times and self._pair_times[0] < now - PAIR_RATE_WINDOW_SECONDS:
+            self._pair_times.popleft()
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        self._trim_pair_times(now)
+        waits = sorted(self._waits)
+        return {
+            "pairs": self.pairs,
+            "pairs_per_minute": len(self._pair_times) * 60 / PAIR_RATE_WINDOW_SECONDS,
+            "rooms_opened": self.rooms_opened,
+            "stale_tickets": self.stale_tickets,
+            "shared_pairs": self.shared_pairs,
+            "wait_seconds": {
+                "p50": round(percentile(waits, 0.50), 3),
+                "p90": round(percentile(waits, 0.90), 3),
+                "p99": round(percentile(waits, 0.99), 3),
+            },
+            "queues": {
+                game_mode: {"depth": len(queue), "oldest_wait_seconds": round(queue.oldest_wait(now), 3)}
+                for game_mode, queue in self.queues.items()
+            },
+        }
+
+    async def load(self, session: AsyncSession):
+        """Queue the rooms that were still waiting for an opponent when the worker started"""
+        result = await session.execute(
+            select(GameRoom.id, GameRoom.room_code, GameRoom.game_mode, GamePlayer.user_id, GameRoom.matchmaking_rating)
+            .join(GamePlayer, GamePlayer.room_id == GameRoom.id)
+            .where(
+                GameRoom.status == GameRoomStatus.WAITING,
+                GameRoom.player_count == 1,
+                GameRoom.matchmaking_rating.isnot(None),
+            )
+            .order_by(GameRoom.created_at.asc())
+        )
+        count = 0
+        for room_id, room_code, game_mode, user_id, rating in result.all():
+            self.queue_for(game_mode).push(MatchTicket(room_id, room_code, game_mode, rating, user_id))
+            self.room_modes[room_id] = game_mode
+            count += 1
+        if count:
+            logger.info(f"Queued {count} waiting room(s) for matchmaking")
+
+    async def _claim_shared_room(
+        self, session: AsyncSession, queue: MatchmakingQueue, game_mode: str, rating: int
+    ) -> Optional[GameRoom]:
+        """Join the closest-rated matchmaking room of the mode whose window covers the rating and that is not queued here"""
+        distance = func.abs(GameRoom.matchmaking_rating - rating)
+        waited_seconds = func.extract("epoch", func.now() - GameRoom.created_at)
+        result = await session.execute(
+            select(GameRoom.id)
+            .where(
+                GameRoom.status == GameRoomStatus.WAITING,
+                GameRoom.game_mode == game_mode,
+                GameRoom.player_count == 1,
+                GameRoom.matchmaking_rating.between(rating - queue.max_window, rating + queue.max_window),
+                distance <= func.least(queue.base_window + queue.window_growth * waited_seconds, queue.max_window),
+            )
+            .order_by(distance, GameRoom.created_at.asc())
+            .limit(SHARED_ROOM_CANDIDATES)
+        )
+        for room_id in result.scalars().all():
+            if room_id in self.room_modes:
+                continue  # Queued here, outside the arrival's rating window
+            room = await self._claim(session, room_id)
+            if room is not None:
+                return room
+        return None
+
+    async def _claim(self, session: AsyncSession, room_id: int) -> Optional[GameRoom]:
+        # Only succeeds while the room is still waiting - no locks, no re-reads.
+        # The game starts once the slot taken here fills the room.
+        result = await session.execute(
+            update(GameRoom)
+            .where(
+                GameRoom.id == room_id,
+                GameRoom.status == GameRoomStatus.WAITING,
+                GameRoom.player_count < 2,
+            )
+            .values(
+                status=case(
+                    (GameRoom.player_count + 1 >= 2, type_coerce(GameRoomStatus.IN_PROGRESS, GameRoom.status.type)),
+                    else_=GameRoom.status,
+                ),
+                player_count=GameRoom.player_count + 1,
+            )
+            .returning(GameRoom)
+            .execution_options(synchronize_session=False)
+        )
+        room = result.scalar_one_or_none()
+        if room is None:
+            await session.rollback()
+            return None
+
+        # Reserve the slot; the player is connected when its WebSocket joins
+        session.add(GamePlayer(
+            room_id=room.id,
+            user_id=None,  # Will be set when WebSocket connects (if authenticated)
+            player_side="light" if room.player_count == 1 else "dark",
+            is_connected=False,
+        ))
+        await session.commit()
+        return room
+
+    async def _open_room(self, session: AsyncSession, game_mode: str, rating: int) -> GameRoom:
+        room = GameRoom(
+            room_code=str(uuid.uuid4())[:8].upper(),
+            status=GameRoomStatus.WAITING,
+            game_mode=game_mode,
+            player_count=1,
+            matchmaking_rating=rating,
+        )
+        session.add(room)
+        await session.flush()  # Flush to get room.id
+
+        # Create first player slot for this user (reserved but not connected yet)
+        session.add(GamePlayer(
+            room_id=room.id,
+            user_id=None,  # Will be set when WebSocket connects (if authenticated)
+            player_side="light",
+            is_connected=False,
+        ))
+        await session.commit()
+        await session.refresh(room)
+        return room
+
+
+matchmaker = Matchmaker()
@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Enum as SQLEnum
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Index, and_, Enum as SQLEnum
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 import enum
@@ -39,6 +39,13 @@ class GameRoom(Base):
     current_turn_started_at = Column(DateTime(timezone=True), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    # Maintained with atomic UPDATEs on join/leave instead of counting game_players
+    player_count = Column(Integer, nullable=False, default=0, server_default="0")  # Reserved slots
+    connected_count = Column(Integer, nullable=False, default=0, server_default="0")
+    # Set when the players' stats are updated for the result, so a game is rated once
+    settled_at = Column(DateTime(timezone=True), nullable=True)
+    # Rating of the waiting player of a room opened by matchmaking (None for rooms created directly)
+    matchmaking_rating = Column(Integer, nullable=True)
 
     # Relationships
     players = relationship("GamePlayer", back_populates="room", cascade="all, delete-orphan")
@@ -46,6 +53,27 @@ class GameRoom(Base):
     rps_rounds = relationship("RpsRound", back_populates="room", cascade="all, delete-orphan")
 
 
+# Rooms that still have a free slot, oldest first
+Index(
+    "ix_game_rooms_open",
+    GameRoom.game_mode,
+    GameRoom.created_at,
+    postgresql_where=and_(GameRoom.status == GameRoomStatus.WAITING, GameRoom.player_count < 2),
+)
+
+# Matchmaking rooms waiting for an opponent, by rating
+Index(
+    "ix_game_rooms_matchmaking",
+    GameRoom.game_mode,
+    GameRoom.matchmaking_rating,
+    postgresql_where=and_(
+        GameRoom.status == GameRoomStatus.WAITING,
+        GameRoom.player_count == 1,
+        GameRoom.matchmaking_rating.isnot(None),
+    ),
+)
+
+
 class GamePlayer(Base):
     __tablename__ = "game_players"
 
@@ -0,0 +1,165 @@
+"""
+Write-behind persistence for game moves.
+
+Moves from every room are buffered in memory and written in one transaction
+per flush: a bulk INSERT of GameMove rows plus one clock UPDATE per room
+(rooms can also be queued without a move, e.g. when a game ends on time).
+A flush happens every MOVE_FLUSH_INTERVAL_MS or as soon as
+MOVE_FLUSH_BATCH_SIZE moves are pending, and explicitly on game end and
+application shutdown.
+
+If a flush fails, each room is retried in its own transaction so one room
+can't hold back the others; a room whose writes keep failing (e.g. it was
+deleted while its moves were queued) has its pending rows dropped after
+MOVE_FLUSH_MAX_ATTEMPTS attempts.
+"""
+import asyncio
+import logging
+from typing import Dict, List, Optional
+
+from sqlalchemy import bindparam, insert, update
+
+from src.config import MOVE_FLUSH_INTERVAL_MS, MOVE_FLUSH_BATCH_SIZE, MOVE_FLUSH_MAX_ATTEMPTS
+from src.database import async_session_maker
+from src.game.models import GameRoom, GameMove
+
+logger = logging.getLogger(__name__)
+
+# Core UPDATE: rooms deleted in the meantime are simply not matched (no ORM rowcount check)
+UPDATE_ROOM = update(GameRoom.__table__).where(GameRoom.__table__.c.id == bindparam("room_id"))
+
+
+class MoveWriter:
+    def __init__(
+        self,
+        flush_interval_ms: int = MOVE_FLUSH_INTERVAL_MS,
+        batch_size: int = MOVE_FLUSH_BATCH_SIZE,
+        max_attempts: int = MOVE_FLUSH_MAX_ATTEMPTS,
+    ):
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self._pending: List[dict] = []
+        # Failed attempts per room since its last successful write
+        self._attempts: Dict[int, int] = {}
+        self.dropped = 0
+        self._batch_ready = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Start the background flush loop (call from the application startup hook)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the flush loop and durably write everything still pending"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def enqueue(self, room_id: int, player_id: int, move_notation: str, move_number: int, room_values: dict):
+        """Queue a move for the next batch; never blocks the caller"""
+        self._pending.append({
+            "room_id": room_id,
+            "player_id": player_id,
+            "move_notation": move_notation,
+            "move_number": move_number,
+            "room_values": room_values,
+        })
+        if len(self._pending) >= self.batch_size:
+            self._batch_ready.set()
+
+    def enqueue_room(self, room_id: int, room_values: dict):
+        """Queue a clock/status update of a room that doesn't come with a move"""
+        self._pending.append({"room_id": room_id, "room_values": room_values})
+        if len(self._pending) >= self.batch_size:
+            self._batch_ready.set()
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    async def flush(self):
+        """Write all pending moves in a single transaction"""
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            batch, self._pending = self._pending, []
+            try:
+                await self._write(batch)
+                self._attempts.clear()
+                return
+            except Exception as e:
+                logger.warning(f"Failed to flush {len(batch)} move(s), retrying room by room: {e}")
+
+            # Isolate the failing rooms: every other room is written right away
+            rooms: Dict[int, List[dict]] = {}
+            for move in batch:
+                rooms.setdefault(move["room_id"], []).append(move)
+            retry: List[dict] = []
+            for room_id, room_batch in rooms.items():
+                try:
+                    await self._write(room_batch)
+                    self._attempts.pop(room_id, None)
+                except Exception as e:
+                    attempts = self._attempts.get(room_id, 0) + 1
+                    if attempts >= self.max_attempts:
+                        self._attempts.pop(room_id, None)
+                        self.dropped += len(room_batch)
+                        logger.error(
+                            f"Dropping {len(room_batch)} pending write(s) of room {room_id} "
+                            f"after {attempts} failed attempts: {e}", exc_info=True
+                        )
+                    else:
+                        self._attempts[room_id] = attempts
+                        logger.error(f"Failed to write room {room_id} (attempt {attempts}), will retry: {e}")
+                        retry.extend(room_batch)
+            # Back in front so ordering is kept for the retry
+            self._pending[:0] = retry
+
+    async def _write(self, batch: List[dict]):
+        # Only the latest values of each room matter
+        latest_room_values = {}
+        for move in batch:
+            latest_room_values[move["room_id"]] = move["room_values"]
+
+        moves = [
+            {
+                "room_id": move["room_id"],
+                "player_id": move["player_id"],
+                "move_notation": move["move_notation"],
+                "move_number": move["move_number"],
+            }
+            for move in batch
+            if "move_notation" in move
+        ]
+
+        # One executemany per set of columns (the status is only written once a game ends)
+        room_updates: Dict[tuple, List[dict]] = {}
+        for room_id, values in latest_room_values.items():
+            room_updates.setdefault(tuple(sorted(values)), []).append({"room_id": room_id, **values})
+
+        async with async_session_maker() as session:
+            if moves:
+                await session.execute(insert(GameMove), moves)
+            for rows in room_updates.values():
+                await session.execute(UPDATE_ROOM, rows)
+            await session.commit()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._batch_ready.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._batch_ready.clear()
+            await self.flush()
+
+
+move_writer = MoveWriter()
@@ -0,0 +1,152 @@
+"""
+WebSocket wire protocol helpers.
+
+Room messages are encoded once and the same string is queued for every
+recipient. orjson is used when it is installed, otherwise the standard
+json module.
+
+Clients pick a protocol version with the `v` query parameter of the game
+WebSocket (`/api/v1/game/ws/{room_code}?v=2`):
+    1  every move is followed by a separate "timer_update" frame (default)
+    2  the clocks only travel in the "move" frame, no "timer_update"
+    3  like 2, but moves travel as binary frames in both directions
+       (all other messages stay JSON text)
+
+Clients that connect with `batch=1` accept several messages in one
+WebSocket message: consecutive text messages are sent as a JSON array,
+consecutive binary frames back to back (their size follows from the opcode).
+
+Binary frames are fixed struct layouts in network byte order, starting
+with an opcode byte. Moves are packed into 16 bits: from square (6 bits,
+a1 = 0, h8 = 63), to square (6 bits) and promotion (3 bits, 0 = none,
+then n, b, r, q). Clocks are milliseconds.
+"""
+import json
+import struct
+from typing import Dict, List, Optional, Union
+
+try:
+    import orjson
+except ImportError:  # optional speed-up
+    orjson = None
+
+PROTOCOL_V1 = 1
+PROTOCOL_V2 = 2
+PROTOCOL_V3 = 3
+SUPPORTED_PROTOCOLS = (PROTOCOL_V1, PROTOCOL_V2, PROTOCOL_V3)
+DEFAULT_PROTOCOL = PROTOCOL_V1
+
+# Text (JSON) or binary (protocol 3) frame
+Frame = Union[str, bytes]
+
+# A frame for every client, or one frame per protocol version.
+# Clients whose version has no entry don't get the message.
+OutgoingMessage = Union[str, Dict[int, Frame]]
+
+OP_MOVE = 0x01
+
+# Client -> server: opcode, move
+CLIENT_MOVE = struct.Struct("!BH")
+# Server -> client: opcode, move, player id, move number, light ms, dark ms, result, winner
+SERVER_MOVE = struct.Struct("!BHIHIIBB")
+
+PROMOTIONS = "nbrq"
+# Result codes of the move frame (0 = game goes on)
+RESULT_REASONS = ("checkmate", "stalemate", "fifty_move_rule", "threefold_repetition", "insufficient_material", "timeout", "king_captured")
+# Winner codes of the move frame (0 = draw or no result)
+WINNER_SIDES = ("light", "dark")
+
+
+def encode(payload: dict) -> str:
+    """Serialize a message payload to the text sent on the socket"""
+    if orjson is not None:
+        return orjson.dumps(payload).decode()
+    return json.dumps(payload)
+
+
+def decode(data: Union[str, bytes]):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def parse_protocol_version(value: str | None) -> int:
+    """Protocol version requested by a client; unknown values fall back to the default"""
+    try:
+        version = int(value)
+    except (TypeError, ValueError):
+        return DEFAULT_PROTOCOL
+    return version if version in SUPPORTED_PROTOCOLS else DEFAULT_PROTOCOL
+
+
+def frame_for(message: OutgoingMessage, protocol_version: int) -> Optional[Frame]:
+    """Pick the frame a client with the given protocol version should receive"""
+    if isinstance(message, str):
+        return message
+    return message.get(protocol_version)
+
+
+def coalesce(frames: List[Frame]) -> List[Frame]:
+    """Merge runs of text frames into JSON arrays and runs of binary frames into one buffer"""
+    merged: List[Frame] = []
+    run: List[Frame] = []
+    for frame in frames:
+        if run and isinstance(frame, bytes) != isinstance(run[0], bytes):
+            merged.append(_join(run))
+            run = []
+        run.append(frame)
+    if run:
+        merged.append(_join(run))
+    return merged
+
+
+def _join(run: List[Frame]) -> Frame:
+    if isinstance(run[0], bytes):
+        return b"".join(run)
+    # Frames are already encoded: no need to parse and re-encode them
+    return run[0] if len(run) == 1 else "[" + ",".join(run) + "]"
+
+
+def pack_move(notation: str) -> int:
+    """16-bit encoding of a move notation ("e2e4", "Pe2e4", "e7e8q")"""
+    text = notation.strip()
+    if len(text) >= 5 and text[0] in "PNBRQK":
+        text = text[1:]
+    if len(text) not in (4, 5) or text[0] not in "abcdefgh" or text[2] not in "abcdefgh" \
+            or text[1] not in "12345678" or text[3] not in "12345678":
+        raise ValueError(f"Invalid move notation: {notation}")
+    from_sq = (ord(text[0]) - ord("a")) + (int(text[1]) - 1) * 8
+    to_sq = (ord(text[2]) - ord("a")) + (int(text[3]) - 1) * 8
+    promotion = PROMOTIONS.index(text[4].lower()) + 1 if len(text) == 5 else 0
+    return from_sq | (to_sq << 6) | (promotion << 12)
+
+
+def unpack_move(value: int) -> str:
+    from_sq, to_sq, promotion = value & 63, (value >> 6) & 63, (value >> 12) & 7
+    notation = "abcdefgh"[from_sq & 7] + str((from_sq >> 3) + 1) + "abcdefgh"[to_sq & 7] + str((to_sq >> 3) + 1)
+    if promotion:
+        notation += PROMOTIONS[promotion - 1]
+    return notation
+
+
+def encode_move_frame(move_data: dict, light_player_ms: float, dark_player_ms: float) -> bytes:
+    """Binary counterpart of a "move" message"""
+    result = move_data.get("result")
+    return SERVER_MOVE.pack(
+        OP_MOVE,
+        pack_move(move_data["move_notation"]),
+        move_data["player_id"],
+        move_data["move_number"],
+        int(light_player_ms),
+        int(dark_player_ms),
+        RESULT_REASONS.index(result["reason"]) + 1 if result else 0,
+        WINNER_SIDES.index(result["winner_side"]) + 1 if result and result["winner_side"] else 0,
+    )
+
+
+def decode_binary(data: bytes) -> dict:
+    """Turn a binary client frame into the message dict the JSON protocol would carry"""
+    if len(data) == CLIENT_MOVE.size and data[0] == OP_MOVE:
+        _, move = CLIENT_MOVE.unpack(data)
+        return {"type": "move", "data": {"move_notation": unpack_move(move)}}
+    raise ValueError(f"Unknown binary frame (opcode {data[0] if data else None}, {len(data)} bytes)")
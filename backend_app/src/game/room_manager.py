@@ -1,11 +1,50 @@
+import asyncio
+import logging
 import uuid
 from datetime import datetime
-from typing import Dict, Optional, List
+from typing import Dict, Optional, List, Set
 from starlette.websockets import WebSocket
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, update, func
+from src.config import WS_SEND_QUEUE_SIZE, WS_SEND_TIMEOUT_SECONDS, WS_COALESCE_MAX_FRAMES
+from src.database import async_session_maker
 from src.game.models import GameRoom, GamePlayer, GameRoomStatus
 from src.game.schemas import Connection
+from src.game.protocol import OutgoingMessage, coalesce, encode, frame_for
+from src.game.game_state import GameState
+from src.game.move_writer import move_writer
+from src.game.backplane import backplane
+from src.game.timer_wheel import timer_wheel
+from src.game.settlement import settlement
+
+logger = logging.getLogger(__name__)
+
+# Close code sent to clients that can't keep up with their frames ("try again later")
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+
+async def reserve_player_slot(session: AsyncSession, room_id: int) -> Optional[int]:
+    """Take one of the two player slots of a room; returns the new player count, None if the room is full"""
+    result = await session.execute(
+        update(GameRoom)
+        .where(GameRoom.id == room_id, GameRoom.player_count < 2)
+        .values(player_count=GameRoom.player_count + 1)
+        .returning(GameRoom.player_count)
+        .execution_options(synchronize_session=False)
+    )
+    return result.scalar_one_or_none()
+
+
+async def change_connected_count(session: AsyncSession, room_id: int, delta: int) -> int:
+    """Atomically add delta to the connected players of a room and return the new count"""
+    result = await session.execute(
+        update(GameRoom)
+        .where(GameRoom.id == room_id)
+        .values(connected_count=func.greatest(GameRoom.connected_count + delta, 0))
+        .returning(GameRoom.connected_count)
+        .execution_options(synchronize_session=False)
+    )
+    return result.scalar_one_or_none() or 0
 
 
 class RoomManager:
@@ -13,6 +52,14 @@ class RoomManager:
         self.rooms: Dict[str, GameRoom] = {}
         self.connections: Dict[WebSocket, Connection] = {}
         self.room_connections: Dict[int, List[Connection]] = {}
+        # Authoritative per-room game state, keyed by room id
+        self.game_states: Dict[int, GameState] = {}
+        self.evicted_connections = 0
+        self.coalesced_frames = 0
+        # Running end_on_time tasks (the event loop only keeps weak references)
+        self._flag_tasks: Set[asyncio.Task] = set()
+        # Sockets of evicted consumers being closed, likewise
+        self._close_tasks: Set[asyncio.Task] = set()
 
     async def create_room(
         self, 
@@ -53,16 +100,13 @@ class RoomManager:
             return None
         
         # Check if room is full (max 2 players)
-        existing_players = await session.execute(
-            select(GamePlayer).where(GamePlayer.room_id == room.id)
-        )
-        players = existing_players.scalars().all()
-        
-        if len(players) >= 2:
+        player_count = await reserve_player_slot(session, room.id)
+        if player_count is None:
+            await session.rollback()
             return None
         
         # Determine player side
-        player_side = "light" if len(players) == 0 else "dark"
+        player_side = "light" if player_count == 1 else "dark"
         
         # Create player
         player = GamePlayer(
@@ -72,9 +116,10 @@ class RoomManager:
             is_connected=True
         )
         session.add(player)
+        await change_connected_count(session, room.id, 1)
         
         # Update room status if second player joins
-        if len(players) == 1:
+        if player_count == 2:
             room.status = GameRoomStatus.IN_PROGRESS
         
         await session.commit()
@@ -82,15 +127,108 @@ class RoomManager:
         await session.refresh(room)
         
         # Add connection
-        connection = Connection(room.id, websocket, player.id)
-        self.connections[websocket] = connection
-        
-        if room.id not in self.room_connections:
-            self.room_connections[room.id] = []
-        self.room_connections[room.id].append(connection)
+        await self.add_connection(Connection(room.id, websocket, player.id))
         
         return room
 
+    async def get_game_state(self, room_id: int, session: Optional[AsyncSession] = None) -> Optional[GameState]:
+        """
+        Get the in-memory state for a room, loading it from the database on first use.
+        Without a session a short-lived one is opened just for the load.
+        """
+        state = self.game_states.get(room_id)
+        if state is None:
+            # Moves of this room may still be buffered from a previous state
+            await move_writer.flush()
+            if session is None:
+                async with async_session_maker() as load_session:
+                    state = await GameState.load(load_session, room_id)
+            else:
+                state = await GameState.load(session, room_id)
+            if state is not None:
+                self.game_states[room_id] = state
+                if state.status == GameRoomStatus.IN_PROGRESS:
+                    # The side to move may have been thinking since before the load
+                    self.arm_clock(state)
+        return state
+
+    def drop_game_state(self, room_id: int):
+        """Forget the in-memory state of a room (e.g. once nobody is connected)"""
+        state = self.game_states.pop(room_id, None)
+        if state is not None and state.flag_timer is not None:
+            state.flag_timer.cancel()
+
+    def room_values(self, state: GameState) -> dict:
+        values = {
+            "light_player_time": state.light_player_time,
+            "dark_player_time": state.dark_player_time,
+            "current_turn_started_at": state.current_turn_started_at,
+        }
+        # Joins write the other statuses; this worker's copy may lag behind them
+        if state.status == GameRoomStatus.FINISHED:
+            values["status"] = state.status
+        return values
+
+    def persist_move(self, state: GameState, player_id: int, move_notation: str):
+        """Queue a move and the room clocks/status for the write-behind flusher"""
+        move_writer.enqueue(
+            room_id=state.room_id,
+            player_id=player_id,
+            move_notation=move_notation,
+            move_number=state.move_number,
+            room_values=self.room_values(state),
+        )
+
+    def arm_clock(self, state: GameState):
+        """(Re)schedule the flag of the side to move on the timer wheel"""
+        if state.flag_timer is not None:
+            state.flag_timer.cancel()
+            state.flag_timer = None
+        deadline = state.flag_deadline_ms()
+        if deadline is not None:
+            state.flag_timer = timer_wheel.schedule(deadline, lambda: self._on_flag(state))
+
+    def _on_flag(self, state: GameState):
+        # Timer callbacks are synchronous; the broadcast runs as a task
+        state.flag_timer = None
+        if self.game_states.get(state.room_id) is not state:
+            return  # State was dropped or reloaded in the meantime
+        task = asyncio.create_task(self.end_on_time(state))
+        self._flag_tasks.add(task)
+        task.add_done_callback(self._flag_tasks.discard)
+
+    async def end_on_time(self, state: GameState):
+        """Finish a game whose side to move ran out of time and announce the result"""
+        result = state.flag()
+        if result is None:
+            self.arm_clock(state)  # Not due yet (e.g. the clock was changed meanwhile)
+            return
+        logger.info(f"Room {state.room_code}: {state.side_to_move} ran out of time, {result['winner_side']} wins")
+        await self.send_to_room(
+            state.room_id,
+            encode({
+                "type": "game_over",
+                "data": {**result, **state.clock_snapshot()},
+            }),
+            status=state.status
+        )
+        move_writer.enqueue_room(state.room_id, self.room_values(state))
+        await move_writer.flush()
+        await settlement.settle(state.room_id, result["winner_side"])
+
+    async def add_connection(self, connection: Connection):
+        """Register a socket with its room and follow the room on the backplane"""
+        self.connections[connection.socket] = connection
+        
+        # Every socket gets its own bounded queue and writer so a slow client only delays itself
+        connection.outbox = asyncio.Queue(maxsize=WS_SEND_QUEUE_SIZE)
+        connection.writer_task = asyncio.create_task(self._write_frames(connection))
+        
+        room_connections = self.room_connections.setdefault(connection.roomId, [])
+        room_connections.append(connection)
+        if len(room_connections) == 1:
+            await backplane.subscribe(connection.roomId)
+
     def get_connection(self, websocket: WebSocket) -> Optional[Connection]:
         """Get connection for a websocket"""
         return self.connections.get(websocket)
@@ -102,14 +240,17 @@ class RoomManager:
     async def disconnect(self, websocket: WebSocket, session: AsyncSession):
         """Handle disconnection"""
         connection = self.connections.get(websocket)
+        if connection and connection.writer_task is not None:
+            connection.writer_task.cancel()
         if connection and connection.roomId:
             # Update player status
             if connection.playerId:
                 query = select(GamePlayer).where(GamePlayer.id == connection.playerId)
                 result = await session.execute(query)
                 player = result.scalar_one_or_none()
-                if player:
+                if player and player.is_connected:
                     player.is_connected = False
+                    await change_connected_count(session, player.room_id, -1)
                     await session.commit()
             
             # Remove from room connections
@@ -118,23 +259,147 @@ class RoomManager:
                     c for c in self.room_connections[connection.roomId]
                     if c.socket != websocket
                 ]
+                if not self.room_connections[connection.roomId]:
+                    await backplane.unsubscribe(connection.roomId)
+                    self.drop_game_state(connection.roomId)
+                    # Nobody is left in the room - make its moves durable now
+                    await move_writer.flush()
         
         self.connections.pop(websocket, None)
 
     async def send_to_room(
         self,
         room_id: int,
-        message: str,
+        message: OutgoingMessage,
+        exclude_websocket: Optional[WebSocket] = None,
+        move: Optional[dict] = None,
+        status: Optional[GameRoomStatus] = None
+    ):
+        """
+        Send message to all connections in a room, on this worker and on any
+        other worker holding sockets for the room. `move` and `status` are passed
+        along so other workers can keep their copy of the game state in sync.
+        The message is encoded by the caller once and shared by all recipients;
+        pass a {protocol_version: frame} dict to send version-specific frames.
+        """
+        self._send_local(room_id, message, exclude_websocket)
+        await backplane.publish(room_id, message, move, status=status.value if status else None)
+
+    async def send_to_player(
+        self,
+        room_id: int,
+        player_id: int,
+        message: OutgoingMessage,
+        status: Optional[GameRoomStatus] = None
+    ):
+        """
+        Send message to one player of a room, forwarding it if the player is on another worker.
+        `status` is passed along so the other worker's copy of the game state follows the room status.
+        """
+        for connection in self.get_room_connections(room_id):
+            if connection.playerId == player_id:
+                self._enqueue(connection, message)
+                return
+        await backplane.publish(room_id, message, player_id=player_id, status=status.value if status else None)
+
+    async def receive_from_backplane(self, room_id: int, envelope: dict):
+        """Deliver a room message published by another worker"""
+        move = envelope.get("move")
+        state = self.game_states.get(room_id)
+        status = envelope.get("status")
+        if status is not None and state is not None and state.status != GameRoomStatus.FINISHED:
+            # The opponent joined, or the game ended, through another worker
+            state.status = GameRoomStatus(status)
+            if state.status == GameRoomStatus.FINISHED and state.flag_timer is not None:
+                state.flag_timer.cancel()
+                state.flag_timer = None
+        if move is not None and state is not None:
+            state.apply_replicated_move(move)
+            # The worker that accepted the move runs the clock
+            if state.flag_timer is not None:
+                state.flag_timer.cancel()
+                state.flag_timer = None
+        
+        player_id = envelope.get("player_id")
+        if player_id is not None:
+            for connection in self.get_room_connections(room_id):
+                if connection.playerId == player_id:
+                    self._enqueue(connection, envelope["message"])
+            return
+        self._send_local(room_id, envelope["message"])
+
+    def _send_local(
+        self,
+        room_id: int,
+        message: OutgoingMessage,
         exclude_websocket: Optional[WebSocket] = None
     ):
-        """Send message to all connections in a room"""
-        connections = self.get_room_connections(room_id)
-        for connection in connections:
+        for connection in self.get_room_connections(room_id):
             if connection.socket != exclude_websocket:
+                self._enqueue(connection, message)
+
+    def _enqueue(self, connection: Connection, message: OutgoingMessage):
+        """Queue a frame for a connection without waiting for the socket"""
+        if connection.evicted or connection.outbox is None:
+            return
+        frame = frame_for(message, connection.protocol_version)
+        if frame is None:
+            return
+        try:
+            connection.outbox.put_nowait(frame)
+        except asyncio.QueueFull:
+            self._evict(connection, f"send queue full ({connection.outbox.maxsize} frames)")
+
+    async def _write_frames(self, connection: Connection):
+        """Writer task: drain the connection's queue onto its socket"""
+        while True:
+            frames = [await connection.outbox.get()]
+            if connection.batch_frames:
+                # Frames queued while this task waited to run (e.g. a move and its
+                # timer update) go out together
+                while len(frames) < WS_COALESCE_MAX_FRAMES and not connection.outbox.empty():
+                    frames.append(connection.outbox.get_nowait())
+                if len(frames) > 1:
+                    self.coalesced_frames += len(frames)
+                    frames = coalesce(frames)
+            for message in frames:
+                send = connection.socket.send_bytes if isinstance(message, bytes) else connection.socket.send_text
                 try:
-                    await connection.socket.send_text(message)
+                    await asyncio.wait_for(send(message), timeout=WS_SEND_TIMEOUT_SECONDS)
+                except asyncio.TimeoutError:
+                    self._evict(connection, f"send took longer than {WS_SEND_TIMEOUT_SECONDS}s")
+                    return
                 except Exception:
-                    pass  # Connection might be closed
+                    return  # Connection closed, the receive loop cleans up
+
+    def _evict(self, connection: Connection, reason: str):
+        """Drop a slow consumer; its receive loop then goes through the normal disconnect path"""
+        if connection.evicted:
+            return
+        connection.evicted = True
+        self.evicted_connections += 1
+        logger.warning(f"Evicting slow WebSocket consumer (room {connection.roomId}, player {connection.playerId}): {reason}")
+        if connection.writer_task is not None and connection.writer_task is not asyncio.current_task():
+            connection.writer_task.cancel()
+        task = asyncio.create_task(self._close_socket(connection.socket))
+        self._close_tasks.add(task)
+        task.add_done_callback(self._close_tasks.discard)
+
+    async def _close_socket(self, websocket: WebSocket):
+        try:
+            await asyncio.wait_for(websocket.close(code=SLOW_CONSUMER_CLOSE_CODE), timeout=WS_SEND_TIMEOUT_SECONDS)
+        except Exception:
+            pass  # Socket is already gone
+
+    def stats(self) -> dict:
+        return {
+            "connections": len(self.connections),
+            "rooms": sum(1 for connections in self.room_connections.values() if connections),
+            "game_states": len(self.game_states),
+            "queued_frames": sum(c.outbox.qsize() for c in self.connections.values() if c.outbox is not None),
+            "evicted_connections": self.evicted_connections,
+            "coalesced_frames": self.coalesced_frames,
+        }
 
 
 room_manager = RoomManager()
@@ -0,0 +1,154 @@
+"""
+Background cleanup of abandoned game rooms.
+
+Waiting rooms are normally deleted when their player's WebSocket
+disconnects, but a client that never connects (or a worker that dies)
+leaves the room and its placeholder players behind. Every
+ROOM_SWEEP_INTERVAL_SECONDS the sweeper:
+  - deletes waiting rooms older than ROOM_WAITING_MAX_AGE_SECONDS that
+    nobody is connected to, and withdraws their matchmaking tickets
+  - finishes rooms without activity for ROOM_ABANDONED_MAX_AGE_SECONDS,
+    whatever their connected count says (it can be stale after a crash)
+
+Both run in batches of ROOM_SWEEP_BATCH_SIZE rooms, one short transaction
+per batch, with SKIP LOCKED so several workers can sweep at the same time.
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+from sqlalchemy import select, update, delete, func, or_
+
+from src.config import (
+    ROOM_SWEEP_INTERVAL_SECONDS,
+    ROOM_SWEEP_BATCH_SIZE,
+    ROOM_WAITING_MAX_AGE_SECONDS,
+    ROOM_ABANDONED_MAX_AGE_SECONDS,
+)
+from src.database import async_session_maker
+from src.game.models import GameRoom, GameRoomStatus
+from src.game.matchmaking import matchmaker
+from src.game.room_manager import room_manager
+
+logger = logging.getLogger(__name__)
+
+
+class RoomSweeper:
+    def __init__(
+        self,
+        interval_seconds: float = ROOM_SWEEP_INTERVAL_SECONDS,
+        batch_size: int = ROOM_SWEEP_BATCH_SIZE,
+        waiting_max_age_seconds: float = ROOM_WAITING_MAX_AGE_SECONDS,
+        abandoned_max_age_seconds: float = ROOM_ABANDONED_MAX_AGE_SECONDS,
+    ):
+        self.interval = interval_seconds
+        self.batch_size = batch_size
+        self.waiting_max_age = timedelta(seconds=waiting_max_age_seconds)
+        self.abandoned_max_age = timedelta(seconds=abandoned_max_age_seconds)
+        self._task: Optional[asyncio.Task] = None
+        self.deleted_rooms = 0
+        self.finished_rooms = 0
+        self.last_run_at: Optional[datetime] = None
+
+    def start(self):
+        """Start the periodic sweep (call from the application startup hook)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def run_once(self) -> int:
+        """Reclaim abandoned rooms; returns how many were deleted or finished"""
+        now = datetime.now(timezone.utc)
+        deleted = await self._sweep(self._delete_waiting_batch, now)
+        finished = await self._sweep(self._finish_abandoned_batch, now)
+
+        self.deleted_rooms += deleted
+        self.finished_rooms += finished
+        self.last_run_at = now
+        if deleted or finished:
+            logger.info(f"Room sweep: deleted {deleted} stale waiting room(s), finished {finished} abandoned room(s)")
+        return deleted + finished
+
+    async def _sweep(self, run_batch, now: datetime) -> int:
+        total = 0
+        while True:
+            async with async_session_maker() as session:
+                room_ids = await run_batch(session, now)
+                await session.commit()
+            for room_id in room_ids:
+                matchmaker.cancel(room_id)
+                room_manager.drop_game_state(room_id)
+            total += len(room_ids)
+            if len(room_ids) < self.batch_size:
+                return total
+            # Let game traffic through between batches
+            await asyncio.sleep(0)
+
+    async def _delete_waiting_batch(self, session, now: datetime) -> List[int]:
+        # Players, moves and rounds go with the room (ON DELETE CASCADE)
+        batch = (
+            select(GameRoom.id)
+            .where(
+                GameRoom.status == GameRoomStatus.WAITING,
+                GameRoom.created_at < now - self.waiting_max_age,
+                or_(GameRoom.connected_count == 0, GameRoom.created_at < now - self.abandoned_max_age),
+            )
+            .limit(self.batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        result = await session.execute(
+            delete(GameRoom)
+            .where(GameRoom.id.in_(batch.scalar_subquery()))
+            .returning(GameRoom.id)
+            .execution_options(synchronize_session=False)
+        )
+        return list(result.scalars().all())
+
+    async def _finish_abandoned_batch(self, session, now: datetime) -> List[int]:
+        # Finished rather than deleted: the moves stay in the game history
+        batch = (
+            select(GameRoom.id)
+            .where(
+                GameRoom.status == GameRoomStatus.IN_PROGRESS,
+                func.coalesce(GameRoom.updated_at, GameRoom.created_at) < now - self.abandoned_max_age,
+            )
+            .limit(self.batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        result = await session.execute(
+            update(GameRoom)
+            .where(GameRoom.id.in_(batch.scalar_subquery()))
+            .values(status=GameRoomStatus.FINISHED, connected_count=0)
+            .returning(GameRoom.id)
+            .execution_options(synchronize_session=False)
+        )
+        return list(result.scalars().all())
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Room sweep failed: {e}", exc_info=True)
+            await asyncio.sleep(self.interval)
+
+    def stats(self) -> dict:
+        return {
+            "deleted_rooms": self.deleted_rooms,
+            "finished_rooms": self.finished_rooms,
+            "last_run_at": self.last_run_at.isoformat() if self.last_run_at else None,
+        }
+
+
+room_sweeper = RoomSweeper()
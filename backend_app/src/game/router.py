@@ -1,27 +1,38 @@
 import json
-import uuid
 from datetime import datetime, timezone
 from typing import List, Optional
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy import select, insert, func, and_, or_
+from fastapi.security import HTTPAuthorizationCredentials
+from sqlalchemy import select, func, and_
 from sqlalchemy.ext.asyncio import AsyncSession
 from starlette.websockets import WebSocket, WebSocketDisconnect
 
 from src.database import get_async_session, async_session_maker
-from src.game.models import Messages, GameRoom, GamePlayer, GameMove, RpsRound, RpsChoice as RpsChoiceModel, GameRoomStatus
+from src.game.models import Messages, GameRoom, GamePlayer, RpsRound, RpsChoice as RpsChoiceModel, GameRoomStatus
 from src.game.schemas import (
     MessagesModel, 
     GameRoomCreate, 
     GameRoomResponse,
-    GameMoveCreate,
-    GameMoveResponse,
-    RpsChoiceRequest,
     RpsChoiceEnum,
-    RpsRoundResponse,
-    WebSocketMessage,
     Connection
 )
-from src.game.room_manager import room_manager
+from src.game.room_manager import room_manager, reserve_player_slot, change_connected_count
+from src.game.game_state import MoveRejected
+from src.game.move_writer import move_writer
+from src.game.protocol import (
+    PROTOCOL_V1,
+    PROTOCOL_V2,
+    PROTOCOL_V3,
+    encode,
+    decode,
+    decode_binary,
+    encode_move_frame,
+    parse_protocol_version,
+)
+from src.game.matchmaking import matchmaker
+from src.game.settlement import settlement
+from src.auth.dependencies import get_optional_user
+from src.auth.models import User
 
 router = APIRouter(
     prefix="/game",
@@ -51,171 +62,31 @@ async def create_room(
 @router.post("/rooms/matchmake", response_model=GameRoomResponse)
 async def matchmake(
     room_data: GameRoomCreate,
-    session: AsyncSession = Depends(get_async_session)
+    session: AsyncSession = Depends(get_async_session),
+    current_user: Optional[User] = Depends(get_optional_user)
 ):
-    """Find a waiting room or create a new one for matchmaking.
-    Uses SELECT FOR UPDATE SKIP LOCKED to atomically claim slots and prevent race conditions."""
+    """Join the waiting room of the closest-rated player, or open a new waiting room.
+    Pairing happens in the in-memory matchmaking queue (see matchmaking.py)."""
     import logging
     logger = logging.getLogger(__name__)
     
     try:
-        # STEP 1: First, check for existing waiting rooms with available slots
-        # Use SELECT FOR UPDATE SKIP LOCKED to atomically lock and claim a waiting room
-        # This prevents race conditions where multiple users try to join the same room simultaneously
-        # Order by created_at ASC to match oldest waiting room first (FIFO)
         logger.info(f"🔍 [MATCHMAKE] Starting matchmaking for game_mode: {room_data.game_mode}")
-        
-        max_retries = 2
-        created_room = None  # Store room created on first attempt in case we need to return it
-        created_room_id = None  # Track the room ID we created to avoid matching to it
-        
-        for attempt in range(max_retries):
-            logger.info(f"🔍 [MATCHMAKE] Attempt {attempt + 1}/{max_retries}: Checking for available WAITING rooms...")
-            
-            # CRITICAL: Query ONLY for WAITING rooms (exclude IN_PROGRESS and other statuses)
-            # We lock rooms first, then check player count to ensure atomicity
-            # Note: We can't use GROUP BY with FOR UPDATE, so we check counts separately
-            # Exclude the room we just created (if any) from the query to avoid matching to our own room
-            query_conditions = [
-                GameRoom.status == GameRoomStatus.WAITING,
-                GameRoom.game_mode == room_data.game_mode
-            ]
-            if created_room_id is not None:
-                # Exclude the room we just created - we want to match to OTHER users' rooms
-                query_conditions.append(GameRoom.id != created_room_id)
-                logger.info(f"🔍 [MATCHMAKE] Excluding our own room (id: {created_room_id}) from search")
-            
-            query = select(GameRoom).where(
-                and_(*query_conditions)
-            ).order_by(GameRoom.created_at.asc()).with_for_update(skip_locked=True)
-            
-            result = await session.execute(query)
-            waiting_rooms = result.scalars().all()
-            
-            logger.info(f"✅ [MATCHMAKE] Query returned {len(waiting_rooms)} waiting room(s) (status=WAITING, game_mode={room_data.game_mode})")
-            
-            # Try each locked room to see if it has space
-            # Since room is locked, we can safely check and update player count
-            available_room_found = False
-            for waiting_room in waiting_rooms:
-                # Skip our own room (double-check, though it should be filtered in query)
-                if created_room_id is not None and waiting_room.id == created_room_id:
-                    logger.info(f"🔍 [MATCHMAKE] Skipping our own room {waiting_room.room_code}")
-                    continue
-                
-                # Refresh room to ensure we have latest status
-                await session.refresh(waiting_room)
-                
-                # Double-check room status (should already be WAITING from query, but be safe)
-                if waiting_room.status != GameRoomStatus.WAITING:
-                    logger.warning(f"⚠️ [MATCHMAKE] Room {waiting_room.room_code} status changed to {waiting_room.status}, skipping")
-                    continue
-                
-                # Count players in this room (room is locked, so safe to check atomically)
-                players_count_query = select(func.count(GamePlayer.id)).where(
-                    GamePlayer.room_id == waiting_room.id
-                )
-                count_result = await session.execute(players_count_query)
-                players_count = count_result.scalar() or 0
-                
-                logger.info(f"🔍 [MATCHMAKE] Checking room {waiting_room.room_code}: {players_count} player(s), status: {waiting_room.status.value}")
-                
-                # CRITICAL: Only proceed if room has less than 2 players
-                if players_count >= 2:
-                    logger.warning(f"❌ [MATCHMAKE] Room {waiting_room.room_code} is FULL ({players_count} players), skipping")
-                    continue
-                
-                available_room_found = True
-                logger.info(f"✅ [MATCHMAKE] Found AVAILABLE room {waiting_room.room_code} with {players_count} player(s), attempting to join...")
-                
-                # Found a waiting room with space - create a placeholder player to reserve the slot
-                # This prevents other matchmake calls from claiming the same slot
-                # The player will be properly updated when WebSocket connects
-                player_side = "light" if players_count == 0 else "dark"
-                placeholder_player = GamePlayer(
-                    room_id=waiting_room.id,
-                    user_id=None,  # Will be set when WebSocket connects (if authenticated)
-                    player_side=player_side,
-                    is_connected=False,  # Will be set to True when WebSocket connects
-                )
-                session.add(placeholder_player)
-                await session.flush()
-                
-                # Update room status if second player joins
-                if players_count == 1:
-                    waiting_room.status = GameRoomStatus.IN_PROGRESS
-                    logger.info(f"✅ [MATCHMAKE] Room {waiting_room.room_code} is now FULL (2 players), updating status to IN_PROGRESS")
-                
-                await session.commit()
-                await session.refresh(waiting_room)
-                
-                logger.info(f"🎉 [MATCHMAKE] SUCCESS: Matched user to existing room {waiting_room.room_code} (now has {players_count + 1} players, status: {waiting_room.status.value})")
-                return GameRoomResponse(
-                    id=waiting_room.id,
-                    room_code=waiting_room.room_code,
-                    status=waiting_room.status.value,
-                    game_mode=waiting_room.game_mode,
-                    light_player_time=waiting_room.light_player_time,
-                    dark_player_time=waiting_room.dark_player_time,
-                    current_turn_started_at=waiting_room.current_turn_started_at,
-                    created_at=waiting_room.created_at,
-                )
-            
-            # STEP 2: No available waiting room found - create a new one (only on first attempt)
-            if not available_room_found:
-                logger.info(f"❌ [MATCHMAKE] No available waiting room found on attempt {attempt + 1}")
-            
-            if attempt == 0 and not available_room_found:
-                logger.info(f"🆕 [MATCHMAKE] Creating NEW room (no available rooms found)...")
-                room_code = str(uuid.uuid4())[:8].upper()
-                
-                room = GameRoom(
-                    room_code=room_code,
-                    status=GameRoomStatus.WAITING,
-                    game_mode=room_data.game_mode
-                )
-                session.add(room)
-                await session.flush()  # Flush to get room.id
-                
-                # Create first player slot for this user (reserved but not connected yet)
-                first_player = GamePlayer(
-                    room_id=room.id,
-                    user_id=None,  # Will be set when WebSocket connects (if authenticated)
-                    player_side="light",
-                    is_connected=False,  # Will be set to True when WebSocket connects
-                )
-                session.add(first_player)
-                await session.commit()
-                await session.refresh(room)
-                
-                created_room = room  # Store for potential return
-                created_room_id = room.id  # Track the room ID we created to exclude it from retry searches
-                logger.info(f"✅ [MATCHMAKE] Created new waiting room {room.room_code} (id: {room.id}, game_mode: {room.game_mode}, status: WAITING)")
-                
-                # If we have retries left, wait a bit and try again to catch concurrent rooms
-                if attempt < max_retries - 1:
-                    # Small delay to allow concurrent commits to be visible
-                    import asyncio
-                    logger.info(f"⏳ [MATCHMAKE] Waiting 100ms before retry to catch concurrent room creations...")
-                    await asyncio.sleep(0.1)  # 100ms delay
-                    continue  # Retry the query
-        
-        # After all retries, return the room we created (if any)
-        if created_room:
-            logger.info(f"📤 [MATCHMAKE] Returning created room {created_room.room_code} after {max_retries} attempts (no match found)")
-            return GameRoomResponse(
-                id=created_room.id,
-                room_code=created_room.room_code,
-                status=created_room.status.value,
-                game_mode=created_room.game_mode,
-                light_player_time=created_room.light_player_time,
-                dark_player_time=created_room.dark_player_time,
-                current_turn_started_at=created_room.current_turn_started_at,
-                created_at=created_room.created_at,
-            )
-        
-        # Should not reach here, but just in case
-        raise HTTPException(status_code=500, detail="Matchmaking failed after retries")
+        room = await matchmaker.matchmake(
+            session,
+            room_data.game_mode,
+            user_id=current_user.id if current_user else None
+        )
+        return GameRoomResponse(
+            id=room.id,
+            room_code=room.room_code,
+            status=room.status.value,
+            game_mode=room.game_mode,
+            light_player_time=room.light_player_time,
+            dark_player_time=room.dark_player_time,
+            current_turn_started_at=room.current_turn_started_at,
+            created_at=room.created_at,
+        )
         
     except Exception as e:
         await session.rollback()
@@ -233,57 +104,34 @@ async def check_available_room(
     logger = logging.getLogger(__name__)
     
     try:
-        # Query for waiting rooms with available slots
+        # Oldest waiting room with a free slot - a single lookup on ix_game_rooms_open,
+        # however many rooms are waiting
         query = select(GameRoom).where(
             and_(
                 GameRoom.status == GameRoomStatus.WAITING,
-                GameRoom.game_mode == game_mode
+                GameRoom.game_mode == game_mode,
+                GameRoom.player_count < 2
             )
-        ).order_by(GameRoom.created_at.asc())
+        ).order_by(GameRoom.created_at.asc()).limit(1)
         
         result = await session.execute(query)
-        waiting_rooms = result.scalars().all()
+        room = result.scalar_one_or_none()
         
-        logger.info(f"🔍 [CHECK_AVAILABLE] Query found {len(waiting_rooms)} waiting room(s)")
+        if room is None:
+            logger.debug("❌ [CHECK_AVAILABLE] No available rooms found")
+            return None
         
-        # Check each room for available slots (same logic as matchmake for consistency)
-        for room in waiting_rooms:
-            # Refresh room to ensure we have latest status from database
-            # This is critical to see rooms that were just created/updated by other requests
-            await session.refresh(room)
-            
-            # Double-check room status (may have changed since query due to race conditions)
-            if room.status != GameRoomStatus.WAITING:
-                logger.debug(f"🔍 [CHECK_AVAILABLE] Room {room.room_code} is not WAITING (status: {room.status}), skipping")
-                continue
-            
-            # Count players in this room (use same query as matchmake)
-            players_count_query = select(func.count(GamePlayer.id)).where(
-                GamePlayer.room_id == room.id
-            )
-            count_result = await session.execute(players_count_query)
-            players_count = count_result.scalar() or 0
-            
-            logger.info(f"🔍 [CHECK_AVAILABLE] Room {room.room_code}: {players_count} player(s), status: {room.status.value}")
-            
-            # Only return room if it has less than 2 players (same logic as matchmake)
-            if players_count < 2:
-                logger.info(f"✅ [CHECK_AVAILABLE] Found available room: {room.room_code} with {players_count} player(s)")
-                return GameRoomResponse(
-                    id=room.id,
-                    room_code=room.room_code,
-                    status=room.status.value,
-                    game_mode=room.game_mode,
-                    light_player_time=room.light_player_time,
-                    dark_player_time=room.dark_player_time,
-                    current_turn_started_at=room.current_turn_started_at,
-                    created_at=room.created_at,
-                )
-            else:
-                logger.debug(f"🔍 [CHECK_AVAILABLE] Room {room.room_code} is full ({players_count} players), skipping")
-        
-        logger.info(f"❌ [CHECK_AVAILABLE] No available rooms found")
-        return None
+        logger.debug(f"✅ [CHECK_AVAILABLE] Found available room: {room.room_code} with {room.player_count} player(s)")
+        return GameRoomResponse(
+            id=room.id,
+            room_code=room.room_code,
+            status=room.status.value,
+            game_mode=room.game_mode,
+            light_player_time=room.light_player_time,
+            dark_player_time=room.dark_player_time,
+            current_turn_started_at=room.current_turn_started_at,
+            created_at=room.created_at,
+        )
         
     except Exception as e:
         logger.error(f"Error checking available rooms: {e}", exc_info=True)
@@ -306,6 +154,39 @@ async def get_room(
     return room
 
 
+async def load_player_profiles(session: AsyncSession, user_ids: List[int]) -> dict:
+    """Opponent info (name and equipped avatar) for a set of users, keyed by user id"""
+    if not user_ids:
+        return {}
+    
+    # Import here to avoid circular dependencies
+    from src.auth.models import User
+    from src.collection.models import UserCollection, CollectionItem
+    
+    users_result = await session.execute(select(User.id, User.profile_name).where(User.id.in_(user_ids)))
+    avatars_result = await session.execute(
+        select(UserCollection.user_id, CollectionItem.icon_name)
+        .join(CollectionItem, UserCollection.item_id == CollectionItem.id)
+        .where(
+            and_(
+                UserCollection.user_id.in_(user_ids),
+                UserCollection.is_equipped == True,
+                CollectionItem.category == "avatars"
+            )
+        )
+    )
+    avatars = {user_id: icon_name for user_id, icon_name in avatars_result.all()}
+    
+    return {
+        user_id: {
+            "user_id": user_id,
+            "username": profile_name,  # Use profile_name instead of username
+            "avatar_icon": avatars.get(user_id) or "avatar_3"  # Default avatar
+        }
+        for user_id, profile_name in users_result.all()
+    }
+
+
 @router.websocket("/ws/{room_code}")
 async def websocket_endpoint(websocket: WebSocket, room_code: str):
     """WebSocket endpoint for game communication"""
@@ -314,6 +195,8 @@ async def websocket_endpoint(websocket: WebSocket, room_code: str):
     
     try:
         logger.info(f"WebSocket connection attempt for room: {room_code}")
+        protocol_version = parse_protocol_version(websocket.query_params.get("v"))
+        batch_frames = websocket.query_params.get("batch") == "1"
         await websocket.accept()
         logger.info(f"WebSocket accepted for room: {room_code}")
         
@@ -333,39 +216,35 @@ async def websocket_endpoint(websocket: WebSocket, room_code: str):
                 await websocket.close()
                 return
             
+            # Registered players identify themselves with their access token so the game is rated
+            user = None
+            token = websocket.query_params.get("token")
+            if token:
+                user = await get_optional_user(HTTPAuthorizationCredentials(scheme="Bearer", credentials=token), session)
+                if user is None:
+                    logger.warning(f"Invalid token on WebSocket for room {room_code}, joining anonymously")
+            
             # Find existing placeholder player for this room (created during matchmaking)
             # OR find a disconnected player trying to reconnect
             # Priority: 1) Disconnected placeholder, 2) Any disconnected player in this room
+            # (a registered player reconnecting gets their own slot back first)
+            slot_order = [GamePlayer.id.asc()]
+            if user is not None:
+                slot_order.insert(0, func.coalesce(GamePlayer.user_id == user.id, False).desc())
             players_query = select(GamePlayer).where(
                 and_(
                     GamePlayer.room_id == room.id,
                     GamePlayer.is_connected == False
                 )
-            ).order_by(GamePlayer.id.asc()).limit(1)
+            ).order_by(*slot_order).limit(1)
             players_result = await session.execute(players_query)
             player = players_result.scalar_one_or_none()
             
             if not player:
-                # Check if room already has 2 players (counting all players, not just connected ones)
-                all_players_query = select(func.count(GamePlayer.id)).where(
-                    GamePlayer.room_id == room.id
-                )
-                count_result = await session.execute(all_players_query)
-                player_count = count_result.scalar() or 0
-                
-                # Check if room has 2 connected players already (room is truly full and active)
-                connected_players_query = select(func.count(GamePlayer.id)).where(
-                    and_(
-                        GamePlayer.room_id == room.id,
-                        GamePlayer.is_connected == True
-                    )
-                )
-                connected_count_result = await session.execute(connected_players_query)
-                connected_count = connected_count_result.scalar() or 0
-                
-                # Only reject if there are 2 connected players (room is active and full)
-                if connected_count >= 2:
-                    logger.warning(f"Room {room_code} is full (has {connected_count} connected players)")
+                # No free slot to take over - reserve a new one if the room has fewer than 2 players
+                player_count = await reserve_player_slot(session, room.id)
+                if player_count is None:
+                    logger.warning(f"Room {room_code} is full (has {room.player_count} players, {room.connected_count} connected)")
                     await websocket.send_text(json.dumps({
                         "type": "error",
                         "message": "Room is full"
@@ -373,61 +252,30 @@ async def websocket_endpoint(websocket: WebSocket, room_code: str):
                     await websocket.close()
                     return
                 
-                # If room has 2 total players but less than 2 connected, check if we can reconnect
-                # This handles the case where a player disconnected and is reconnecting
-                if player_count >= 2 and connected_count < 2:
-                    # Find any disconnected player in the room (for reconnection)
-                    reconnect_query = select(GamePlayer).where(
-                        and_(
-                            GamePlayer.room_id == room.id,
-                            GamePlayer.is_connected == False
-                        )
-                    ).order_by(GamePlayer.id.asc()).limit(1)
-                    reconnect_result = await session.execute(reconnect_query)
-                    player = reconnect_result.scalar_one_or_none()
-                    
-                    if player:
-                        logger.info(f"Player {player.id} reconnecting to room {room_code}")
-                        # Update existing player to connected
-                        player.is_connected = True
-                    else:
-                        # This shouldn't happen, but handle it gracefully
-                        logger.warning(f"Room {room_code} has {player_count} players but none are disconnected. This is unexpected.")
-                        await websocket.send_text(json.dumps({
-                            "type": "error",
-                            "message": "Room is full"
-                        }))
-                        await websocket.close()
-                        return
-                else:
-                    # Create new player (room has less than 2 players)
-                    player_side = "light" if player_count == 0 else "dark"
-                    player = GamePlayer(
-                        room_id=room.id,
-                        user_id=None,
-                        player_side=player_side,
-                        is_connected=True,
-                    )
-                    session.add(player)
-                    logger.info(f"Created new player for room {room_code} with side {player_side}")
+                # Create new player
+                player_side = "light" if player_count == 1 else "dark"
+                player = GamePlayer(
+                    room_id=room.id,
+                    user_id=user.id if user else None,
+                    player_side=player_side,
+                    is_connected=True,
+                )
+                session.add(player)
+                logger.info(f"Created new player for room {room_code} with side {player_side}")
             else:
                 # Update existing placeholder/disconnected player
                 logger.info(f"Found existing player {player.id} (disconnected) for room {room_code}, updating to connected")
                 player.is_connected = True
+                if user is not None:
+                    player.user_id = user.id
             
-            # Count connected players BEFORE adding to room_manager to determine if this is the second player
-            players_count_query = select(func.count(GamePlayer.id)).where(
-                and_(
-                    GamePlayer.room_id == room.id,
-                    GamePlayer.is_connected == True
-                )
-            )
-            connected_count_result = await session.execute(players_count_query)
-            connected_count_before_commit = connected_count_result.scalar() or 0
+            # Connected players including this one, to determine if this is the second player
+            connected_count_before_commit = await change_connected_count(session, room.id, 1)
             
             # Update room status if second player joins
             if connected_count_before_commit >= 2 and room.status == GameRoomStatus.WAITING:
                 room.status = GameRoomStatus.IN_PROGRESS
+                matchmaker.cancel(room.id)
                 logger.info(f"Room {room_code} is now full (2 players connected), updating status to IN_PROGRESS")
             
             await session.commit()
@@ -435,16 +283,24 @@ async def websocket_endpoint(websocket: WebSocket, room_code: str):
             await session.refresh(player)
             
             # Add connection to room_manager AFTER commit
-            connection = Connection(room.id, websocket, player.id)
-            room_manager.connections[websocket] = connection
+            connection = Connection(room.id, websocket, player.id, protocol_version, batch_frames)
+            await room_manager.add_connection(connection)
             
-            if room.id not in room_manager.room_connections:
-                room_manager.room_connections[room.id] = []
-            room_manager.room_connections[room.id].append(connection)
+            # Make sure the in-memory game state knows about this player
+            game_state = await room_manager.get_game_state(room.id, session)
+            if game_state:
+                game_state.add_player(player.id, player.player_side)
+                if game_state.status != GameRoomStatus.FINISHED:
+                    # The database may not have the result of a game that just ended yet
+                    game_state.status = room.status
+                if game_state.flag_timer is None:
+                    # Reconnecting doesn't stop the clock of the side to move
+                    room_manager.arm_clock(game_state)
             
             # Check if this is the second player AFTER adding to room_manager
+            # (the DB count also sees an opponent connected to another worker)
             current_connections_count = len(room_manager.room_connections.get(room.id, []))
-            is_second_player = (current_connections_count == 2)
+            is_second_player = current_connections_count == 2 or connected_count_before_commit == 2
             
             logger.info(f"Player connected to room {room_code}: {connected_count_before_commit} DB players, {current_connections_count} WebSocket connections")
             
@@ -465,146 +321,125 @@ async def websocket_endpoint(websocket: WebSocket, room_code: str):
             if is_second_player:
                 logger.info(f"🎮 Second player joined room {room_code}, notifying ALL players that game is starting")
                 
-                # Get opponent info for each player
-                # Query all players in room to get opponent info
+                # Query all players in room and the profile of every registered one at once
                 all_players_query = select(GamePlayer).where(GamePlayer.room_id == room.id)
                 all_players_result = await session.execute(all_players_query)
                 all_players = all_players_result.scalars().all()
+                profiles = await load_player_profiles(session, [p.user_id for p in all_players if p.user_id])
                 
-                # Send to all connections (including the current one)
-                for conn in room_manager.room_connections.get(room.id, []):
+                # Send to all players (including the current one), wherever they are connected
+                for room_player in all_players:
                     try:
-                        # Find opponent for this connection
-                        current_player_id = conn.playerId
+                        # Find opponent for this player
+                        current_player_id = room_player.id
                         opponent_player = next((p for p in all_players if p.id != current_player_id), None)
+                        opponent_info = profiles.get(opponent_player.user_id) if opponent_player else None
                         
-                        opponent_info = None
-                        if opponent_player and opponent_player.user_id:
-                            # Import here to avoid circular dependencies
-                            from src.auth.models import User
-                            from src.collection.models import UserCollection, CollectionItem
-                            
-                            # Query opponent user and their equipped avatar
-                            opponent_user_query = select(User).where(User.id == opponent_player.user_id)
-                            opponent_user_result = await session.execute(opponent_user_query)
-                            opponent_user = opponent_user_result.scalar_one_or_none()
-                            
-                            if opponent_user:
-                                # Get equipped avatar
-                                avatar_query = (
-                                    select(CollectionItem.icon_name)
-                                    .join(UserCollection, UserCollection.item_id == CollectionItem.id)
-                                    .where(
-                                        and_(
-                                            UserCollection.user_id == opponent_user.id,
-                                            UserCollection.is_equipped == True,
-                                            CollectionItem.category == "avatars"
-                                        )
-                                    )
-                                )
-                                avatar_result = await session.execute(avatar_query)
-                                avatar_icon = avatar_result.scalar_one_or_none()
-                                
-                                opponent_info = {
-                                    "user_id": opponent_user.id,
-                                    "username": opponent_user.profile_name,  # Use profile_name instead of username
-                                    "avatar_icon": avatar_icon if avatar_icon else "avatar_3"  # Default avatar
-                                }
-                        
-                        player_joined_message = json.dumps({
+                        player_joined_message = encode({
                             "type": "player_joined",
                             "room_code": room.room_code,
                             "status": room.status.value,
                             "opponent": opponent_info  # Include opponent info if available
                         })
-                        await conn.socket.send_text(player_joined_message)
+                        await room_manager.send_to_player(room.id, current_player_id, player_joined_message, status=room.status)
                         logger.info(f"Sent player_joined message to player in room {room_code} with opponent info")
                     except Exception as e:
                         logger.warning(f"Failed to send player_joined to connection: {e}")
             else:
                 # First player joined - just log
                 logger.info(f"First player joined room {room_code}, waiting for second player")
-            
-            try:
-                while True:
-                    data = await websocket.receive_text()
-                    message = json.loads(data)
-                    message_type = message.get("type")
-                    
-                    if message_type == "move":
-                        await handle_move(session, websocket, room.id, message.get("data", {}))
-                    elif message_type == "rps_choice":
-                        await handle_rps_choice(session, websocket, room.id, message.get("data", {}))
-                    elif message_type == "surrender":
-                        await handle_surrender(session, websocket, room.id)
-                    elif message_type == "heartbeat":
-                        # Heartbeat message - user is still waiting, just acknowledge
-                        # No response needed, connection staying alive is the acknowledgment
-                        logger.debug(f"Heartbeat received from player in room {room_code}")
-                    else:
+        
+        # The join session (and its pooled connection) is released before the game loop,
+        # which can last as long as the game
+        try:
+            while True:
+                frame = await websocket.receive()
+                if frame["type"] == "websocket.disconnect":
+                    raise WebSocketDisconnect(frame.get("code", 1000))
+                if frame.get("bytes") is not None:
+                    # Protocol 3 binary frame
+                    try:
+                        message = decode_binary(frame["bytes"])
+                    except ValueError as e:
                         await websocket.send_text(json.dumps({
                             "type": "error",
-                            "message": f"Unknown message type: {message_type}"
+                            "message": str(e)
                         }))
-                        
-            except WebSocketDisconnect:
-                logger.info(f"WebSocket disconnected for room: {room_code}")
-                connection = room_manager.get_connection(websocket)
+                        continue
+                else:
+                    message = decode(frame["text"])
+                message_type = message.get("type")
                 
+                # Handlers open their own short-lived sessions when they need the database
+                if message_type == "move":
+                    await handle_move(websocket, room.id, message.get("data", {}))
+                elif message_type == "rps_choice":
+                    await handle_rps_choice(websocket, room.id, message.get("data", {}))
+                elif message_type == "surrender":
+                    await handle_surrender(websocket, room.id)
+                elif message_type == "heartbeat":
+                    # Heartbeat message - user is still waiting, just acknowledge
+                    # No response needed, connection staying alive is the acknowledgment
+                    logger.debug(f"Heartbeat received from player in room {room_code}")
+                else:
+                    await websocket.send_text(json.dumps({
+                        "type": "error",
+                        "message": f"Unknown message type: {message_type}"
+                    }))
+                    
+        except WebSocketDisconnect:
+            logger.info(f"WebSocket disconnected for room: {room_code}")
+            connection = room_manager.get_connection(websocket)
+            
+            async with async_session_maker() as session:
                 # Check if this is a waiting room that should be cleaned up
                 if connection and connection.roomId:
                     # Get room to check status BEFORE disconnecting
                     room_query = select(GameRoom).where(GameRoom.id == connection.roomId)
                     room_result = await session.execute(room_query)
                     room_to_check = room_result.scalar_one_or_none()
-                    
+                
                     if room_to_check and room_to_check.status == GameRoomStatus.WAITING:
-                        # Count remaining connected players (before we disconnect this one)
-                        players_query = select(func.count(GamePlayer.id)).where(
-                            and_(
-                                GamePlayer.room_id == connection.roomId,
-                                GamePlayer.is_connected == True
-                            )
-                        )
-                        players_result = await session.execute(players_query)
-                        connected_players = players_result.scalar() or 0
-                        
+                        # Remaining connected players (before we disconnect this one)
+                        connected_players = room_to_check.connected_count
+                    
                         # If only 1 connected player (the one disconnecting), delete the waiting room
                         if connected_players <= 1:
                             logger.info(f"Cleaning up empty waiting room {room_code} (only {connected_players} connected player(s))")
                             # Delete the room and all associated data (cascade will handle players, moves, etc.)
+                            matchmaker.cancel(room_to_check.id)
                             await session.delete(room_to_check)
                             await session.commit()
                             logger.info(f"Deleted waiting room {room_code}")
                             # Don't send player_left message since room is deleted
                             await room_manager.disconnect(websocket, session)
                             return
-                
+            
                 await room_manager.disconnect(websocket, session)
                 if connection and connection.roomId:
                     # Only send player_left if room still exists (not deleted)
                     room_query = select(GameRoom).where(GameRoom.id == connection.roomId)
                     room_result = await session.execute(room_query)
                     room_exists = room_result.scalar_one_or_none() is not None
-                    
+                
                     if room_exists:
                         await room_manager.send_to_room(
                             connection.roomId,
-                            json.dumps({
+                            encode({
                                 "type": "player_left",
                                 "room_code": room_code
                             })
                         )
-            except Exception as e:
-                logger.error(f"WebSocket error for room {room_code}: {e}", exc_info=True)
-                try:
-                    await websocket.send_text(json.dumps({
-                        "type": "error",
-                        "message": f"Server error: {str(e)}"
-                    }))
-                    await websocket.close()
-                except:
-                    pass
+        except Exception as e:
+            logger.error(f"WebSocket error for room {room_code}: {e}", exc_info=True)
+            try:
+                await websocket.send_text(json.dumps({
+                    "type": "error",
+                    "message": f"Server error: {str(e)}"
+                }))
+                await websocket.close()
+            except:
+                pass
     except Exception as e:
         logger.error(f"Error setting up WebSocket connection for room {room_code}: {e}", exc_info=True)
         try:
@@ -613,7 +448,7 @@ async def websocket_endpoint(websocket: WebSocket, room_code: str):
             pass
 
 
-async def handle_move(session: AsyncSession, websocket: WebSocket, room_id: int, data: dict):
+async def handle_move(websocket: WebSocket, room_id: int, data: dict):
     """Handle chess move"""
     connection = room_manager.get_connection(websocket)
     if not connection or not connection.playerId:
@@ -631,79 +466,68 @@ async def handle_move(session: AsyncSession, websocket: WebSocket, room_id: int,
         }))
         return
     
-    # Get room and player info
-    room_query = select(GameRoom).where(GameRoom.id == room_id)
-    room_result = await session.execute(room_query)
-    room = room_result.scalar_one()
-    
-    player_query = select(GamePlayer).where(GamePlayer.id == connection.playerId)
-    player_result = await session.execute(player_query)
-    player = player_result.scalar_one()
-    
-    # Update timer: subtract elapsed time from current player
-    # Note: current_turn_started_at is timezone-aware (DateTime(timezone=True) in model)
-    if room.current_turn_started_at:
-        # Use timezone-aware datetime for comparison (database column is timezone-aware)
-        now = datetime.now(timezone.utc)
-        elapsed = (now - room.current_turn_started_at).total_seconds()
-        if player.player_side == "light":
-            room.light_player_time = max(0, int(room.light_player_time - elapsed))
-        else:
-            room.dark_player_time = max(0, int(room.dark_player_time - elapsed))
-    
-    # Switch turn timer - use timezone-aware datetime (matching database column type)
-    room.current_turn_started_at = datetime.now(timezone.utc)
-    
-    # Get current move number
-    query = select(func.max(GameMove.move_number)).where(GameMove.room_id == room_id)
-    result = await session.execute(query)
-    max_move = result.scalar_one()
-    move_number = (max_move or 0) + 1
-    
-    # Create move
-    move = GameMove(
-        room_id=room_id,
-        player_id=connection.playerId,
-        move_notation=move_notation,
-        move_number=move_number
-    )
-    session.add(move)
-    await session.commit()
-    await session.refresh(room)
+    # Validate and apply the move against the in-memory room state
+    game_state = await room_manager.get_game_state(room_id)
+    if not game_state:
+        await websocket.send_text(json.dumps({
+            "type": "error",
+            "message": "Room not found"
+        }))
+        return
+    
+    try:
+        move_data = game_state.apply_move(connection.playerId, move_notation)
+    except MoveRejected as e:
+        await websocket.send_text(json.dumps({
+            "type": "error",
+            "message": str(e)
+        }))
+        return
     
-    # Broadcast move and timer update to ALL players (including sender)
-    # This ensures both players see the move and timer updates
+    # Broadcast move to ALL players (including sender); the move frame carries the clocks
+    move_frame = encode({
+        "type": "move",
+        "data": move_data
+    })
+    try:
+        binary_move_frame = encode_move_frame(move_data, game_state.light_player_ms, game_state.dark_player_ms)
+    except ValueError:
+        binary_move_frame = move_frame  # Notation the binary layout can't express (validation disabled)
     await room_manager.send_to_room(
         room_id,
-        json.dumps({
-            "type": "move",
-            "data": {
-                "move_notation": move_notation,
-                "player_id": connection.playerId,
-                "move_number": move_number,
-                "light_player_time": room.light_player_time,
-                "dark_player_time": room.dark_player_time,
-                "current_turn_started_at": room.current_turn_started_at.isoformat() if room.current_turn_started_at else None
-            }
-        }),
-        exclude_websocket=None  # Send to all players including sender (sender will ignore their own move in _processOpponentMove)
+        {PROTOCOL_V1: move_frame, PROTOCOL_V2: move_frame, PROTOCOL_V3: binary_move_frame},
+        exclude_websocket=None,  # Send to all players including sender (sender will ignore their own move in _processOpponentMove)
+        move={
+            **move_data,
+            "player_side": game_state.players[connection.playerId],
+            # Exact clocks for the other workers' copy of the state
+            "light_player_ms": game_state.light_player_ms,
+            "dark_player_ms": game_state.dark_player_ms,
+        }
     )
     
-    # Send timer update to all players
+    # Start the opponent's clock (or stop it if the move ended the game)
+    room_manager.arm_clock(game_state)
+    
+    # Protocol v1 clients also expect a separate timer update
     await room_manager.send_to_room(
         room_id,
-        json.dumps({
+        {PROTOCOL_V1: encode({
             "type": "timer_update",
-            "data": {
-                "light_player_time": room.light_player_time,
-                "dark_player_time": room.dark_player_time,
-                "current_turn_started_at": room.current_turn_started_at.isoformat() if room.current_turn_started_at else None
-            }
-        })
+            "data": game_state.clock_snapshot()
+        })}
     )
+    
+    # Persist the move after it has been broadcast
+    room_manager.persist_move(game_state, connection.playerId, move_notation)
+    
+    # Game ended by rule (checkmate, stalemate, ...) - write it out right away and rate it
+    if game_state.result:
+        await move_writer.flush()
+        await settlement.settle(room_id, game_state.result.get("winner_side"))
 
 
-async def handle_rps_choice(session: AsyncSession, websocket: WebSocket, room_id: int, data: dict):
+async def handle_rps_choice(websocket: WebSocket, room_id: int, data: dict):
     """Handle RPS choice"""
     connection = room_manager.get_connection(websocket)
     if not connection or not connection.playerId:
@@ -730,6 +554,12 @@ async def handle_rps_choice(session: AsyncSession, websocket: WebSocket, room_id
         }))
         return
     
+    async with async_session_maker() as session:
+        await process_rps_choice(session, websocket, room_id, connection, choice)
+
+
+async def process_rps_choice(session: AsyncSession, websocket: WebSocket, room_id: int, connection: Connection, choice: RpsChoiceEnum):
+    """Record an RPS choice and announce the round once both players have chosen"""
     # Get or create current RPS round
     query = select(RpsRound).where(
         RpsRound.room_id == room_id,
@@ -799,7 +629,7 @@ async def handle_rps_choice(session: AsyncSession, websocket: WebSocket, room_id
         # Broadcast result
         await room_manager.send_to_room(
             room_id,
-            json.dumps({
+            encode({
                 "type": "rps_result",
                 "data": {
                     "round_number": rps_round.round_number,
@@ -819,7 +649,7 @@ async def handle_rps_choice(session: AsyncSession, websocket: WebSocket, room_id
         }))
 
 
-async def handle_surrender(session: AsyncSession, websocket: WebSocket, room_id: int):
+async def handle_surrender(websocket: WebSocket, room_id: int):
     """Handle player surrender - broadcast to opponent"""
     import logging
     logger = logging.getLogger(__name__)
@@ -834,17 +664,34 @@ async def handle_surrender(session: AsyncSession, websocket: WebSocket, room_id:
     
     logger.info(f"Player {connection.playerId} surrendered in room {room_id}")
     
+    # Stop the clock so the game can't also end on time
+    game_state = room_manager.game_states.get(room_id)
+    if game_state:
+        game_state.status = GameRoomStatus.FINISHED
+        room_manager.arm_clock(game_state)
+    
+    # Game is over - make sure all of its moves are written
+    await move_writer.flush()
+    
     # Broadcast surrender message to opponent (all other players in room)
     await room_manager.send_to_room(
         room_id,
-        json.dumps({
+        encode({
             "type": "surrender",
             "data": {}
         }),
-        exclude_websocket=websocket  # Don't send back to the surrendering player
+        exclude_websocket=websocket,  # Don't send back to the surrendering player
+        status=GameRoomStatus.FINISHED  # Other workers stop their copy of the clock
     )
     
     logger.info(f"Surrender message broadcast to opponent in room {room_id}")
+    
+    # The opponent wins (the side comes from the database if this worker holds no state for the room)
+    await settlement.settle_surrender(
+        room_id,
+        connection.playerId,
+        game_state.players.get(connection.playerId) if game_state else None
+    )
 
 
 def determine_rps_winner(choice1: str, choice2: str, player1_id: int, player2_id: int) -> Optional[int]:
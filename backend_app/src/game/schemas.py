@@ -1,9 +1,12 @@
+import asyncio
 from datetime import datetime
 from typing import Optional
 from pydantic import BaseModel
 from starlette.websockets import WebSocket
 import enum
 
+from src.game.protocol import DEFAULT_PROTOCOL
+
 
 class MessagesModel(BaseModel):
     id: int
@@ -14,10 +17,24 @@ class MessagesModel(BaseModel):
 
 
 class Connection:
-    def __init__(self, room_id: int | None, socket: WebSocket, player_id: int | None = None):
+    def __init__(
+        self,
+        room_id: int | None,
+        socket: WebSocket,
+        player_id: int | None = None,
+        protocol_version: int = DEFAULT_PROTOCOL,
+        batch_frames: bool = False,
+    ):
         self.roomId = room_id
         self.socket = socket
         self.playerId = player_id
+        self.protocol_version = protocol_version
+        # Client accepts several messages per WebSocket message (see protocol.coalesce)
+        self.batch_frames = batch_frames
+        # Outbound frames, drained by a per-connection writer task (see RoomManager)
+        self.outbox: asyncio.Queue | None = None
+        self.writer_task: asyncio.Task | None = None
+        self.evicted = False
 
 
 class RpsChoiceEnum(str, enum.Enum):
@@ -0,0 +1,124 @@
+"""
+Server-side game results.
+
+When a game ends (by rule, on time or by surrender) the worker that saw it
+end settles the room: in one transaction it claims the room (settled_at,
+so a game is only ever rated once, whatever the number of workers) and
+updates the stats and rating history of every registered player of the
+room with a single statement (see src.stats.results), rating each player
+against the opponent's actual rating.
+
+Players are registered when their WebSocket connects with an access token
+(`token` query parameter). Games between anonymous players are settled
+without touching any stats.
+"""
+import logging
+from typing import Optional
+
+from sqlalchemy import select, update, func
+
+from src.database import async_session_maker
+from src.auth.models import User
+from src.game.models import GameRoom, GamePlayer, GameRoomStatus
+from src.game.game_state import opposite_side
+from src.stats.results import apply_game_results, ensure_user_stats
+from src.stats.leaderboard import leaderboard
+
+logger = logging.getLogger(__name__)
+
+
+def player_result(side: str, winner_side: Optional[str]) -> str:
+    if winner_side is None:
+        return "draw"
+    return "win" if side == winner_side else "loss"
+
+
+class Settlement:
+    def __init__(self):
+        self.settled_games = 0
+        self.rated_players = 0
+        self.failures = 0
+
+    async def settle(self, room_id: int, winner_side: Optional[str]) -> bool:
+        """Rate a finished game (winner_side None for a draw); False if it was already settled, never started or failed"""
+        try:
+            async with async_session_maker() as session:
+                claimed = await session.execute(
+                    update(GameRoom)
+                    .where(
+                        GameRoom.id == room_id,
+                        GameRoom.settled_at.is_(None),
+                        GameRoom.status != GameRoomStatus.WAITING,  # e.g. surrendered before anyone joined
+                    )
+                    .values(settled_at=func.now(), status=GameRoomStatus.FINISHED)
+                    .returning(GameRoom.id)
+                    .execution_options(synchronize_session=False)
+                )
+                if claimed.scalar_one_or_none() is None:
+                    return False
+
+                players = (await session.execute(
+                    select(GamePlayer.user_id, GamePlayer.player_side, User.profile_name)
+                    .join(User, User.id == GamePlayer.user_id)
+                    .where(GamePlayer.room_id == room_id)
+                )).all()
+                user_by_side = {side: user_id for user_id, side, _ in players}
+
+                results = []
+                for user_id, side, _ in players:
+                    opponent_user_id = user_by_side.get(opposite_side(side))
+                    if opponent_user_id == user_id:
+                        continue  # Played against themselves
+                    results.append({
+                        "user_id": user_id,
+                        "result": player_result(side, winner_side),
+                        "opponent_user_id": opponent_user_id,
+                    })
+
+                rows = []
+                if results:
+                    await ensure_user_stats(session, [entry["user_id"] for entry in results])
+                    rows = await apply_game_results(session, results)
+                await session.commit()
+        except Exception as e:
+            self.failures += 1
+            logger.error(f"Failed to settle room {room_id}: {e}", exc_info=True)
+            return False
+
+        usernames = {user_id: profile_name for user_id, _, profile_name in players}
+        for row in rows:
+            leaderboard.update(row, usernames[row.user_id])
+
+        self.settled_games += 1
+        self.rated_players += len(rows)
+        if rows:
+            logger.info(f"Settled room {room_id}: " + ", ".join(
+                f"user {row.user_id} {row.result} ({row.rating_change:+d} -> {row.rating})" for row in rows
+            ))
+        return True
+
+    async def settle_surrender(self, room_id: int, player_id: int, side: Optional[str] = None) -> bool:
+        """Rate a game lost by surrender; the player's side is read from the database if not given"""
+        if side is None:
+            try:
+                async with async_session_maker() as session:
+                    side = (await session.execute(
+                        select(GamePlayer.player_side).where(GamePlayer.id == player_id, GamePlayer.room_id == room_id)
+                    )).scalar_one_or_none()
+            except Exception as e:
+                self.failures += 1
+                logger.error(f"Failed to settle surrender in room {room_id}: {e}", exc_info=True)
+                return False
+            if side is None:
+                return False
+        return await self.settle(room_id, opposite_side(side))
+
+    def stats(self) -> dict:
+        return {
+            "settled_games": self.settled_games,
+            "rated_players": self.rated_players,
+            "failures": self.failures,
+        }
+
+
+settlement = Settlement()
@@ -0,0 +1,171 @@
+"""
+Hierarchical timer wheel for game clocks.
+
+Every running game has one deadline: the moment the side to move runs out
+of time. Deadlines live in WHEEL_LEVELS wheels of WHEEL_SLOTS slots; a slot
+of level 0 spans one tick (CLOCK_TICK_MS) and each level above spans
+WHEEL_SLOTS times the one below. Scheduling and cancelling are O(1)
+whatever the number of clocks, and a tick only touches the timers that are
+due (plus, every WHEEL_SLOTS ticks, one slot of the level above moving
+down). The wheel sleeps while it holds no timers.
+
+Times are monotonic milliseconds (see monotonic_ms), so wall clock jumps
+never make a flag fall early or late.
+"""
+import asyncio
+import logging
+import math
+import time
+from typing import Callable, List, Optional, Set
+
+from src.config import CLOCK_TICK_MS
+
+logger = logging.getLogger(__name__)
+
+WHEEL_SLOTS = 64
+WHEEL_LEVELS = 4
+SLOT_BITS = 6  # log2(WHEEL_SLOTS)
+
+
+def monotonic_ms() -> float:
+    return time.monotonic() * 1000
+
+
+class TimerHandle:
+    def __init__(self, wheel: "TimerWheel", deadline_ms: float, expires_tick: int, callback: Callable[[], None]):
+        self.wheel = wheel
+        self.deadline_ms = deadline_ms
+        self.expires_tick = expires_tick
+        self.callback = callback
+        # Slot the timer currently sits in, None once fired or cancelled
+        self.slot: Optional[Set["TimerHandle"]] = None
+
+    def cancel(self) -> bool:
+        if self.slot is None:
+            return False
+        self.slot.discard(self)
+        self.slot = None
+        self.wheel.pending -= 1
+        return True
+
+    @property
+    def active(self) -> bool:
+        return self.slot is not None
+
+
+class TimerWheel:
+    def __init__(self, tick_ms: int = CLOCK_TICK_MS):
+        self.tick_ms = tick_ms
+        self.wheels: List[List[Set[TimerHandle]]] = [
+            [set() for _ in range(WHEEL_SLOTS)] for _ in range(WHEEL_LEVELS)
+        ]
+        self._origin_ms = monotonic_ms()
+        # Last tick that has been processed
+        self.current_tick = 0
+        self.pending = 0
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self.fired = 0
+
+    def __len__(self) -> int:
+        return self.pending
+
+    def start(self):
+        """Start ticking (call from the application startup hook)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def schedule(self, deadline_ms: float, callback: Callable[[], None]) -> TimerHandle:
+        """Call `callback` once monotonic_ms() passes deadline_ms (at most one tick late)"""
+        if not self.pending:
+            # The wheel may have been idle: catch up without walking the empty ticks
+            self.current_tick = max(self.current_tick, self._tick_at(monotonic_ms()))
+        expires_tick = math.ceil((deadline_ms - self._origin_ms) / self.tick_ms)
+        handle = TimerHandle(self, deadline_ms, expires_tick, callback)
+        self._place(handle)
+        self.pending += 1
+        self._wakeup.set()
+        return handle
+
+    def _place(self, handle: TimerHandle, cascading: bool = False):
+        # Never in the past: a due timer fires on the next tick, or on this one while its
+        # level 0 slot is still to be processed (timers moving down from a higher level)
+        expires = max(handle.expires_tick, self.current_tick if cascading else self.current_tick + 1)
+        distance = expires - self.current_tick
+        level = 0
+        while level < WHEEL_LEVELS - 1 and distance >= 1 << (SLOT_BITS * (level + 1)):
+            level += 1
+        # Beyond the top level the timer waits in the farthest slot and is placed again from there
+        distance = min(distance, (1 << (SLOT_BITS * WHEEL_LEVELS)) - 1)
+        slot = self.wheels[level][((self.current_tick + distance) >> (SLOT_BITS * level)) & (WHEEL_SLOTS - 1)]
+        slot.add(handle)
+        handle.slot = slot
+
+    def advance(self, now_ms: Optional[float] = None) -> int:
+        """Process every tick up to now, firing due timers; returns how many fired"""
+        now_ms = monotonic_ms() if now_ms is None else now_ms
+        target = self._tick_at(now_ms)
+        fired = 0
+        while self.current_tick < target:
+            self.current_tick += 1
+            tick = self.current_tick
+            # Move the timers of the next slot of each higher level down, top level first
+            for level in range(1, WHEEL_LEVELS):
+                if tick & ((1 << (SLOT_BITS * level)) - 1):
+                    break
+            else:
+                level = WHEEL_LEVELS
+            for cascade_level in range(level - 1, 0, -1):
+                slot_index = (tick >> (SLOT_BITS * cascade_level)) & (WHEEL_SLOTS - 1)
+                slot = self.wheels[cascade_level][slot_index]
+                if slot:
+                    self.wheels[cascade_level][slot_index] = set()
+                    for handle in slot:
+                        self._place(handle, cascading=True)
+
+            slot_index = tick & (WHEEL_SLOTS - 1)
+            due = self.wheels[0][slot_index]
+            if not due:
+                continue
+            self.wheels[0][slot_index] = set()
+            for handle in due:
+                handle.slot = None
+                if handle.expires_tick > tick:
+                    # Parked in the top level's farthest slot, not due yet
+                    self._place(handle)
+                    continue
+                fired += 1
+                self.pending -= 1
+                try:
+                    handle.callback()
+                except Exception as e:
+                    logger.error(f"Timer callback failed: {e}", exc_info=True)
+        self.fired += fired
+        return fired
+
+    def _tick_at(self, now_ms: float) -> int:
+        return int((now_ms - self._origin_ms) // self.tick_ms)
+
+    async def _run(self):
+        while True:
+            if not self.pending:
+                # Nothing scheduled: sleep until schedule() is called
+                self._wakeup.clear()
+                await self._wakeup.wait()
+            await asyncio.sleep(self.tick_ms / 1000)
+            self.advance()
+
+    def stats(self) -> dict:
+        return {"timers": self.pending, "fired": self.fired, "tick_ms": self.tick_ms}
+
+
+timer_wheel = TimerWheel()
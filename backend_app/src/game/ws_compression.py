@@ -0,0 +1,47 @@
+"""
+permessage-deflate with a size threshold.
+
+uvicorn compresses every WebSocket message once permessage-deflate is
+negotiated, including the small move and clock frames that make up most
+of the traffic and gain nothing from it. RFC 7692 lets the sender choose
+per message (the RSV1 bit), so this extension only compresses messages
+of at least WS_COMPRESS_MIN_BYTES (room info, opponent profiles, game
+history on reconnect, coalesced batches) and sends the others as is.
+
+uvicorn's command line only accepts its built-in protocols, so the
+protocol class is passed by `python main.py` (see the Dockerfile).
+"""
+from websockets.extensions.permessage_deflate import PerMessageDeflate, ServerPerMessageDeflateFactory
+from websockets.frames import Frame, Opcode
+from uvicorn.protocols.websockets.websockets_impl import WebSocketProtocol as UvicornWebSocketProtocol
+
+from src.config import WS_COMPRESS_MIN_BYTES
+
+
+class ThresholdPerMessageDeflate(PerMessageDeflate):
+    def encode(self, frame: Frame) -> Frame:
+        # Only whole messages may skip compression: continuation frames follow their first frame
+        if frame.opcode in (Opcode.TEXT, Opcode.BINARY) and frame.fin and len(frame.data) < WS_COMPRESS_MIN_BYTES:
+            return frame
+        return super().encode(frame)
+
+
+class ThresholdPerMessageDeflateFactory(ServerPerMessageDeflateFactory):
+    def process_request_params(self, params, accepted_extensions):
+        response_params, extension = super().process_request_params(params, accepted_extensions)
+        return response_params, ThresholdPerMessageDeflate(
+            extension.remote_no_context_takeover,
+            extension.local_no_context_takeover,
+            extension.remote_max_window_bits,
+            extension.local_max_window_bits,
+            self.compress_settings,
+        )
+
+
+class WebSocketProtocol(UvicornWebSocketProtocol):
+    """uvicorn's websockets protocol, offering the threshold extension instead of plain permessage-deflate"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.config.ws_per_message_deflate:
+            self.available_extensions = [ThresholdPerMessageDeflateFactory()]
@@ -0,0 +1,293 @@
+"""
+In-memory leaderboard.
+
+Every ranked player (a user_stats row) is kept in a Fenwick tree of player
+counts per rating, ordered from the highest rating down, plus the list of
+players of each rating. Players with the same rating are tied and kept in
+no particular order (as in the database query), so a player's offset
+within its rating is tracked directly and adding or removing a player is
+O(1) there. The position of a player, the player at a given position and
+each page of the leaderboard are O(log n) without touching the database.
+
+The leaderboard is loaded at startup and updated by record_game_result and
+profile name changes. Updates made on other workers are picked up by a
+full reload every LEADERBOARD_REFRESH_SECONDS.
+"""
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.config import LEADERBOARD_REFRESH_SECONDS
+from src.database import async_session_maker
+from src.auth.models import User
+from src.stats.models import UserStats
+from src.stats.level_system import calculate_level_from_xp, get_level_name
+
+logger = logging.getLogger(__name__)
+
+# Initial range of ratings in the Fenwick tree, widened by RATING_RANGE_STEP past any rating outside it
+RATING_FLOOR = 0
+RATING_CEILING = 4000
+RATING_RANGE_STEP = 1000
+
+LOAD_BATCH_SIZE = 10000
+
+
+class FenwickTree:
+    """Prefix sums over a fixed number of slots with O(log n) updates and queries"""
+
+    def __init__(self, size: int):
+        self.size = size
+        self.tree = [0] * (size + 1)
+        self._top_step = 1 << (size.bit_length() - 1) if size else 0
+
+    def add(self, index: int, delta: int):
+        i = index + 1
+        while i <= self.size:
+            self.tree[i] += delta
+            i += i & -i
+
+    def prefix_sum(self, index: int) -> int:
+        """Sum of the slots before index"""
+        total = 0
+        i = index
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+    def find(self, position: int) -> Tuple[int, int]:
+        """Slot holding the position-th item (0-based) and the item's offset within the slot"""
+        index = 0
+        step = self._top_step
+        while step:
+            next_index = index + step
+            if next_index <= self.size and self.tree[next_index] <= position:
+                index = next_index
+                position -= self.tree[next_index]
+            step >>= 1
+        return index, position
+
+
+def leaderboard_row(user_id: int, username: str, rating: int, level: int, experience: int,
+                    total_games: int, wins: int, losses: int, win_rate: float) -> dict:
+    """Fields of a LeaderboardEntry except the rank"""
+    return {
+        "user_id": user_id,
+        "username": username,
+        "rating": rating,
+        "level": level,
+        "level_name": get_level_name(calculate_level_from_xp(experience)[0]),
+        "total_games": total_games,
+        "wins": wins,
+        "losses": losses,
+        "win_rate": win_rate,
+    }
+
+
+class RankIndex:
+    def __init__(self):
+        self.rows: Dict[int, dict] = {}
+        # rating -> user ids of its players
+        self.slots: Dict[int, List[int]] = {}
+        # user id -> index in the list of its rating
+        self.offsets: Dict[int, int] = {}
+        self.floor = RATING_FLOOR
+        self.ceiling = RATING_CEILING
+        # Slot 0 holds the highest rating
+        self.counts = FenwickTree(self.ceiling - self.floor + 1)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def put(self, row: dict):
+        user_id, rating = row["user_id"], row["rating"]
+        current = self.rows.get(user_id)
+        if current is not None and current["rating"] == rating:
+            # Same rating: keep the player's place among the tied players
+            self.rows[user_id] = row
+            return
+        self.remove(user_id)
+        if not self.floor <= rating <= self.ceiling:
+            self._widen(rating)
+        players = self.slots.setdefault(rating, [])
+        self.offsets[user_id] = len(players)
+        players.append(user_id)
+        self.counts.add(self.ceiling - rating, 1)
+        self.rows[user_id] = row
+
+    def remove(self, user_id: int):
+        row = self.rows.pop(user_id, None)
+        if row is None:
+            return
+        rating = row["rating"]
+        players = self.slots[rating]
+        # Fill the gap with the last tied player
+        offset = self.offsets.pop(user_id)
+        last = players.pop()
+        if last != user_id:
+            players[offset] = last
+            self.offsets[last] = offset
+        if not players:
+            del self.slots[rating]
+        self.counts.add(self.ceiling - rating, -1)
+
+    def _widen(self, rating: int):
+        """Rebuild the tree over a range that includes rating (rare: ratings far outside the usual range)"""
+        if rating < self.floor:
+            self.floor = rating - RATING_RANGE_STEP
+        else:
+            self.ceiling = rating + RATING_RANGE_STEP
+        self.counts = FenwickTree(self.ceiling - self.floor + 1)
+        for slot_rating, players in self.slots.items():
+            self.counts.add(self.ceiling - slot_rating, len(players))
+
+    def position(self, user_id: int) -> Optional[int]:
+        """0-based position of a player, None if unranked"""
+        row = self.rows.get(user_id)
+        if row is None:
+            return None
+        return self.counts.prefix_sum(self.ceiling - row["rating"]) + self.offsets[user_id]
+
+    def page(self, offset: int, limit: int) -> List[Tuple[int, dict]]:
+        """(rank, row) for `limit` players starting at 0-based position `offset`"""
+        entries: List[Tuple[int, dict]] = []
+        position = max(offset, 0)
+        while len(entries) < limit and position < len(self.rows):
+            # One tree search per rating the page spans
+            slot, within = self.counts.find(position)
+            for user_id in self.slots[self.ceiling - slot][within:within + limit - len(entries)]:
+                position += 1
+                entries.append((position, self.rows[user_id]))
+        return entries
+
+
+class Leaderboard:
+    def __init__(self, refresh_seconds: float = LEADERBOARD_REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self.index = RankIndex()
+        self.loaded = False
+        # Updates made while a reload is reading the table, replayed on top of it
+        self._replay: Optional[List[dict]] = None
+        self._task: Optional[asyncio.Task] = None
+        self.last_load_seconds = 0.0
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def start(self):
+        """Start the periodic reload (call from the application startup hook after load)"""
+        if self.refresh_seconds > 0 and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def load(self, session: AsyncSession):
+        """Rebuild the leaderboard from user_stats"""
+        started = time.perf_counter()
+        index = RankIndex()
+        self._replay = []
+        try:
+            result = await session.stream(
+                select(
+                    UserStats.user_id,
+                    User.profile_name,
+                    UserStats.rating,
+                    UserStats.level,
+                    UserStats.experience,
+                    UserStats.total_games,
+                    UserStats.wins,
+                    UserStats.losses,
+                    UserStats.win_rate,
+                )
+                .join(User, UserStats.user_id == User.id)
+                .execution_options(yield_per=LOAD_BATCH_SIZE)
+            )
+            async for rows in result.partitions():
+                for row in rows:
+                    index.put(leaderboard_row(*row))
+            for row in self._replay:
+                index.put(row)
+        finally:
+            self._replay = None
+        self.index = index
+        self.loaded = True
+        self.last_load_seconds = time.perf_counter() - started
+        logger.info(f"Loaded leaderboard with {len(index)} player(s) in {self.last_load_seconds:.2f}s")
+
+    def update(self, user_stats: UserStats, username: str):
+        """Insert or move a player after their stats changed"""
+        self._put(leaderboard_row(
+            user_stats.user_id,
+            username,
+            user_stats.rating,
+            user_stats.level,
+            user_stats.experience,
+            user_stats.total_games,
+            user_stats.wins,
+            user_stats.losses,
+            user_stats.win_rate,
+        ))
+
+    def rename(self, user_id: int, username: str):
+        row = self.index.rows.get(user_id)
+        if row is not None:
+            self._put({**row, "username": username})
+
+    def _put(self, row: dict):
+        self.index.put(row)
+        if self._replay is not None:
+            self._replay.append(row)
+
+    def rank(self, user_id: int) -> Optional[int]:
+        """1-based rank of a player, None if unranked"""
+        position = self.index.position(user_id)
+        return position + 1 if position is not None else None
+
+    def page(self, offset: int = 0, limit: int = 10) -> List[Tuple[int, dict]]:
+        return self.index.page(offset, limit)
+
+    def around(self, user_id: int, window: int) -> Optional[Tuple[int, List[Tuple[int, dict]]]]:
+        """A player's rank and the players up to `window` places above and below, None if unranked"""
+        position = self.index.position(user_id)
+        if position is None:
+            return None
+        start = max(position - window, 0)
+        return position + 1, self.index.page(start, position - start + window + 1)
+
+    def percentile(self, rank: int) -> float:
+        """Share of the ranked players below the given rank, in percent"""
+        total = len(self.index)
+        return round((total - rank) / total * 100.0, 2) if total else 0.0
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.refresh_seconds)
+            try:
+                async with async_session_maker() as session:
+                    await self.load(session)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Leaderboard reload failed: {e}", exc_info=True)
+
+    def stats(self) -> dict:
+        return {
+            "players": len(self.index),
+            "loaded": self.loaded,
+            "last_load_seconds": round(self.last_load_seconds, 3),
+        }
+
+
+leaderboard = Leaderboard()
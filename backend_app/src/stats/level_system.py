@@ -2,7 +2,9 @@
 Level System for Chess RPS
 Implements an XP-based leveling system with chess-inspired titles.
 """
-from typing import Tuple, Dict
+import bisect
+from itertools import repeat
+from typing import Tuple, Dict, Iterable, List
 
 # Level system constants
 BASE_XP = 100  # Base XP for level 1
@@ -64,6 +66,17 @@ def calculate_xp_for_level(level: int) -> int:
     return int(BASE_XP * (XP_MULTIPLIER ** (level - 1)))
 
 
+# XP_THRESHOLDS[level] is calculate_xp_for_level(level), up to the first level past 2^63 XP
+XP_THRESHOLDS: List[int] = [0]
+while XP_THRESHOLDS[-1] < 2 ** 63:
+    XP_THRESHOLDS.append(calculate_xp_for_level(len(XP_THRESHOLDS)))
+
+# Bisecting XP in NEXT_LEVEL_THRESHOLDS gives the level directly
+NEXT_LEVEL_THRESHOLDS: List[int] = XP_THRESHOLDS[1:]
+# XP needed from XP_THRESHOLDS[level] to the next level, for every level inside the table
+LEVEL_XP_SPANS: List[int] = [XP_THRESHOLDS[level + 1] - XP_THRESHOLDS[level] for level in range(len(NEXT_LEVEL_THRESHOLDS))]
+
+
 def calculate_level_from_xp(total_xp: int) -> Tuple[int, int, int]:
     """
     Calculate current level, XP in current level, and XP needed for next level.
@@ -72,7 +85,13 @@ def calculate_level_from_xp(total_xp: int) -> Tuple[int, int, int]:
     if total_xp < 0:
         total_xp = 0
     
-    level = 0
+    # Highest level whose threshold has been reached
+    level = bisect.bisect_right(XP_THRESHOLDS, total_xp) - 1
+    if level < len(XP_THRESHOLDS) - 1:
+        level_xp = XP_THRESHOLDS[level]
+        return level, total_xp - level_xp, XP_THRESHOLDS[level + 1] - level_xp
+    
+    # Past the table: walk the remaining levels
     while total_xp >= calculate_xp_for_level(level + 1):
         level += 1
     
@@ -82,6 +101,21 @@ def calculate_level_from_xp(total_xp: int) -> Tuple[int, int, int]:
     return level, current_level_xp, next_level_xp
 
 
+def calculate_levels_from_xp(xp_values: Iterable[int]) -> List[Tuple[int, int, int]]:
+    """
+    calculate_level_from_xp for many XP values at once (e.g. a leaderboard page).
+    Returns one (level, current_level_xp, xp_needed_for_next_level) per value, in order.
+    """
+    xp_values = [total_xp if total_xp > 0 else 0 for total_xp in xp_values]
+    # One bisect per value, run by map instead of a Python loop body
+    levels = list(map(bisect.bisect_right, repeat(NEXT_LEVEL_THRESHOLDS), xp_values))
+    if max(levels, default=0) >= len(LEVEL_XP_SPANS):
+        # Some value is past the table (over 2^63 XP)
+        return [calculate_level_from_xp(total_xp) for total_xp in xp_values]
+    thresholds, spans = XP_THRESHOLDS, LEVEL_XP_SPANS
+    return [(level, total_xp - thresholds[level], spans[level]) for level, total_xp in zip(levels, xp_values)]
+
+
 def calculate_xp_reward(
     result: str,
     player_rating: int,
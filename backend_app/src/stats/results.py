@@ -0,0 +1,209 @@
+"""
+Atomic game result recording.
+
+Results are applied with one statement: it locks the players' user_stats
+rows, computes the new ratings (ELO), streaks, win rates, XP and levels
+from the rows as they are at that moment, updates them and inserts the
+performance_history entries, returning the updated rows. Concurrent
+results for the same player queue on the row lock instead of overwriting
+each other, and recording the results of a whole game costs a single
+round trip.
+
+A result is rated against the opponent's current rating when the
+opponent is a registered player (opponent_user_id), else against the
+player's own rating.
+
+The arithmetic mirrors calculate_elo_rating, calculate_xp_reward and
+calculate_level_from_xp (double precision and truncation like Python's
+float and int()).
+"""
+from typing import List, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.stats.models import UserStats
+from src.stats.level_system import (
+    XP_THRESHOLDS,
+    MIN_XP_PER_GAME,
+    WIN_XP_BASE,
+    LOSS_XP_BASE,
+    DRAW_XP_BASE,
+    OPPONENT_BONUS_MULTIPLIER,
+)
+
+K_FACTOR = 32  # Standard K-factor for ELO rating system
+INITIAL_RATING = 1200
+
+# The last threshold does not fit a bigint (experience is an integer column anyway)
+SQL_XP_THRESHOLDS = [threshold for threshold in XP_THRESHOLDS if threshold < 2 ** 63]
+
+APPLY_GAME_RESULTS = text("""
+    WITH input AS (
+        SELECT * FROM unnest(
+            CAST(:user_ids AS integer[]),
+            CAST(:results AS varchar[]),
+            CAST(:scores AS double precision[]),
+            CAST(:xp_bases AS integer[]),
+            CAST(:opponent_user_ids AS integer[])
+        ) AS input(user_id, result, score, xp_base, opponent_user_id)
+    ),
+    current AS (
+        -- Opponents are read as of the start of the statement, before their own update
+        SELECT
+            user_stats.id, user_stats.rating, user_stats.level, user_stats.experience, user_stats.current_streak,
+            input.result, input.score, input.xp_base,
+            COALESCE(opponent.rating, user_stats.rating) AS opponent_rating
+        FROM input
+        JOIN user_stats ON user_stats.user_id = input.user_id
+        LEFT JOIN user_stats AS opponent ON opponent.user_id = input.opponent_user_id
+        ORDER BY user_stats.id
+        FOR UPDATE OF user_stats
+    ),
+    rated AS (
+        SELECT
+            current.*,
+            CAST(trunc(CAST(:k_factor AS double precision) * (
+                score
+                - 1 / (1 + power(CAST(10 AS double precision), CAST(opponent_rating - rating AS double precision) / 400))
+            )) AS integer) AS rating_change,
+            CASE
+                WHEN result = 'win' THEN CASE WHEN current_streak >= 0 THEN current_streak + 1 ELSE 1 END
+                WHEN result = 'loss' THEN CASE WHEN current_streak <= 0 THEN current_streak - 1 ELSE -1 END
+                ELSE 0
+            END AS new_streak
+        FROM current
+    ),
+    rewarded AS (
+        SELECT
+            rated.*,
+            GREATEST(CAST(:min_xp AS integer), xp_base + LEAST(30, GREATEST(-10, CAST(trunc(
+                CAST(opponent_rating - (rating + rating_change) AS double precision)
+                * CAST(:bonus_multiplier AS double precision)
+            ) AS integer)))) AS xp_gained
+        FROM rated
+    ),
+    updated AS (
+        UPDATE user_stats
+        SET
+            rating = rewarded.rating + rewarded.rating_change,
+            rating_change = rewarded.rating_change,
+            total_games = user_stats.total_games + 1,
+            wins = user_stats.wins + CASE WHEN rewarded.result = 'win' THEN 1 ELSE 0 END,
+            losses = user_stats.losses + CASE WHEN rewarded.result = 'loss' THEN 1 ELSE 0 END,
+            draws = user_stats.draws + CASE WHEN rewarded.result IN ('win', 'loss') THEN 0 ELSE 1 END,
+            win_rate = CAST(user_stats.wins + CASE WHEN rewarded.result = 'win' THEN 1 ELSE 0 END AS double precision)
+                / (user_stats.total_games + 1) * 100,
+            current_streak = rewarded.new_streak,
+            best_streak = GREATEST(user_stats.best_streak, rewarded.new_streak),
+            worst_streak = LEAST(user_stats.worst_streak, rewarded.new_streak),
+            experience = user_stats.experience + rewarded.xp_gained,
+            -- Number of thresholds reached, like bisect_right over XP_THRESHOLDS
+            level = width_bucket(
+                CAST(user_stats.experience + rewarded.xp_gained AS bigint),
+                CAST(:xp_thresholds AS bigint[])
+            ) - 1,
+            updated_at = now()
+        FROM rewarded
+        WHERE user_stats.id = rewarded.id
+        RETURNING user_stats.*, rewarded.level AS old_level, rewarded.xp_gained, rewarded.result
+    ),
+    history AS (
+        INSERT INTO performance_history (user_stats_id, rating, result)
+        SELECT id, rating, result FROM updated
+    )
+    SELECT * FROM updated
+""")
+
+
+def calculate_elo_rating(player_rating: int, opponent_rating: int, result: str) -> Tuple[int, int]:
+    """
+    Calculate new ELO rating based on game result.
+    Returns (new_rating, rating_change)
+    
+    result: "win" (1.0), "draw" (0.5), "loss" (0.0)
+    """
+    # Expected score
+    expected_score = 1 / (1 + 10 ** ((opponent_rating - player_rating) / 400))
+    
+    # Actual score
+    if result == "win":
+        actual_score = 1.0
+    elif result == "draw":
+        actual_score = 0.5
+    else:  # loss
+        actual_score = 0.0
+    
+    # Rating change
+    rating_change = int(K_FACTOR * (actual_score - expected_score))
+    
+    # New rating
+    new_rating = player_rating + rating_change
+    
+    return new_rating, rating_change
+
+
+def result_score(result: str) -> float:
+    if result == "win":
+        return 1.0
+    if result == "draw":
+        return 0.5
+    return 0.0
+
+
+def result_xp_base(result: str) -> int:
+    if result == "win":
+        return WIN_XP_BASE
+    if result == "draw":
+        return DRAW_XP_BASE
+    return LOSS_XP_BASE
+
+
+async def ensure_user_stats(session: AsyncSession, user_ids: List[int]):
+    """Create the default stats rows of users that have none yet"""
+    await session.execute(
+        insert(UserStats)
+        .values([
+            {
+                "user_id": user_id,
+                "rating": INITIAL_RATING,
+                "rating_change": 0,
+                "total_games": 0,
+                "wins": 0,
+                "losses": 0,
+                "draws": 0,
+                "win_rate": 0.0,
+                "current_streak": 0,
+                "best_streak": 0,
+                "worst_streak": 0,
+                "level": 0,
+                "experience": 0,
+            }
+            for user_id in user_ids
+        ])
+        .on_conflict_do_nothing(index_elements=[UserStats.user_id])
+    )
+
+
+async def apply_game_results(session: AsyncSession, results: List[dict]) -> List[Row]:
+    """
+    Record game results in one statement, one per user.
+    Each result is a dict with user_id, result ("win", "loss" or "draw") and
+    opponent_user_id (None for an anonymous opponent). Users without stats rows are skipped
+    (see ensure_user_stats). Returns the updated user_stats rows plus old_level,
+    xp_gained and result; the caller commits.
+    """
+    params = {
+        "user_ids": [entry["user_id"] for entry in results],
+        "results": [entry["result"] for entry in results],
+        "scores": [result_score(entry["result"]) for entry in results],
+        "xp_bases": [result_xp_base(entry["result"]) for entry in results],
+        "opponent_user_ids": [entry.get("opponent_user_id") for entry in results],
+        "k_factor": K_FACTOR,
+        "min_xp": MIN_XP_PER_GAME,
+        "bonus_multiplier": OPPONENT_BONUS_MULTIPLIER,
+        "xp_thresholds": SQL_XP_THRESHOLDS,
+    }
+    return list((await session.execute(APPLY_GAME_RESULTS, params)).all())
@@ -1,23 +1,26 @@
 from datetime import datetime, timedelta
-from typing import List, Optional, Tuple
+from typing import List
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, and_
+from sqlalchemy import select, and_
 
 from src.database import get_async_session
 from src.auth.models import User
 from src.auth.dependencies import get_current_active_user
 from src.stats.models import UserStats, PerformanceHistory
+from src.game.models import GameRoom, GamePlayer
 from src.stats.schemas import (
     GameResultRequest,
     UserStatsResponse,
     StatsUpdateResponse,
     PerformanceHistoryItem,
-    LeaderboardEntry
+    LeaderboardEntry,
+    LeaderboardRankResponse
 )
+from src.stats.leaderboard import leaderboard
+from src.stats.results import INITIAL_RATING, ensure_user_stats
 from src.stats.level_system import (
-    calculate_xp_reward,
-    calculate_level_from_xp,
+    calculate_levels_from_xp,
     get_level_name,
     get_level_progress
 )
@@ -27,37 +30,6 @@ router = APIRouter(
     tags=["Statistics"]
 )
 
-# ELO rating constants
-K_FACTOR = 32  # Standard K-factor for ELO rating system
-INITIAL_RATING = 1200
-
-
-def calculate_elo_rating(player_rating: int, opponent_rating: int, result: str) -> Tuple[int, int]:
-    """
-    Calculate new ELO rating based on game result.
-    Returns (new_rating, rating_change)
-    
-    result: "win" (1.0), "draw" (0.5), "loss" (0.0)
-    """
-    # Expected score
-    expected_score = 1 / (1 + 10 ** ((opponent_rating - player_rating) / 400))
-    
-    # Actual score
-    if result == "win":
-        actual_score = 1.0
-    elif result == "draw":
-        actual_score = 0.5
-    else:  # loss
-        actual_score = 0.0
-    
-    # Rating change
-    rating_change = int(K_FACTOR * (actual_score - expected_score))
-    
-    # New rating
-    new_rating = player_rating + rating_change
-    
-    return new_rating, rating_change
-
 
 @router.get("/me", response_model=UserStatsResponse)
 async def get_my_stats(
@@ -95,6 +67,7 @@ async def get_my_stats(
         session.add(user_stats)
         await session.commit()
         await session.refresh(user_stats)
+        leaderboard.update(user_stats, current_user.profile_name)
     
     # Load performance history if requested
     performance_history = None
@@ -154,146 +127,91 @@ async def record_game_result(
     session: AsyncSession = Depends(get_async_session)
 ):
     """
-    Record a game result and update user statistics.
-    This should be called when a game ends (checkmate, stalemate, timeout, etc.)
+    Get the stats after a game the server rated.
+    Results are computed by the server when the game ends (see src/game/settlement.py)
+    for players that joined it with their access token; the reported result and
+    opponent_rating are not recorded. A request that arrives before the game has
+    been settled returns the stats as they were before it.
     """
-    # Get or create user stats
-    query = select(UserStats).where(UserStats.user_id == current_user.id)
-    result = await session.execute(query)
-    user_stats = result.scalar_one_or_none()
-    
-    if not user_stats:
-        # Create default stats for new user
-        user_stats = UserStats(
-            user_id=current_user.id,
-            rating=INITIAL_RATING,
-            rating_change=0,
-            total_games=0,
-            wins=0,
-            losses=0,
-            draws=0,
-            win_rate=0.0,
-            current_streak=0,
-            best_streak=0,
-            worst_streak=0,
-            level=0,
-            experience=0
+    if not game_result.room_code:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="room_code is required: game results are computed by the server"
+        )
+    if not await is_rated_by_server(session, game_result.room_code, current_user.id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No rated game with this room code for the current user (join the game with your access token)"
         )
-        session.add(user_stats)
-        await session.flush()  # Flush to get the ID
-    
-    # Calculate new rating
-    opponent_rating = game_result.opponent_rating or user_stats.rating  # Use own rating if no opponent rating
-    new_rating, rating_change = calculate_elo_rating(
-        user_stats.rating,
-        opponent_rating,
-        game_result.result
-    )
-    
-    # Update statistics
-    user_stats.rating = new_rating
-    user_stats.rating_change = rating_change
-    user_stats.total_games += 1
-    
-    if game_result.result == "win":
-        user_stats.wins += 1
-        # Update streak
-        if user_stats.current_streak >= 0:
-            user_stats.current_streak += 1
-        else:
-            user_stats.current_streak = 1
-        if user_stats.current_streak > user_stats.best_streak:
-            user_stats.best_streak = user_stats.current_streak
-    elif game_result.result == "loss":
-        user_stats.losses += 1
-        # Update streak
-        if user_stats.current_streak <= 0:
-            user_stats.current_streak -= 1
-        else:
-            user_stats.current_streak = -1
-        if user_stats.current_streak < user_stats.worst_streak:
-            user_stats.worst_streak = user_stats.current_streak
-    else:  # draw
-        user_stats.draws += 1
-        # Reset streak on draw
-        user_stats.current_streak = 0
-    
-    # Calculate win rate
-    if user_stats.total_games > 0:
-        user_stats.win_rate = (user_stats.wins / user_stats.total_games) * 100.0
-    else:
-        user_stats.win_rate = 0.0
-    
-    # Calculate and award XP
-    old_level = user_stats.level
-    old_xp = user_stats.experience
-    xp_gained = calculate_xp_reward(
-        game_result.result,
-        user_stats.rating,
-        opponent_rating
-    )
-    user_stats.experience += xp_gained
-    
-    # Calculate new level from total XP
-    new_level, _, _ = calculate_level_from_xp(user_stats.experience)
-    user_stats.level = new_level
-    level_up = new_level > old_level
-    
-    # Create performance history entry
-    history_entry = PerformanceHistory(
-        user_stats_id=user_stats.id,
-        rating=new_rating,
-        result=game_result.result
-    )
-    session.add(history_entry)
     
+    await ensure_user_stats(session, [current_user.id])
     await session.commit()
-    await session.refresh(user_stats)
-    
-    # Get level progress for response
+    user_stats = (await session.execute(
+        select(UserStats).where(UserStats.user_id == current_user.id)
+    )).scalar_one()
+    leaderboard.update(user_stats, current_user.profile_name)
     level_progress = get_level_progress(user_stats.experience)
     
-    # Build response
     return StatsUpdateResponse(
         success=True,
-        message="Game result recorded successfully" + (" - Level Up!" if level_up else ""),
-        new_rating=new_rating,
-        rating_change=rating_change,
-        xp_gained=xp_gained,
-        level_up=level_up,
-        new_level=new_level if level_up else None,
-        new_stats=UserStatsResponse(
-            id=user_stats.id,
-            user_id=user_stats.user_id,
-            rating=user_stats.rating,
-            rating_change=user_stats.rating_change,
-            total_games=user_stats.total_games,
-            wins=user_stats.wins,
-            losses=user_stats.losses,
-            draws=user_stats.draws,
-            win_rate=user_stats.win_rate,
-            current_streak=user_stats.current_streak,
-            best_streak=user_stats.best_streak,
-            worst_streak=user_stats.worst_streak,
-            level=user_stats.level,
-            experience=user_stats.experience,
-            level_name=level_progress["level_name"],
-            level_progress=level_progress,
-            created_at=user_stats.created_at,
-            updated_at=user_stats.updated_at,
-        )
+        message="Game result is recorded by the server",
+        new_rating=user_stats.rating,
+        rating_change=user_stats.rating_change,
+        xp_gained=0,
+        level_up=False,
+        new_level=None,
+        new_stats=build_stats_response(user_stats, level_progress)
+    )
+
+
+async def is_rated_by_server(session: AsyncSession, room_code: str, user_id: int) -> bool:
+    """Whether the user joined the room with their access token, so settlement rates the game"""
+    result = await session.execute(
+        select(GamePlayer.id)
+        .join(GameRoom, GameRoom.id == GamePlayer.room_id)
+        .where(GameRoom.room_code == room_code, GamePlayer.user_id == user_id)
+        .limit(1)
+    )
+    return result.scalar_one_or_none() is not None
+
+
+def build_stats_response(user_stats, level_progress: dict) -> UserStatsResponse:
+    return UserStatsResponse(
+        id=user_stats.id,
+        user_id=user_stats.user_id,
+        rating=user_stats.rating,
+        rating_change=user_stats.rating_change,
+        total_games=user_stats.total_games,
+        wins=user_stats.wins,
+        losses=user_stats.losses,
+        draws=user_stats.draws,
+        win_rate=user_stats.win_rate,
+        current_streak=user_stats.current_streak,
+        best_streak=user_stats.best_streak,
+        worst_streak=user_stats.worst_streak,
+        level=user_stats.level,
+        experience=user_stats.experience,
+        level_name=level_progress["level_name"],
+        level_progress=level_progress,
+        created_at=user_stats.created_at,
+        updated_at=user_stats.updated_at,
     )
 
 
 @router.get("/leaderboard", response_model=List[LeaderboardEntry])
 async def get_leaderboard(
     limit: int = 10,
+    offset: int = 0,
     session: AsyncSession = Depends(get_async_session)
 ):
     """
     Get top users by rating (leaderboard).
-    Returns list of users sorted by rating in descending order.
+    Returns list of users sorted by rating in descending order, starting at `offset`.
     """
+    # Served from memory once the leaderboard has been loaded
+    if leaderboard.loaded:
+        return [LeaderboardEntry(rank=rank, **row) for rank, row in leaderboard.page(offset, limit)]
+    
     # Query top users by rating, joining with User to get profile_name
     query = (
         select(
@@ -302,18 +220,20 @@ async def get_leaderboard(
         )
         .join(User, UserStats.user_id == User.id)
         .order_by(UserStats.rating.desc())
+        .offset(offset)
         .limit(limit)
     )
     result = await session.execute(query)
     rows = result.all()
     
-    leaderboard = []
-    for rank, (user_stats, profile_name) in enumerate(rows, start=1):
+    levels = calculate_levels_from_xp(user_stats.experience for user_stats, _ in rows)
+    
+    entries = []
+    for rank, ((user_stats, profile_name), (xp_level, _, _)) in enumerate(zip(rows, levels), start=offset + 1):
         # Get level name
-        level_progress = get_level_progress(user_stats.experience)
-        level_name = level_progress.get("level_name", "Novice")
+        level_name = get_level_name(xp_level)
         
-        leaderboard.append(LeaderboardEntry(
+        entries.append(LeaderboardEntry(
             rank=rank,
             user_id=user_stats.user_id,
             username=profile_name,  # Using profile_name as username
@@ -326,5 +246,58 @@ async def get_leaderboard(
             win_rate=user_stats.win_rate
         ))
     
-    return leaderboard
+    return entries
+
+
+# Largest number of neighbours returned on each side of a player
+MAX_RANK_WINDOW = 50
+
+
+def build_rank_response(user_id: int, window: int) -> LeaderboardRankResponse:
+    if not leaderboard.loaded:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Leaderboard is loading, please retry"
+        )
+    
+    around = leaderboard.around(user_id, min(max(window, 0), MAX_RANK_WINDOW))
+    if around is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User has no rating yet"
+        )
+    
+    rank, rows = around
+    neighbours = [LeaderboardEntry(rank=position, **row) for position, row in rows]
+    return LeaderboardRankResponse(
+        rank=rank,
+        total_players=len(leaderboard),
+        percentile=leaderboard.percentile(rank),
+        entry=next(entry for entry in neighbours if entry.user_id == user_id),
+        neighbours=neighbours
+    )
 
+
+@router.get("/leaderboard/me", response_model=LeaderboardRankResponse)
+async def get_my_rank(
+    window: int = 5,
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Get the current user's global rank and percentile,
+    with up to `window` players above and below them.
+    """
+    return build_rank_response(current_user.id, window)
+
+
+@router.get("/leaderboard/users/{user_id}", response_model=LeaderboardRankResponse)
+async def get_user_rank(
+    user_id: int,
+    window: int = 5,
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Get a user's global rank and percentile,
+    with up to `window` players above and below them.
+    """
+    return build_rank_response(user_id, window)
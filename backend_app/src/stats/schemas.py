@@ -5,9 +5,10 @@ from pydantic import BaseModel
 
 class GameResultRequest(BaseModel):
     result: str  # "win", "loss", "draw"
-    opponent_rating: Optional[int] = None  # For future ELO calculation
+    opponent_rating: Optional[int] = None  # Ignored: the server rates against the opponent's actual rating
     game_mode: Optional[str] = None  # "classical" or "rps"
     end_type: Optional[str] = None  # "checkmate", "stalemate", "timeout", etc.
+    room_code: Optional[str] = None  # Game the result is for (required)
 
 
 class PerformanceHistoryItem(BaseModel):
@@ -71,3 +72,11 @@ class LeaderboardEntry(BaseModel):
     class Config:
         from_attributes = True
 
+
+class LeaderboardRankResponse(BaseModel):
+    rank: int
+    total_players: int
+    percentile: float  # Percent of ranked players below this one
+    entry: LeaderboardEntry
+    neighbours: List[LeaderboardEntry]  # Players around this one, including it, best first
+
@@ -0,0 +1,54 @@
+"""
+Shared test setup.
+
+Tests that need PostgreSQL use the `database` fixture. They run against the
+database configured by the DB_*_TEST variables (see src/config.py), whose
+tables they drop and recreate, and are skipped when DB_HOST_TEST is not set
+or the database cannot be reached. Everything else runs without a database.
+
+    cd backend_app && python -m pytest tests
+"""
+import asyncio
+import os
+
+import pytest
+
+# src.database builds its engine from DB_* at import time: point it at the test database
+for name in ("DB_HOST", "DB_PORT", "DB_NAME", "DB_USER", "DB_PASS"):
+    if os.environ.get(f"{name}_TEST"):
+        os.environ[name] = os.environ[f"{name}_TEST"]
+os.environ.setdefault("DB_HOST", "localhost")
+os.environ.setdefault("DB_PORT", "5432")
+os.environ.setdefault("DB_NAME", "chess_rps_test")
+os.environ.setdefault("DB_USER", "postgres")
+os.environ.setdefault("DB_PASS", "postgres")
+
+
+@pytest.fixture
+def database():
+    """Empty tables in the test database; returns run(coroutine), which runs it on a fresh event loop"""
+    if not os.environ.get("DB_HOST_TEST"):
+        pytest.skip("DB_HOST_TEST is not set")
+
+    import main  # noqa: F401 (registers every model)
+    from src.database import Base, engine
+
+    def run(coroutine):
+        async def run_and_dispose():
+            try:
+                return await coroutine
+            finally:
+                # Pooled connections belong to this event loop
+                await engine.dispose()
+        return asyncio.run(run_and_dispose())
+
+    async def recreate_tables():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+            await conn.run_sync(Base.metadata.create_all)
+
+    try:
+        run(recreate_tables())
+    except OSError as e:
+        pytest.skip(f"Test database unavailable: {e}")
+    return run
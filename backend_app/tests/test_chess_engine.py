@@ -0,0 +1,43 @@
+import pytest
+
+from perft import PERFT_POSITIONS, QUICK_DEPTHS
+from src.game.chess_engine import Board, WHITE, BLACK, IllegalMove, parse_square
+
+
+@pytest.mark.parametrize("name, fen, expected", PERFT_POSITIONS, ids=[name for name, _, _ in PERFT_POSITIONS])
+def test_perft_matches_reference_counts(name, fen, expected):
+    board = Board(fen)
+    for depth in range(1, QUICK_DEPTHS[name] + 1):
+        assert board.perft(depth) == expected[depth - 1], f"depth {depth}"
+    # make/unmake leave the position untouched
+    assert board.fen() == Board(fen).fen()
+
+
+def test_play_rejects_illegal_moves():
+    board = Board()
+    with pytest.raises(IllegalMove):
+        board.play("e2e5")
+    with pytest.raises(IllegalMove):
+        board.play("e7e5")
+
+
+def test_checkmate():
+    board = Board()
+    for move in ("f2f3", "e7e5", "g2g4", "d8h4"):
+        board.play(move)
+    assert board.outcome() == ("checkmate", BLACK)
+
+
+def test_king_capture_after_set_turn_ends_the_game():
+    board = Board("4k3/8/8/8/8/8/4Q3/4K3 w - - 0 1")
+    board.play("e2e7")
+    # RPS: white wins the round and moves again, taking the king left in check
+    board.set_turn(WHITE)
+    board.play("e7e8")
+    assert board.king_squares[BLACK] == -1
+    assert not board.in_check(BLACK)
+    assert board.outcome() == ("king_captured", WHITE)
+
+    board.unmake()
+    assert board.king_squares[BLACK] == parse_square("e8")
+    assert board.fen().startswith("4k3/4Q3/8/8/8/8/8/4K3 w")
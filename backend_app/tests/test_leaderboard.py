@@ -0,0 +1,62 @@
+import random
+
+from src.stats.leaderboard import RankIndex
+
+
+def row(user_id: int, rating: int) -> dict:
+    return {"user_id": user_id, "username": f"player{user_id}", "rating": rating}
+
+
+def assert_consistent(index: RankIndex, ratings: dict):
+    expected = sorted(ratings.values(), reverse=True)
+    page = index.page(0, len(ratings) + 5)
+    assert [entry["rating"] for _, entry in page] == expected
+    assert [rank for rank, _ in page] == list(range(1, len(ratings) + 1))
+    for rank, entry in page:
+        assert index.position(entry["user_id"]) == rank - 1
+    assert len(index) == len(ratings)
+
+
+def test_random_updates_keep_ranks_consistent():
+    rng = random.Random(7)
+    index = RankIndex()
+    ratings = {}
+    for _ in range(3000):
+        user_id = rng.randrange(300)
+        if rng.random() < 0.1:
+            index.remove(user_id)
+            ratings.pop(user_id, None)
+        else:
+            # Mostly a crowd of ties around the starting rating
+            ratings[user_id] = rng.choice([1200, 1200, 1200, rng.randint(1150, 1250)])
+            index.put(row(user_id, ratings[user_id]))
+    assert_consistent(index, ratings)
+
+
+def test_ratings_outside_the_initial_range():
+    index = RankIndex()
+    ratings = {1: 1200, 2: -50, 3: 9000, 4: 4000, 5: 0}
+    for user_id, rating in ratings.items():
+        index.put(row(user_id, rating))
+    assert_consistent(index, ratings)
+    assert index.position(3) == 0 and index.position(2) == 4
+
+
+def test_same_rating_update_keeps_place():
+    index = RankIndex()
+    for user_id in range(1, 6):
+        index.put(row(user_id, 1200))
+    before = index.position(2)
+    index.put({**row(2, 1200), "username": "renamed"})
+    assert index.position(2) == before
+    assert index.rows[2]["username"] == "renamed"
+
+
+def test_page_spans_ratings():
+    index = RankIndex()
+    for user_id in range(10):
+        index.put(row(user_id, 1500 - (user_id // 3) * 10))
+    assert [rank for rank, _ in index.page(2, 5)] == [3, 4, 5, 6, 7]
+    assert [entry["rating"] for _, entry in index.page(2, 5)] == [1500, 1490, 1490, 1490, 1480]
+    assert index.page(9, 5)[0][0] == 10 and len(index.page(9, 5)) == 1
+    assert index.page(20, 5) == []
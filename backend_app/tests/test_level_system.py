@@ -0,0 +1,56 @@
+import random
+
+import pytest
+
+from src.stats.level_system import (
+    XP_THRESHOLDS,
+    calculate_level_from_xp,
+    calculate_levels_from_xp,
+    calculate_xp_for_level,
+)
+
+INT32_MAX = 2 ** 31 - 1
+
+
+def walk_level_from_xp(total_xp: int):
+    """The level loop calculate_level_from_xp used before the threshold table"""
+    if total_xp < 0:
+        total_xp = 0
+    level = 0
+    while total_xp >= calculate_xp_for_level(level + 1):
+        level += 1
+    return level, total_xp - calculate_xp_for_level(level), calculate_xp_for_level(level + 1) - calculate_xp_for_level(level)
+
+
+def int32_sample():
+    """Every value where the level can change (+-3 around each threshold), plus random values, up to int32 max"""
+    values = list(range(-5, 5000))
+    for threshold in XP_THRESHOLDS:
+        if threshold > INT32_MAX:
+            break
+        values.extend(range(threshold - 3, threshold + 4))
+    rng = random.Random(1234)
+    values.extend(rng.randint(0, INT32_MAX) for _ in range(100000))
+    values.append(INT32_MAX)
+    return values
+
+
+def test_thresholds_match_calculate_xp_for_level():
+    assert XP_THRESHOLDS[:5] == [0, 100, 250, 625, 1562]
+    assert all(XP_THRESHOLDS[level] == calculate_xp_for_level(level) for level in range(len(XP_THRESHOLDS)))
+
+
+def test_level_from_xp_matches_level_walk_over_int32():
+    values = int32_sample()
+    expected = [walk_level_from_xp(total_xp) for total_xp in values]
+    assert [calculate_level_from_xp(total_xp) for total_xp in values] == expected
+    assert calculate_levels_from_xp(values) == expected
+
+
+@pytest.mark.parametrize("total_xp", [XP_THRESHOLDS[-1] - 1, XP_THRESHOLDS[-1], XP_THRESHOLDS[-1] * 10])
+def test_levels_past_the_table(total_xp):
+    assert calculate_levels_from_xp([5, total_xp]) == [walk_level_from_xp(5), walk_level_from_xp(total_xp)]
+
+
+def test_levels_from_no_values():
+    assert calculate_levels_from_xp([]) == []
@@ -0,0 +1,106 @@
+import random
+
+from sqlalchemy import select
+
+from src.auth.models import User
+from src.database import async_session_maker
+from src.stats.level_system import XP_THRESHOLDS, calculate_level_from_xp, calculate_xp_reward
+from src.stats.models import UserStats, PerformanceHistory
+from src.stats.results import apply_game_results, calculate_elo_rating
+
+
+def expected_stats(stats: dict, result: str, opponent_rating: int) -> dict:
+    """The per-player update record_game_result made before apply_game_results"""
+    new_rating, rating_change = calculate_elo_rating(stats["rating"], opponent_rating, result)
+    streak = stats["current_streak"]
+    if result == "win":
+        streak = streak + 1 if streak >= 0 else 1
+    elif result == "loss":
+        streak = streak - 1 if streak <= 0 else -1
+    else:
+        streak = 0
+    wins = stats["wins"] + (result == "win")
+    total_games = stats["total_games"] + 1
+    experience = stats["experience"] + calculate_xp_reward(result, new_rating, opponent_rating)
+    return {
+        "rating": new_rating,
+        "rating_change": rating_change,
+        "total_games": total_games,
+        "wins": wins,
+        "losses": stats["losses"] + (result == "loss"),
+        "draws": stats["draws"] + (result == "draw"),
+        "win_rate": wins / total_games * 100.0,
+        "current_streak": streak,
+        "best_streak": max(stats["best_streak"], streak),
+        "worst_streak": min(stats["worst_streak"], streak),
+        "experience": experience,
+        "level": calculate_level_from_xp(experience)[0],
+    }
+
+
+def random_stats(rng: random.Random) -> dict:
+    wins, losses, draws = rng.randint(0, 50), rng.randint(0, 50), rng.randint(0, 10)
+    return {
+        "rating": rng.randint(400, 2800),
+        "rating_change": 0,
+        "total_games": wins + losses + draws,
+        "wins": wins,
+        "losses": losses,
+        "draws": draws,
+        "win_rate": 0.0,
+        "current_streak": rng.randint(-5, 5),
+        "best_streak": 5,
+        "worst_streak": -5,
+        # Often just below a level threshold
+        "experience": rng.choice(XP_THRESHOLDS[1:12]) - rng.randint(1, 40),
+        "level": 0,
+    }
+
+
+def test_apply_game_results_matches_python_calculation(database):
+    rng = random.Random(11)
+    players = [random_stats(rng) for _ in range(60)]
+
+    async def scenario():
+        async with async_session_maker() as session:
+            users = [User(phone_number=str(index), hashed_password="x") for index in range(len(players))]
+            session.add_all(users)
+            await session.flush()
+            session.add_all(UserStats(user_id=user.id, **stats) for user, stats in zip(users, players))
+            await session.commit()
+            user_ids = [user.id for user in users]
+
+        # Pairs of registered players, plus results against anonymous opponents
+        results, expected = [], {}
+        for index in range(0, 40, 2):
+            outcome = rng.choice(["win", "loss", "draw"])
+            other = {"win": "loss", "loss": "win", "draw": "draw"}[outcome]
+            for me, opponent, result in ((index, index + 1, outcome), (index + 1, index, other)):
+                results.append({"user_id": user_ids[me], "result": result, "opponent_user_id": user_ids[opponent]})
+                expected[user_ids[me]] = expected_stats(players[me], result, players[opponent]["rating"])
+        for index in range(40, len(players)):
+            result = rng.choice(["win", "loss", "draw"])
+            results.append({"user_id": user_ids[index], "result": result, "opponent_user_id": None})
+            expected[user_ids[index]] = expected_stats(players[index], result, players[index]["rating"])
+
+        async with async_session_maker() as session:
+            rows = await apply_game_results(session, results)
+            await session.commit()
+        async with async_session_maker() as session:
+            stored = {stats.user_id: stats for stats in (await session.execute(select(UserStats))).scalars()}
+            history = (await session.execute(select(PerformanceHistory))).scalars().all()
+        return rows, stored, history, expected
+
+    rows, stored, history, expected = database(scenario())
+
+    assert len(rows) == len(expected) == len(history)
+    for user_id, values in expected.items():
+        stats = stored[user_id]
+        for key, value in values.items():
+            if key == "win_rate":
+                assert abs(stats.win_rate - value) < 1e-9
+            else:
+                assert getattr(stats, key) == value, (user_id, key)
+    assert sorted((entry.rating, entry.result) for entry in history) == sorted(
+        (stored[row.user_id].rating, row.result) for row in rows
+    )
@@ -0,0 +1,67 @@
+import asyncio
+
+from sqlalchemy import func, select
+
+from src.auth.models import User
+from src.database import async_session_maker
+from src.game.models import GamePlayer, GameRoom, GameRoomStatus
+from src.game.settlement import Settlement
+from src.stats.models import PerformanceHistory, UserStats
+
+
+async def create_room(status: GameRoomStatus = GameRoomStatus.IN_PROGRESS):
+    async with async_session_maker() as session:
+        light, dark = User(phone_number="1", hashed_password="x"), User(phone_number="2", hashed_password="x")
+        room = GameRoom(room_code="ROOM", game_mode="classical", status=status, player_count=2)
+        session.add_all([light, dark, room])
+        await session.flush()
+        light_player = GamePlayer(room_id=room.id, user_id=light.id, player_side="light")
+        session.add_all([light_player, GamePlayer(room_id=room.id, user_id=dark.id, player_side="dark")])
+        await session.commit()
+        return room.id, light_player.id, light.id, dark.id
+
+
+async def stored_results():
+    async with async_session_maker() as session:
+        stats = {
+            row.user_id: (row.total_games, row.wins, row.losses, row.rating)
+            for row in (await session.execute(select(UserStats))).scalars()
+        }
+        history = (await session.execute(select(func.count()).select_from(PerformanceHistory))).scalar_one()
+        room = (await session.execute(select(GameRoom))).scalar_one()
+        return stats, history, room
+
+
+def test_room_is_settled_once(database):
+    async def scenario():
+        room_id, light_player_id, light_id, dark_id = await create_room()
+        # Two workers seeing the same game end (e.g. checkmate and the flag falling), then a late surrender
+        first, second = Settlement(), Settlement()
+        claims = await asyncio.gather(first.settle(room_id, "light"), second.settle(room_id, "dark"))
+        late = await first.settle_surrender(room_id, light_player_id)
+        return claims, late, light_id, dark_id, await stored_results()
+
+    claims, late, light_id, dark_id, (stats, history, room) = database(scenario())
+
+    assert sorted(claims) == [False, True]
+    assert late is False
+    assert history == 2
+    winner, loser = (light_id, dark_id) if claims[0] else (dark_id, light_id)
+    assert stats[winner][:3] == (1, 1, 0)
+    assert stats[loser][:3] == (1, 0, 1)
+    assert stats[winner][3] == 1216 and stats[loser][3] == 1184
+    assert room.status == GameRoomStatus.FINISHED
+    assert room.settled_at is not None
+
+
+def test_waiting_room_is_not_settled(database):
+    async def scenario():
+        room_id, _, _, _ = await create_room(GameRoomStatus.WAITING)
+        settled = await Settlement().settle(room_id, "light")
+        return settled, await stored_results()
+
+    settled, (stats, history, room) = database(scenario())
+
+    assert settled is False
+    assert stats == {} and history == 0
+    assert room.status == GameRoomStatus.WAITING and room.settled_at is None
@@ -0,0 +1,60 @@
+import math
+import random
+
+from src.game.timer_wheel import TimerWheel, WHEEL_SLOTS, SLOT_BITS
+
+TICK_MS = 10
+
+
+def test_timers_fire_in_deadline_order_and_within_a_tick():
+    wheel = TimerWheel(tick_ms=TICK_MS)
+    rng = random.Random(3)
+    origin = wheel._origin_ms
+    clock = [origin]
+    fired = []
+    deadlines = {}
+    # Up to three slots of level 2, so levels 0-2 and the cascades between them are used
+    horizon_ms = TICK_MS * (1 << (SLOT_BITS * 2)) * 3
+    for timer_id in range(2000):
+        deadline = origin + rng.uniform(1, horizon_ms)
+        deadlines[timer_id] = deadline
+        wheel.schedule(deadline, lambda timer_id=timer_id: fired.append((clock[0], timer_id)))
+    assert len(wheel) == 2000
+
+    while clock[0] < origin + horizon_ms + 2 * TICK_MS:
+        clock[0] += TICK_MS
+        wheel.advance(clock[0])
+
+    assert sorted(timer_id for _, timer_id in fired) == list(range(2000))
+    assert len(wheel) == 0
+    for now, timer_id in fired:
+        assert deadlines[timer_id] <= now < deadlines[timer_id] + TICK_MS
+    # Timers of different ticks fire in deadline order (a tick's own timers in any order)
+    deadline_ticks = [math.ceil((deadlines[timer_id] - origin) / TICK_MS) for _, timer_id in fired]
+    assert deadline_ticks == sorted(deadline_ticks)
+
+
+def test_cancelled_timers_do_not_fire():
+    wheel = TimerWheel(tick_ms=TICK_MS)
+    origin = wheel._origin_ms
+    fired = []
+    near = wheel.schedule(origin + 5 * TICK_MS, lambda: fired.append("near"))
+    far = wheel.schedule(origin + WHEEL_SLOTS * 5 * TICK_MS, lambda: fired.append("far"))
+    kept = wheel.schedule(origin + WHEEL_SLOTS * 5 * TICK_MS, lambda: fired.append("kept"))
+    assert near.cancel() and far.cancel()
+    assert not near.cancel()
+    assert not near.active and kept.active
+
+    wheel.advance(origin + WHEEL_SLOTS * 6 * TICK_MS)
+    assert fired == ["kept"]
+    assert len(wheel) == 0
+
+
+def test_past_deadline_fires_on_the_next_tick():
+    wheel = TimerWheel(tick_ms=TICK_MS)
+    origin = wheel._origin_ms
+    wheel.advance(origin + 100 * TICK_MS)
+    fired = []
+    wheel.schedule(origin, lambda: fired.append(True))
+    assert wheel.advance(origin + 101 * TICK_MS) == 1
+    assert fired == [True]
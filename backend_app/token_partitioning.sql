@@ -0,0 +1,59 @@
+-- Partition the tokens table by day of expires_at (optional)
+-- Expired days can then be dropped as whole partitions instead of deleting rows.
+-- Run during a maintenance window, then start the app with TOKEN_PARTITIONING=true:
+-- the token reaper creates upcoming daily partitions and drops expired ones.
+-- Partitioned tables need the partition key in every unique index, so the
+-- primary key becomes (id, expires_at) and token_hash is unique per partition.
+
+BEGIN;
+
+-- Partition bounds are whole UTC days, matching the reaper
+SET LOCAL timezone = 'UTC';
+
+ALTER TABLE tokens RENAME TO tokens_unpartitioned;
+ALTER TABLE tokens_unpartitioned RENAME CONSTRAINT tokens_pkey TO tokens_unpartitioned_pkey;
+ALTER INDEX IF EXISTS ix_tokens_token_hash RENAME TO ix_tokens_unpartitioned_token_hash;
+ALTER INDEX IF EXISTS ix_tokens_expires_at RENAME TO ix_tokens_unpartitioned_expires_at;
+ALTER INDEX IF EXISTS ix_tokens_id RENAME TO ix_tokens_unpartitioned_id;
+
+CREATE TABLE tokens (
+    id INTEGER NOT NULL DEFAULT nextval('tokens_id_seq'),
+    user_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+    token_hash BYTEA NOT NULL,
+    token_type VARCHAR NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+    expires_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    PRIMARY KEY (id, expires_at)
+) PARTITION BY RANGE (expires_at);
+
+ALTER SEQUENCE tokens_id_seq OWNED BY tokens.id;
+
+CREATE UNIQUE INDEX ix_tokens_token_hash ON tokens (token_hash, expires_at);
+CREATE INDEX ix_tokens_expires_at ON tokens (expires_at);
+
+-- Catches rows outside the daily partitions; the reaper deletes expired rows from it
+CREATE TABLE tokens_default PARTITION OF tokens DEFAULT;
+
+-- Daily partitions for today and the next 10 days (the reaper keeps extending them)
+DO $$
+DECLARE
+    day DATE;
+BEGIN
+    FOR i IN 0..10 LOOP
+        day := current_date + i;
+        EXECUTE format(
+            'CREATE TABLE tokens_p%s PARTITION OF tokens FOR VALUES FROM (%L) TO (%L)',
+            to_char(day, 'YYYYMMDD'), day, day + 1
+        );
+    END LOOP;
+END $$;
+
+-- Keep the tokens that are still valid
+INSERT INTO tokens (id, user_id, token_hash, token_type, created_at, expires_at)
+SELECT id, user_id, token_hash, token_type, created_at, expires_at
+FROM tokens_unpartitioned
+WHERE expires_at > now();
+
+DROP TABLE tokens_unpartitioned;
+
+COMMIT;
@@ -3,6 +3,7 @@ import 'dart:convert';
 import 'package:chess_rps/common/endpoint.dart';
 import 'package:chess_rps/common/logger.dart';
 import 'package:chess_rps/common/rps_choice.dart';
+import 'package:chess_rps/data/service/auth/auth_storage.dart';
 import 'package:chess_rps/data/service/dio_logger_interceptor.dart';
 import 'package:chess_rps/presentation/mediator/game_mode_mediator.dart';
 import 'package:dio/dio.dart';
@@ -29,7 +30,12 @@ class GameRoomHandler {
 
     try {
       AppLogger.debug('WebSocket URL: $url', tag: 'GameRoomHandler');
-      _channel = WebSocketChannel.connect(Uri.parse(url));
+      // Signed-in players send their access token so the server rates the game
+      final token = await AuthStorage().getToken();
+      final uri = Uri.parse(url);
+      _channel = WebSocketChannel.connect(
+        token != null ? uri.replace(queryParameters: {'token': token}) : uri,
+      );
 
       _subs.add(_channel!.stream.listen(
         (event) {
@@ -266,13 +266,14 @@ class StatsService {
   }
 
   /// Record a game result
+  /// The server rates online games itself when they end; this returns the player's stats afterwards
   /// [result] - "win", "loss", or "draw"
-  /// [opponentRating] - Optional opponent rating for ELO calculation
+  /// [roomCode] - Code of the online game room
   /// [gameMode] - Optional game mode ("classical" or "rps")
   /// [endType] - Optional end type ("checkmate", "stalemate", "timeout", etc.)
   Future<StatsUpdateResponse> recordGameResult({
     required String result,
-    int? opponentRating,
+    required String roomCode,
     String? gameMode,
     String? endType,
   }) async {
@@ -285,7 +286,7 @@ class StatsService {
         '/api/v1/stats/game-result',
         data: {
           'result': result,
-          if (opponentRating != null) 'opponent_rating': opponentRating,
+          'room_code': roomCode,
           if (gameMode != null) 'game_mode': gameMode,
           if (endType != null) 'end_type': endType,
         },
@@ -58,7 +58,7 @@ class StatsController extends _$StatsController {
 
   Future<void> recordGameResult({
     required String result,
-    int? opponentRating,
+    required String roomCode,
     String? gameMode,
     String? endType,
   }) async {
@@ -66,7 +66,7 @@ class StatsController extends _$StatsController {
       final service = ref.read(statsServiceProvider);
       await service.recordGameResult(
         result: result,
-        opponentRating: opponentRating,
+        roomCode: roomCode,
         gameMode: gameMode,
         endType: endType,
       );
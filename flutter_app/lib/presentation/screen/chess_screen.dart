@@ -719,14 +719,21 @@ class ChessScreen extends HookConsumerWidget {
     );
     
     // Submit game result to backend
+    // Online games are rated by the server, games against the AI are not rated
+    final roomCode = GameModesMediator.currentRoomCode;
     try {
       final statsController = ref.read(statsControllerProvider.notifier);
-      await statsController.recordGameResult(
-        result: result,
-        gameMode: gameMode,
-        endType: endType,
-      );
-      AppLogger.info('Game result submitted successfully', tag: 'ChessScreen');
+      if (GameModesMediator.opponentMode.isAI || roomCode == null) {
+        AppLogger.info('Game against the AI is not rated', tag: 'ChessScreen');
+      } else {
+        await statsController.recordGameResult(
+          result: result,
+          roomCode: roomCode,
+          gameMode: gameMode,
+          endType: endType,
+        );
+        AppLogger.info('Game result submitted successfully', tag: 'ChessScreen');
+      }
       
       // Invalidate leaderboard to refresh with updated ratings
       // We invalidate all common limits to ensure standings are always up-to-date